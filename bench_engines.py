@@ -0,0 +1,301 @@
+"""
+===============================================================================
+ Script : bench_engines.py
+ Auteur : Bruno Coulet - RTM - Dopex
+-------------------------------------------------------------------------------
+ Objectif :
+     Comparer, chiffres à l'appui, les moteurs d'export :
+       * selenium   : scrap.py
+       * playwright : scrap_plw.py
+       * http       : rejeu direct de la requête d'export (http_export.py)
+     contre la doublure locale de WaryMe (mock_waryme.py), donc sans réseau
+     et de façon reproductible.
+
+ Mesures par run :
+    cold_start_s  : lancement du navigateur (0 pour http)
+    login_s       : connexion complète (formulaire)
+    filter_s      : menu + filtre de dates + rafraîchissement de la grille
+    download_s    : export et téléchargement du CSV
+    total_s       : somme des phases
+    peak_rss_mb   : pic mémoire des processus enfants (pilote + navigateur),
+                    échantillonné toutes les 100 ms (nécessite psutil)
+    ok / error    : succès ou message d'erreur
+ Synthèse par moteur : médianes des mesures et taux d'échec.
+
+ Isolation :
+    Session persistée, recette d'export et fichiers téléchargés vont dans un
+    dossier temporaire : l'exécution ne touche ni `alertes/` ni `.session/`.
+    Chaque run Selenium part d'un cache disque vide (resource_policy.cold_cache),
+    comme chaque contexte Playwright : aucun moteur ne profite d'un cache chaud.
+
+ Utilisation :
+    python bench_engines.py --engines selenium playwright http --runs 5 \\
+                            --latency 100 --alerts-per-day 50
+    Résultats : `bench_results/bench_<horodatage>.json` et `.csv`.
+===============================================================================
+"""
+
+import os
+import csv
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+import statistics
+from datetime import date, datetime, timedelta
+
+import urllib3
+
+try:
+    import psutil
+except ImportError:  # mesure mémoire facultative
+    psutil = None
+
+import mock_waryme
+import http_export
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BASE_DIR, "bench_results")
+METRICS = ["cold_start_s", "login_s", "filter_s", "download_s", "total_s", "peak_rss_mb"]
+
+# Semaine exportée à chaque run (fixe pour comparer des volumes identiques)
+START_DATE = date(2025, 12, 1)
+END_DATE = START_DATE + timedelta(days=6)
+
+
+class RssSampler:
+    """Pic de la mémoire résidente cumulée des processus enfants (pilote, navigateur)."""
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        me = psutil.Process()
+        while not self._stop.is_set():
+            total = 0
+            for child in me.children(recursive=True):
+                try:
+                    total += child.memory_info().rss
+                except psutil.Error:
+                    pass
+            self.peak = max(self.peak, total)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        if psutil:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if psutil:
+            self._thread.join()
+
+    @property
+    def peak_mb(self):
+        return round(self.peak / 2**20, 1) if psutil else None
+
+
+class Phases:
+    """Chronomètre des phases d'un run."""
+
+    def __init__(self):
+        self.durations = {}
+
+    def __call__(self, name):
+        phases = self
+
+        class _Timer:
+            def __enter__(self):
+                self.t0 = time.perf_counter()
+
+            def __exit__(self, *exc):
+                phases.durations[name] = round(time.perf_counter() - self.t0, 3)
+
+        return _Timer()
+
+
+# ================================================================
+# MOTEURS
+# ================================================================
+
+def run_selenium(url, workdir):
+    import scrap
+    import resource_policy
+
+    scrap.URL, scrap.ID, scrap.PASSWORD = url, mock_waryme.MOCK_ID, mock_waryme.MOCK_PASSWORD
+    scrap.DOWNLOAD_DIR = workdir
+    phases = Phases()
+    # Cache disque neuf à chaque run, comme les contextes Playwright éphémères
+    with resource_policy.cold_cache("bench_engines") as cache_name:
+        with phases("cold_start_s"):
+            driver = scrap.start_driver(workdir, cache_name=cache_name)
+        try:
+            with phases("login_s"):
+                scrap.login(driver)
+            with phases("filter_s"):
+                scrap.apply_filters(driver, START_DATE, END_DATE)
+            with phases("download_s"):
+                scrap.export_csv(driver, START_DATE, END_DATE, download_dir=workdir)
+        finally:
+            driver.quit()
+    return phases.durations
+
+
+async def _run_playwright(url, workdir):
+    import scrap_plw
+    import resource_policy
+    from playwright.async_api import async_playwright
+
+    phases = Phases()
+    async with async_playwright() as p:
+        with phases("cold_start_s"):
+            browser = await p.chromium.launch(headless=True)
+        try:
+            context = await browser.new_context(accept_downloads=True)
+            await resource_policy.apply_to_playwright(context, resource_policy.load_policy())
+            page = await context.new_page()
+            with phases("login_s"):
+                await scrap_plw.login(page, mock_waryme.MOCK_ID, mock_waryme.MOCK_PASSWORD, url)
+            with phases("filter_s"):
+                await scrap_plw.apply_filters(page, START_DATE, END_DATE)
+            with phases("download_s"):
+                await scrap_plw.export_csv(page, START_DATE, END_DATE, workdir)
+        finally:
+            await browser.close()
+    return phases.durations
+
+
+def run_playwright(url, workdir):
+    return asyncio.run(_run_playwright(url, workdir))
+
+
+def run_http(url, workdir):
+    phases = Phases()
+    phases.durations["cold_start_s"] = 0.0
+    with phases("login_s"):
+        # Raccourci propre à la doublure : l'API de connexion fournit le cookie de session
+        response = urllib3.PoolManager().request(
+            "POST", f"{url}api/login",
+            body=json.dumps({"login": mock_waryme.MOCK_ID, "password": mock_waryme.MOCK_PASSWORD}),
+            headers={"Content-Type": "application/json"},
+        )
+        token = response.headers["Set-Cookie"].split(";")[0].split("=", 1)[1]
+        cookies = [{"name": mock_waryme.COOKIE_NAME, "value": token, "domain": "127.0.0.1"}]
+
+    if os.path.exists(http_export.RECIPE_FILE):
+        with open(http_export.RECIPE_FILE, encoding="utf-8") as f:
+            recipe = json.load(f)
+    else:
+        # Aucun moteur navigateur n'a appris la requête : recette de la doublure
+        recipe = http_export.build_recipe(
+            "GET", f"{url}api/alerts/export?from={START_DATE:%m/%d/%Y}&to={END_DATE:%m/%d/%Y}",
+            {}, None, START_DATE, END_DATE,
+        )
+    phases.durations["filter_s"] = 0.0
+    with phases("download_s"):
+        http_export.HttpExporter(recipe, cookies).export(START_DATE, END_DATE, workdir)
+    return phases.durations
+
+
+ENGINES = {"selenium": run_selenium, "playwright": run_playwright, "http": run_http}
+
+
+# ================================================================
+# HARNAIS
+# ================================================================
+
+def benchmark(engines, runs, latency_ms=0, alerts_per_day=20):
+    server, url = mock_waryme.start_in_thread(latency_ms=latency_ms, alerts_per_day=alerts_per_day)
+    workroot = tempfile.mkdtemp(prefix="bench_engines_")
+    # La recette apprise par les moteurs navigateur reste dans le dossier temporaire
+    http_export.RECIPE_FILE = os.path.join(workroot, "export_request.json")
+
+    rows = []
+    try:
+        for engine in engines:
+            for run in range(1, runs + 1):
+                workdir = os.path.join(workroot, f"{engine}_{run}")
+                os.makedirs(workdir)
+                row = {"engine": engine, "run": run, "ok": True, "error": ""}
+                with RssSampler() as rss:
+                    try:
+                        durations = ENGINES[engine](url, workdir)
+                    except Exception as e:
+                        durations = {}
+                        message = str(e).strip().splitlines()[0] if str(e).strip() else ""
+                        row.update(ok=False, error=f"{type(e).__name__}: {message}")
+                row.update(durations)
+                row["total_s"] = round(sum(durations.values()), 3) if row["ok"] else None
+                row["peak_rss_mb"] = rss.peak_mb
+                rows.append(row)
+                print(f"{engine:<11} run {run}: {'ok' if row['ok'] else 'ÉCHEC ' + row['error']}")
+    finally:
+        server.shutdown()
+
+    return rows, summarize(rows)
+
+
+def summarize(rows):
+    summary = []
+    for engine in dict.fromkeys(r["engine"] for r in rows):
+        runs = [r for r in rows if r["engine"] == engine]
+        ok_runs = [r for r in runs if r["ok"]]
+        entry = {
+            "engine": engine,
+            "runs": len(runs),
+            "failure_rate": round(1 - len(ok_runs) / len(runs), 3),
+        }
+        for metric in METRICS:
+            values = [r[metric] for r in ok_runs if r.get(metric) is not None]
+            entry[f"median_{metric}"] = round(statistics.median(values), 3) if values else None
+        summary.append(entry)
+    return summary
+
+
+def write_results(rows, summary, out_dir=RESULTS_DIR, meta=None):
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    json_path = os.path.join(out_dir, f"bench_{stamp}.json")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta or {}, "summary": summary, "runs": rows}, f, indent=2, ensure_ascii=False)
+
+    csv_path = os.path.join(out_dir, f"bench_{stamp}.csv")
+    fields = ["engine", "run", "ok", *METRICS, "error"]
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, delimiter=";", extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    return json_path, csv_path
+
+
+def print_summary(summary):
+    header = f"{'Moteur':<11} {'Runs':>5} {'Échecs':>7}" + "".join(f" {m:>13}" for m in METRICS)
+    print(header)
+    for s in summary:
+        cells = "".join(
+            f" {s[f'median_{m}']:>13}" if s[f"median_{m}"] is not None else f" {'-':>13}" for m in METRICS
+        )
+        print(f"{s['engine']:<11} {s['runs']:>5} {s['failure_rate']:>7.0%}{cells}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Banc d'essai des moteurs d'export WaryMe")
+    parser.add_argument("--engines", nargs="+", choices=list(ENGINES), default=list(ENGINES))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--latency", type=int, default=0, help="Latence de la doublure (ms)")
+    parser.add_argument("--alerts-per-day", type=int, default=20)
+    parser.add_argument("--out", default=RESULTS_DIR)
+    args = parser.parse_args()
+
+    if psutil is None:
+        print("⚠️ psutil absent : pic mémoire non mesuré")
+    rows, summary = benchmark(args.engines, args.runs, args.latency, args.alerts_per_day)
+    print_summary(summary)
+    paths = write_results(rows, summary, args.out, meta=vars(args))
+    print(f"📊 Résultats : {paths[0]} / {paths[1]}")
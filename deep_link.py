@@ -0,0 +1,137 @@
+"""
+===============================================================================
+ Module : deep_link.py
+ Auteur : Bruno Coulet - RTM - Dopex
+-------------------------------------------------------------------------------
+ Objectif :
+     Ouvrir directement la vue "Alertes internes" (déjà filtrée si possible)
+     par son URL, au lieu de cliquer dans le menu puis de remplir le panneau
+     "Filtrer" : WaryMe est une application Angular dont les vues ont une route.
+
+ Fonctionnement :
+
+ 1. Apprentissage (pendant un run qui passe par le menu) :
+    - `learn_route` : URL de la vue affichée après le clic sur le menu
+      (chemin, et fragment s'il porte la route : `/#/alertes-internes`),
+      sauf si elle est celle de la page d'arrivée après connexion ;
+    - `learn_filtered` : URL après "Appliquer les filtres". Si les dates du
+      filtre y figurent (paramètres de requête), elles sont remplacées par des
+      marqueurs, comme pour la requête d'export (http_export.build_recipe).
+    Les routes sont sauvegardées par menu dans `.session/routes.json`.
+
+ 2. Runs suivants (`target`) :
+    URL pré-filtrée pour la période voulue si elle est connue, sinon URL de
+    la vue. L'appelant vérifie que la vue s'affiche (et que les dates sont
+    bien celles demandées) ; sinon `forget` et repli sur le menu.
+===============================================================================
+"""
+
+import os
+import json
+import logging
+import threading
+from urllib.parse import urlsplit, urlunsplit
+
+import http_export
+from http_export import ExportReplayError
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROUTES_FILE = os.path.join(BASE_DIR, ".session", "routes.json")
+
+_lock = threading.Lock()
+
+
+def load_routes(path=None):
+    try:
+        with open(path or ROUTES_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _update(menu, changes, path=None):
+    """Applique `changes` à la route de `menu` (None = oubli) et sauvegarde si besoin."""
+    path = path or ROUTES_FILE
+    with _lock:
+        routes = load_routes(path)
+        entry = dict(routes.get(menu, {}))
+        if changes is None:
+            if menu not in routes:
+                return
+            del routes[menu]
+        else:
+            entry.update(changes)
+            if routes.get(menu) == entry:
+                return
+            routes[menu] = entry
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(routes, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+def route_of(url):
+    """
+    Route d'une URL, sans paramètres de requête : chemin, plus le fragment
+    quand il porte la route (application Angular en hash routing, `#/vue`).
+    """
+    parts = urlsplit(url)
+    fragment = parts.fragment.split("?")[0]
+    if not fragment.startswith(("/", "!/")):
+        fragment = ""
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, "", fragment))
+
+
+def learn_route(menu, url, landing=None, path=None):
+    """
+    Mémorise la route de la vue `menu`. Rien n'est appris si elle est celle
+    de `landing` (page d'arrivée avant le clic sur le menu) : ouvrir cette
+    route ne mènerait pas à la vue.
+    """
+    route = route_of(url)
+    if landing is not None and route == route_of(landing):
+        logger.info(f"Route de '{menu}' identique à la page d'arrivée ({route}), non mémorisée")
+        return
+    if load_routes(path).get(menu, {}).get("route") != route:
+        logger.info(f"Route apprise pour '{menu}' : {route}")
+        _update(menu, {"route": route}, path)
+
+
+def learn_filtered(menu, url, start_date, end_date, path=None):
+    """Mémorise l'URL filtrée si les dates du filtre y apparaissent."""
+    entry = load_routes(path).get(menu)
+    # prefilter False : l'URL filtrée a déjà été essayée sans effet sur la vue
+    if start_date == end_date or not entry or entry.get("prefilter") is False:
+        return
+    try:
+        recipe = http_export.build_recipe("GET", url, {}, None, start_date, end_date)
+    except ExportReplayError:
+        # L'application ne reporte pas le filtre dans l'URL : inutile de rechercher à chaque run
+        _update(menu, {"filtered": None}, path)
+        return
+    if entry.get("filtered") != recipe["url"]:
+        logger.info(f"URL filtrée apprise pour '{menu}' : {recipe['url']}")
+        _update(menu, {"filtered": recipe["url"], "date_format": recipe["date_format"]}, path)
+
+
+def target(menu, start_date, end_date, path=None):
+    """Retourne (url, pré_filtrée) pour ouvrir directement la vue, ou (None, False)."""
+    entry = load_routes(path).get(menu)
+    if not entry:
+        return None, False
+    if entry.get("filtered"):
+        return http_export.render(entry["filtered"], entry["date_format"], start_date, end_date), True
+    return entry["route"], False
+
+
+def forget(menu, filtered_only=False, path=None):
+    """Oublie la route de `menu` (ou seulement son URL filtrée) après un lien direct en échec."""
+    if filtered_only:
+        logger.warning(f"URL filtrée '{menu}' sans effet sur les dates, filtre par le panneau désormais")
+        _update(menu, {"filtered": None, "prefilter": False}, path)
+    else:
+        logger.warning(f"Lien direct '{menu}' invalide, route oubliée")
+        _update(menu, None, path)
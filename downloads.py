@@ -0,0 +1,189 @@
+"""
+===============================================================================
+ Module : downloads.py
+ Auteur : Bruno Coulet - RTM - Dopex
+-------------------------------------------------------------------------------
+ Objectif :
+     Détecter la FIN d'un téléchargement Chrome sans scruter `os.listdir`
+     toutes les secondes.
+
+ Fonctionnement (`wait_for_download`) :
+
+ 1. Événements DevTools (prioritaire) :
+    Ouvre une connexion CDP (`driver.bidi_connection()`), active
+    `Browser.setDownloadBehavior(eventsEnabled=True)` puis écoute
+    `Browser.downloadWillBegin` / `Browser.downloadProgress`. Le fichier est
+    rendu dès l'état `completed`, sans délai de scrutation.
+
+ 2. inotify (repli, Linux) :
+    Si la connexion CDP est impossible (version de Chrome non supportée par
+    Selenium, navigateur distant...), surveille le dossier avec inotify et
+    attend le renommage `.crdownload` → `.csv` (IN_MOVED_TO / IN_CLOSE_WRITE).
+
+ 3. Scrutation (dernier repli, Windows) :
+    Ancienne logique `os.listdir`, avec en plus une vérification que la
+    taille du fichier est stable entre deux passages.
+
+ Dans tous les cas, le fichier est `fsync` avant d'être rendu et la durée
+ mesurée du téléchargement est journalisée.
+===============================================================================
+"""
+
+import os
+import time
+import select
+import ctypes
+import struct
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Extensions des fichiers en cours d'écriture par Chrome
+PARTIAL_SUFFIXES = (".crdownload", ".tmp")
+
+
+def fsync_file(path):
+    """Force l'écriture sur disque du fichier (et de son dossier sous POSIX)."""
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
+    if os.name == "posix":
+        dir_fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+# ================================================================
+# 1. ÉVÉNEMENTS DEVTOOLS (Browser.downloadProgress)
+# ================================================================
+
+def _wait_cdp(driver, download_dir, trigger, timeout):
+    import trio
+
+    async def run():
+        # Délai posé AUTOUR de la connexion : son expiration ressort en TooSlowError
+        # et non en groupe d'exceptions de la nursery interne de Selenium
+        with trio.fail_after(timeout):
+            async with driver.bidi_connection() as connection:
+                devtools, session = connection.devtools, connection.session
+                await session.execute(devtools.browser.set_download_behavior(
+                    behavior="allow", download_path=download_dir, events_enabled=True,
+                ))
+                events = session.listen(
+                    devtools.browser.DownloadWillBegin, devtools.browser.DownloadProgress, buffer_size=256,
+                )
+                trigger()
+
+                names = {}
+                async for event in events:
+                    if isinstance(event, devtools.browser.DownloadWillBegin):
+                        names[event.guid] = event.suggested_filename
+                    elif event.state == "canceled":
+                        raise RuntimeError(f"Téléchargement annulé par le navigateur ({names.get(event.guid)})")
+                    elif event.state == "completed":
+                        return event.file_path or os.path.join(download_dir, names[event.guid])
+
+    try:
+        return trio.run(run)
+    except trio.TooSlowError:
+        raise TimeoutError(f"Aucun téléchargement terminé en {timeout}s") from None
+
+
+# ================================================================
+# 2. INOTIFY (repli Linux)
+# ================================================================
+
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_NONBLOCK = 0o4000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _wait_inotify(download_dir, trigger, timeout):
+    libc = ctypes.CDLL("libc.so.6", use_errno=True)
+    fd = libc.inotify_init1(_IN_NONBLOCK)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), "inotify_init1")
+    try:
+        if libc.inotify_add_watch(fd, os.fsencode(download_dir), _IN_CLOSE_WRITE | _IN_MOVED_TO) < 0:
+            raise OSError(ctypes.get_errno(), "inotify_add_watch")
+        trigger()
+
+        deadline = time.monotonic() + timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            if not select.select([fd], [], [], remaining)[0]:
+                break
+            buf = os.read(fd, 64 * 1024)
+            offset = 0
+            while offset < len(buf):
+                _, _, _, name_len = _EVENT_HEADER.unpack_from(buf, offset)
+                name = buf[offset + _EVENT_HEADER.size: offset + _EVENT_HEADER.size + name_len]
+                offset += _EVENT_HEADER.size + name_len
+                name = os.fsdecode(name.rstrip(b"\0"))
+                if name.endswith(".csv"):
+                    return os.path.join(download_dir, name)
+        raise TimeoutError(f"Aucun téléchargement terminé en {timeout}s")
+    finally:
+        os.close(fd)
+
+
+# ================================================================
+# 3. SCRUTATION (dernier repli)
+# ================================================================
+
+def _wait_polling(download_dir, trigger, timeout, interval=0.5):
+    before = set(os.listdir(download_dir))
+    trigger()
+
+    sizes = {}
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for name in set(os.listdir(download_dir)) - before:
+            if not name.endswith(".csv") or name.endswith(PARTIAL_SUFFIXES):
+                continue
+            path = os.path.join(download_dir, name)
+            size = os.path.getsize(path)
+            # Fichier rendu seulement si sa taille n'a pas bougé depuis le passage précédent
+            if sizes.get(name) == size:
+                return path
+            sizes[name] = size
+        time.sleep(interval)
+    raise TimeoutError(f"Aucun téléchargement terminé en {timeout}s")
+
+
+# ================================================================
+# POINT D'ENTRÉE
+# ================================================================
+
+def wait_for_download(driver, download_dir, trigger, timeout=60):
+    """
+    Appelle `trigger()` (clic sur "Exporter") et attend la fin du téléchargement
+    qu'il provoque dans `download_dir`. Retourne le chemin du fichier complet
+    et synchronisé sur disque ; lève TimeoutError si rien n'arrive à temps.
+    """
+    triggered = []
+
+    def fire():
+        triggered.append(True)
+        trigger()
+
+    strategies = [
+        ("événements DevTools", lambda: _wait_cdp(driver, download_dir, fire, timeout)),
+        ("inotify", lambda: _wait_inotify(download_dir, fire, timeout)),
+        ("scrutation", lambda: _wait_polling(download_dir, fire, timeout)),
+    ]
+    for method, wait in strategies:
+        start = time.perf_counter()
+        try:
+            path = wait()
+        except Exception as e:
+            # Une fois l'export déclenché, pas de repli : ce serait un second export
+            if triggered:
+                raise
+            logger.info(f"Détection du téléchargement par {method} indisponible : {e}")
+            continue
+
+        fsync_file(path)
+        logger.info(f"Téléchargement terminé en {time.perf_counter() - start:.2f}s ({method}) : {path}")
+        return path
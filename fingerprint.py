@@ -0,0 +1,87 @@
+"""
+===============================================================================
+ Module : fingerprint.py
+ Auteur : Bruno Coulet - RTM - Dopex
+-------------------------------------------------------------------------------
+ Objectif :
+     Dédoublonner des lignes STRICTEMENT identiques sans `astype(str)` (copie
+     texte de toutes les cellules) ni `iterrows` + `hash(tuple(...))` : une
+     empreinte de 64 (ou 128) bits par ligne, calculée colonne par colonne.
+
+ Fonctionnement :
+    1. Chaque colonne est factorisée (`pd.factorize`, natif pour les colonnes
+       Arrow) ; seules ses valeurs DISTINCTES sont hachées
+       (`pandas.util.hash_array`), puis redistribuées par leur code.
+    2. Les empreintes de colonnes sont combinées en place (même mélange que
+       `pd.util.hash_pandas_object`) : aucune copie du tableau de données.
+       L'empreinte dépend des valeurs et de l'ordre des colonnes, pas de la
+       source : elle est comparable d'un fichier à l'autre.
+    3. `drop_duplicates` garde la première occurrence de chaque empreinte et
+       compte les lignes supprimées par source (`sources` : une étiquette
+       par ligne, ex. le fichier d'origine).
+    Collision (deux lignes différentes, même empreinte) : probabilité de
+    l'ordre de n² / 2^65 sur 64 bits (≈ 1e-7 pour 2 millions de lignes) ;
+    `bits=128` la rend négligeable pour un surcoût d'environ 30 %.
+===============================================================================
+"""
+
+import numpy as np
+import pandas as pd
+from pandas.util import hash_array
+
+# Une clé de hachage (16 octets) par tranche de 64 bits
+HASH_KEYS = ("waryme_alertes_1", "waryme_alertes_2")
+# Empreinte d'une cellule vide (NaN / None)
+NA_HASH = np.uint64(0x9E3779B97F4A7C15)
+
+
+def row_fingerprints(df: pd.DataFrame, columns=None, bits=64, rows=None) -> np.ndarray:
+    """
+    Empreinte de chaque ligne de `df` (restreint à `columns`, et aux lignes du
+    masque `rows` s'il est donné, colonne par colonne) : tableau uint64 de
+    forme (n,), ou (n, 2) si `bits=128`.
+    """
+    columns = list(df.columns if columns is None else columns)
+    factorized = []
+    for col in columns:
+        values = df[col] if rows is None else df[col][rows]
+        codes, uniques = pd.factorize(values)
+        factorized.append((codes, np.asarray(uniques, dtype=object)))
+
+    size = len(df) if rows is None else int(np.count_nonzero(rows))
+    parts = []
+    for hash_key in HASH_KEYS[: bits // 64]:
+        out = np.full(size, 0x345678, dtype=np.uint64)
+        mult = np.uint64(1000003)
+        for i, (codes, uniques) in enumerate(factorized):
+            # Code -1 (cellule vide) → dernière entrée : NA_HASH
+            hashes = np.append(hash_array(uniques, hash_key=hash_key, categorize=False), NA_HASH)
+            out ^= hashes[codes]
+            out *= mult
+            mult += np.uint64(82520 + 2 * (len(columns) - i))
+        out += np.uint64(97531)
+        parts.append(out)
+    return parts[0] if bits == 64 else np.stack(parts, axis=1)
+
+
+def duplicated(fingerprints: np.ndarray) -> np.ndarray:
+    """Masque des lignes dont l'empreinte est déjà apparue plus haut."""
+    if fingerprints.ndim == 1:
+        return pd.Series(fingerprints).duplicated(keep="first").to_numpy()
+    return pd.DataFrame(fingerprints).duplicated(keep="first").to_numpy()
+
+
+def count_by_source(mask: np.ndarray, sources=None) -> dict:
+    """Nombre de lignes de `mask` par source ({} sans `sources`)."""
+    if sources is None or not mask.any():
+        return {}
+    return pd.Series(np.asarray(sources)[mask]).value_counts(sort=False).to_dict()
+
+
+def drop_duplicates(df: pd.DataFrame, columns=None, sources=None, bits=64):
+    """
+    Supprime les lignes identiques (sur `columns`, par défaut toutes) en gardant
+    la première. Retourne (DataFrame dédoublonné, {source: lignes supprimées}).
+    """
+    dup = duplicated(row_fingerprints(df, columns, bits))
+    return df[~dup], count_by_source(dup, sources)
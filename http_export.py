@@ -0,0 +1,259 @@
+"""
+===============================================================================
+ Module : http_export.py
+ Auteur : Bruno Coulet - RTM - Dopex
+-------------------------------------------------------------------------------
+ Objectif :
+     Export des alertes SANS navigateur, en rejouant directement la requête
+     HTTP que déclenche le bouton "Exporter" de WaryMe.
+
+ Fonctionnement :
+
+ 1. Apprentissage (une fois, pendant un export navigateur) :
+    - `scrap.py` lit le journal "performance" de Chrome
+      (`capture_from_performance_log`) ;
+    - `scrap_plw.py` écoute les réponses Playwright (`is_export_response`).
+    La requête qui renvoie le CSV (méthode, URL, en-têtes, corps) est
+    transformée en "recette" (`build_recipe`) : les dates du filtre y sont
+    repérées et remplacées par des marqueurs, avec leur format. La recette
+    est sauvegardée dans `.session/export_request.json`.
+
+ 2. Rejeu (`HttpExporter`) :
+    Les marqueurs sont remplacés par les dates voulues et la requête est
+    envoyée via un pool de connexions urllib3 (keep-alive), avec les cookies
+    de la session persistée (`.session/*_state.json`). Un export hebdomadaire
+    devient une seule requête HTTP.
+
+ 3. Repli :
+    Si la recette est absente, si la session a expiré (401/403, page HTML de
+    connexion) ou si la réponse n'est pas un CSV, `ExportReplayError` est levée
+    et l'appelant repasse par le navigateur, qui réapprend la recette.
+===============================================================================
+"""
+
+import os
+import json
+import logging
+from datetime import date
+from urllib.parse import quote, urlsplit
+
+import urllib3
+
+import spans
+from spans import traced
+from range_split import ExportTooLarge
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RECIPE_FILE = os.path.join(BASE_DIR, ".session", "export_request.json")
+
+# Formats de date testés pour repérer le filtre dans la requête capturée
+# (MM/DD/YYYY est celui de l'UI, les autres ceux qu'une API REST utilise souvent)
+DATE_FORMATS = ["%m/%d/%Y", "%Y-%m-%d", "%d/%m/%Y"]
+
+BEGIN, END = "__BEGIN_DATE__", "__END_DATE__"
+BEGIN_Q, END_Q = "__BEGIN_DATE_Q__", "__END_DATE_Q__"
+
+# En-têtes propres à la requête d'origine, recalculés au rejeu
+_DROPPED_HEADERS = {"cookie", "content-length", "host", "connection", "accept-encoding"}
+
+
+class ExportReplayError(Exception):
+    """Le rejeu HTTP est impossible : il faut repasser par le navigateur."""
+
+
+def is_export_response(mime_type, headers):
+    """Indique si une réponse HTTP est le fichier CSV de l'export."""
+    headers = {k.lower(): v for k, v in (headers or {}).items()}
+    content_type = (mime_type or headers.get("content-type", "")).lower()
+    disposition = headers.get("content-disposition", "").lower()
+    return "csv" in content_type or "attachment" in disposition or ".csv" in disposition
+
+
+def capture_from_performance_log(driver):
+    """
+    Retrouve la requête d'export dans le journal "performance" de Chrome
+    (nécessite la capability `goog:loggingPrefs`). Retourne un dict
+    {method, url, headers, post_data} ou None.
+    """
+    requests_by_id = {}
+    export_ids = []
+    for entry in driver.get_log("performance"):
+        message = json.loads(entry["message"])["message"]
+        params = message.get("params", {})
+        if message.get("method") == "Network.requestWillBeSent":
+            requests_by_id[params["requestId"]] = params["request"]
+        elif message.get("method") == "Network.responseReceived":
+            response = params.get("response", {})
+            if is_export_response(response.get("mimeType"), response.get("headers")):
+                export_ids.append(params["requestId"])
+
+    for request_id in reversed(export_ids):
+        request = requests_by_id.get(request_id)
+        if not request:
+            continue
+        post_data = request.get("postData")
+        if post_data is None and request.get("hasPostData"):
+            # Corps trop gros pour figurer dans l'événement : le demander au navigateur
+            try:
+                post_data = driver.execute_cdp_cmd(
+                    "Network.getRequestPostData", {"requestId": request_id}
+                ).get("postData")
+            except Exception:
+                post_data = None
+        return {
+            "method": request.get("method", "GET"),
+            "url": request["url"],
+            "headers": request.get("headers", {}),
+            "post_data": post_data,
+        }
+    return None
+
+
+def build_recipe(method, url, headers, post_data, start_date: date, end_date: date):
+    """
+    Transforme une requête capturée en recette rejouable, en remplaçant les
+    dates du filtre par des marqueurs. Lève ExportReplayError si les dates
+    ne sont pas retrouvées dans l'URL ou le corps.
+    """
+    if start_date == end_date:
+        raise ExportReplayError("Dates de début et de fin identiques : impossible de les distinguer")
+
+    for fmt in DATE_FORMATS:
+        begin_txt, end_txt = start_date.strftime(fmt), end_date.strftime(fmt)
+        replacements = [
+            (begin_txt, BEGIN), (end_txt, END),
+            (quote(begin_txt, safe=""), BEGIN_Q), (quote(end_txt, safe=""), END_Q),
+        ]
+        url_t, body_t = url, post_data or ""
+        for raw, token in replacements:
+            url_t = url_t.replace(raw, token)
+            body_t = body_t.replace(raw, token)
+
+        found = url_t + body_t
+        if (BEGIN in found or BEGIN_Q in found) and (END in found or END_Q in found):
+            return {
+                "method": method,
+                "url": url_t,
+                "headers": {k: v for k, v in headers.items() if k.lower() not in _DROPPED_HEADERS},
+                "body": body_t if post_data is not None else None,
+                "date_format": fmt,
+            }
+
+    raise ExportReplayError("Dates du filtre introuvables dans la requête d'export capturée")
+
+
+def render(template, fmt, start_date: date, end_date: date):
+    """Remplace les marqueurs de date d'un modèle (URL ou corps) par les dates voulues."""
+    begin_txt, end_txt = start_date.strftime(fmt), end_date.strftime(fmt)
+    return (template
+            .replace(BEGIN_Q, quote(begin_txt, safe="")).replace(END_Q, quote(end_txt, safe=""))
+            .replace(BEGIN, begin_txt).replace(END, end_txt))
+
+
+def save_recipe(recipe, path=None):
+    path = path or RECIPE_FILE
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(recipe, f, indent=2)
+    os.replace(tmp_path, path)
+    logger.info(f"Requête d'export apprise ({recipe['method']} {recipe['url'][:120]})")
+
+
+def learn(method, url, headers, post_data, start_date, end_date, path=None):
+    """Construit et sauvegarde la recette ; n'échoue jamais (l'export navigateur a réussi)."""
+    try:
+        save_recipe(build_recipe(method, url, headers, post_data, start_date, end_date), path)
+        return True
+    except Exception as e:
+        logger.warning(f"Requête d'export non apprise : {e}")
+        return False
+
+
+def load_cookies(state_file):
+    """Cookies d'une session persistée (format Selenium ou storage_state Playwright)."""
+    if not os.path.exists(state_file):
+        return []
+    with open(state_file, encoding="utf-8") as f:
+        return json.load(f).get("cookies", [])
+
+
+class HttpExporter:
+    """Rejoue la requête d'export sur un pool de connexions HTTP persistantes."""
+
+    def __init__(self, recipe, cookies, timeout=120, maxsize=4):
+        self.recipe = recipe
+        self.host = urlsplit(recipe["url"].replace(BEGIN_Q, "").replace(END_Q, "")).hostname or ""
+        self.cookie_header = "; ".join(
+            f"{c['name']}={c['value']}" for c in cookies
+            if self.host.endswith(c.get("domain", "").lstrip("."))
+        )
+        self.timeout = timeout
+        # Pas de nouvel essai sur délai de lecture : un export trop long est découpé (range_split.py)
+        self.pool = urllib3.PoolManager(maxsize=maxsize, retries=urllib3.Retry(2, read=0, backoff_factor=0.5))
+
+    @classmethod
+    def from_files(cls, state_file, recipe_file=None, **kwargs):
+        recipe_file = recipe_file or RECIPE_FILE
+        if not os.path.exists(recipe_file):
+            raise ExportReplayError("Aucune requête d'export apprise pour l'instant")
+        with open(recipe_file, encoding="utf-8") as f:
+            recipe = json.load(f)
+        cookies = load_cookies(state_file)
+        if not cookies:
+            raise ExportReplayError(f"Aucun cookie de session dans {state_file}")
+        return cls(recipe, cookies, **kwargs)
+
+    def _render(self, template, start_date, end_date):
+        return render(template, self.recipe["date_format"], start_date, end_date)
+
+    def fetch(self, start_date: date, end_date: date) -> bytes:
+        """Télécharge l'export CSV de la période et retourne son contenu brut."""
+        headers = dict(self.recipe["headers"])
+        if self.cookie_header:
+            headers["Cookie"] = self.cookie_header
+        body = self.recipe.get("body")
+
+        try:
+            response = self.pool.request(
+                self.recipe["method"],
+                self._render(self.recipe["url"], start_date, end_date),
+                headers=headers,
+                body=self._render(body, start_date, end_date).encode("utf-8") if body is not None else None,
+                timeout=self.timeout,
+            )
+        except urllib3.exceptions.HTTPError as e:
+            if isinstance(getattr(e, "reason", e), urllib3.exceptions.ReadTimeoutError):
+                # Le serveur n'a pas fini de produire le CSV : période à découper
+                raise ExportTooLarge(f"Export HTTP non terminé en {self.timeout}s") from e
+            raise ExportReplayError(f"Erreur réseau lors du rejeu : {e}") from e
+
+        if response.status in (401, 403):
+            raise ExportReplayError(f"Session expirée (HTTP {response.status})")
+        if response.status != 200:
+            raise ExportReplayError(f"Réponse inattendue HTTP {response.status}")
+        if not is_export_response(None, dict(response.headers)) and response.data.lstrip()[:1] == b"<":
+            raise ExportReplayError("Réponse HTML au lieu du CSV (page de connexion ?)")
+        return response.data
+
+    @traced("http_export")
+    def export(self, start_date: date, end_date: date, output_dir) -> str:
+        """Télécharge l'export et l'enregistre sous `alertes_YYYY-MM-DD_YYYY-MM-DD.csv`."""
+        data = self.fetch(start_date, end_date)
+
+        base_name = f"alertes_{start_date.strftime('%Y-%m-%d')}_{end_date.strftime('%Y-%m-%d')}"
+        new_path = os.path.join(output_dir, f"{base_name}.csv")
+        counter = 1
+        while os.path.exists(new_path):
+            new_path = os.path.join(output_dir, f"{base_name}_{counter}.csv")
+            counter += 1
+
+        tmp_path = f"{new_path}.part"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, new_path)
+        spans.annotate(bytes=len(data))
+        logger.info(f"Export HTTP direct : {new_path} ({len(data)} octets)")
+        return new_path
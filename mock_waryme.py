@@ -0,0 +1,364 @@
+"""
+===============================================================================
+ Script : mock_waryme.py
+ Auteur : Bruno Coulet - RTM - Dopex
+-------------------------------------------------------------------------------
+ Objectif :
+     Doublure LOCALE de la plateforme WaryMe, pour chronométrer et tester les
+     scrapers (scrap.py, scrap_plw.py, scrap_tests/) sans réseau et sans
+     dépendre de l'instance réelle.
+
+ Ce que la doublure reproduit (tout ce dont dépendent les scrapers) :
+    * formulaire de connexion en deux étapes : `input[formcontrolname='login']`,
+      bouton "Se connecter", puis `input[type='password']` validé par Entrée ;
+      l'URL change après connexion ; cookie de session `waryme_session` ;
+    * menu "Alertes internes" (span dans un item de menu) ; la vue a une route,
+      `/app/alertes-internes?from=..&to=..`, qui reflète le filtre appliqué et
+      peut être ouverte directement (lien direct) ;
+    * bouton "Filtrer" ouvrant un panneau avec les champs DÉSACTIVÉS
+      `beginDate` / `endDate` (format MM/DD/YYYY, classes ng-valid / ng-invalid) ;
+    * bouton "Appliquer les filtres" et grille `tr.mat-row[role=row]`
+      ("Aucune alerte trouvée" si vide) ;
+    * bouton "Exporter" → GET /api/alerts/export?from=..&to=.. qui renvoie le
+      CSV (`;`, UTF-8 BOM, en-tête des exports réels) en pièce jointe ;
+    * `window.getAllAngularTestabilities()` (stable quand aucune requête
+      n'est en cours), utilisé par les attentes conditionnelles.
+
+ Paramètres :
+    --latency MS          : latence ajoutée à chaque appel d'API
+    --alerts-per-day N    : volume du jeu de données (déterministe, --seed)
+
+ Utilisation :
+    python mock_waryme.py --port 8000 --latency 150 --alerts-per-day 40
+    puis dans `.env` : URL=http://127.0.0.1:8000/  ID=demo  PASSWORD=demo
+    Depuis Python : `server, url = start_in_thread(latency_ms=0)`.
+===============================================================================
+"""
+
+import json
+import time
+import random
+import secrets
+import argparse
+import threading
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MOCK_ID = "demo"
+MOCK_PASSWORD = "demo"
+COOKIE_NAME = "waryme_session"
+PAGE_SIZE = 25
+
+# En-tête des exports réels (voir rename_tests/Alertes_2024-12_extrait.csv)
+HEADER = (
+    "Référence;Date;Timestamp;Communauté;Émetteur;Durée en secondes;Mode de déclenchement;"
+    "Qualification émetteur;Qualification récepteur;Nombre de qualifications;Nombre de récepteurs;"
+    "Délai de réception en secondes;Nombre d'intervenants;Délai de prise en charge en secondes;"
+    "Qualité de la transmission;Nombre de messages;Nombre de sessions talkie walkie;"
+    "Position initiale : latitude;Position initiale : longitude;Position initiale : précision en mètres;"
+    "Position initiale : rue;Position initiale : code postal;Position initiale : ville;"
+    "Position initiale : département;Position initiale : région;Position initiale : pays;"
+    "Position initiale : lien Google Maps;Dernière position : latitude;Dernière position : longitude;"
+    "Dernière position : précision en mètres;Dernière position : rue;Dernière position : code postal;"
+    "Dernière position : ville;Dernière position : département;Dernière position : région;"
+    "Dernière position : pays;Dernière position : lien Google Maps;Date de suppression des données;"
+    "Date de suppression des données (timestamp);Raison de fin;Règle d'alerte;"
+    "Localisation Indoor initiale : Date de détection ;Localisation Indoor initiale : Adresse MAC;"
+    "Localisation Indoor initiale : Lieu;Localisation Indoor finale : Date de détection ;"
+    "Localisation Indoor finale : Adresse MAC;Localisation Indoor finale : Lieu;"
+    "Informations personnalisées;Informations personnalisées;Informations personnalisées;"
+    "Informations personnalisées;Informations personnalisées"
+)
+N_COLUMNS = HEADER.count(";") + 1
+
+MODES = ["Bouton SOS Principal (Message)", "Bouton SOS Principal (Appel)", "Chute détectée"]
+QUALIFICATIONS = ["Fausse alerte", "Alerte confirmée", ""]
+TOWNS = [("13001", 43.2961743, 5.3699525), ("13010", 43.2766, 5.4225), ("13013", 43.3401, 5.4321)]
+
+
+class Dataset:
+    """Alertes générées de façon déterministe, jour par jour (rien n'est stocké)."""
+
+    def __init__(self, alerts_per_day=20, seed=42):
+        self.alerts_per_day = alerts_per_day
+        self.seed = seed
+
+    def day(self, day):
+        rng = random.Random(self.seed * 1_000_003 + day.toordinal())
+        rows = []
+        for _ in range(self.alerts_per_day):
+            when = datetime(day.year, day.month, day.day) + timedelta(seconds=rng.randrange(86400))
+            postcode, lat, lon = rng.choice(TOWNS)
+            maps = f"https://www.google.com/maps/search/?api=1&query={lat},{lon}"
+            deleted = when + timedelta(days=15)
+            row = [
+                str(rng.randrange(10**15, 10**16)), when.strftime("%d/%m/%Y %H:%M"), str(int(when.timestamp())),
+                "RTM Usagers", "", str(rng.randrange(1, 300)), rng.choice(MODES), "", rng.choice(QUALIFICATIONS),
+                "1", "3", "0", "1", str(rng.randrange(5, 60)), "100", str(rng.randrange(0, 5)), "0",
+                str(lat), str(lon), str(rng.randrange(5, 30)), "", postcode, "Marseille", "Bouches-du-Rhône",
+                "Provence-Alpes-Côte d'Azur", "France", maps,
+                str(lat), str(lon), str(rng.randrange(5, 30)), "", postcode, "Marseille", "Bouches-du-Rhône",
+                "Provence-Alpes-Côte d'Azur", "France", maps,
+                deleted.strftime("%d/%m/%Y %H:%M"), str(int(deleted.timestamp())),
+                "Terminé par l'utilisateur", "Alerte RTM",
+            ]
+            rows.append(row + [""] * (N_COLUMNS - len(row)))
+        # Ordre des exports réels : plus récent en premier
+        return sorted(rows, key=lambda r: int(r[2]), reverse=True)
+
+    def between(self, begin, end):
+        rows, day = [], end
+        while day >= begin:
+            rows.extend(self.day(day))
+            day -= timedelta(days=1)
+        return rows
+
+
+APP_HTML = """<!doctype html>
+<html lang="fr"><head><meta charset="utf-8"><title>WaryMe (doublure locale)</title>
+<style>
+  body { font-family: sans-serif; margin: 0; }
+  nav { width: 200px; float: left; background: #eee; min-height: 100vh; }
+  .menu-item { padding: 8px; cursor: pointer; }
+  main { margin-left: 210px; padding: 10px; }
+  .hidden { display: none; }
+  td { border-bottom: 1px solid #ddd; padding: 2px 6px; font-size: 12px; }
+</style></head>
+<body><div id="root"></div>
+<script>
+// ---- Testabilité "Angular" : stable quand aucune requête n'est en cours ----
+let pending = 0;
+window.getAllAngularTestabilities = () => [{ isStable: () => pending === 0 }];
+async function api(url) {
+  pending++;
+  try { return await fetch(url, { credentials: 'same-origin' }); } finally { pending--; }
+}
+
+const root = document.getElementById('root');
+const parseUs = s => { const m = /^(\\d{2})\\/(\\d{2})\\/(\\d{4})$/.exec(s || ''); return m ? `${m[3]}-${m[1]}-${m[2]}` : null; };
+const fmtUs = d => `${String(d.getMonth() + 1).padStart(2, '0')}/${String(d.getDate()).padStart(2, '0')}/${d.getFullYear()}`;
+
+function showLogin() {
+  root.innerHTML = `
+    <form id="login-form">
+      <input formcontrolname="login" placeholder="Email" type="text">
+      <div id="password-step" class="hidden">
+        <input type="password" aria-label="Mot de passe">
+      </div>
+      <button type="button" id="next"><span>Se connecter</span></button>
+      <p id="error"></p>
+    </form>`;
+  const form = document.getElementById('login-form');
+  document.getElementById('next').addEventListener('click', () => {
+    document.getElementById('password-step').classList.remove('hidden');
+    form.querySelector('input[type=password]').focus();
+  });
+  // Validation par Entrée dans le champ mot de passe (pas de bouton submit dans le formulaire)
+  form.querySelector('input[type=password]').addEventListener('keydown', ev => {
+    if (ev.key === 'Enter') { ev.preventDefault(); form.requestSubmit(); }
+  });
+  form.addEventListener('submit', async ev => {
+    ev.preventDefault();
+    pending++;
+    const r = await fetch('/api/login', { method: 'POST', headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ login: form.querySelector('input[formcontrolname=login]').value,
+                             password: form.querySelector('input[type=password]').value }) });
+    pending--;
+    if (r.ok) { history.pushState({}, '', '/app/dashboard'); showApp(); }
+    else { document.getElementById('error').textContent = 'Identifiants invalides'; }
+  });
+}
+
+function showApp() {
+  root.innerHTML = `
+    <nav><div class="menu-item" id="menu-alertes"><span class="d-flex align-items-center menu-item-content w-100"><span>Alertes internes</span></span></div></nav>
+    <main id="view"><h1>Tableau de bord</h1></main>`;
+  document.getElementById('menu-alertes').addEventListener('click', () => showAlerts());
+}
+
+function showAlerts(params) {
+  if (location.pathname !== '/app/alertes-internes') history.pushState({}, '', '/app/alertes-internes');
+  const today = new Date(), weekAgo = new Date(Date.now() - 6 * 86400000);
+  document.getElementById('view').innerHTML = `
+    <h1>Alertes internes</h1>
+    <button id="filtrer"><span>Filtrer</span></button>
+    <button id="exporter" disabled><span> Exporter </span></button>
+    <div id="panel" class="hidden">
+      <input name="beginDate" formcontrolname="beginDate" class="ng-valid" disabled value="${params?.get('from') || fmtUs(weekAgo)}">
+      <input name="endDate" formcontrolname="endDate" class="ng-valid" disabled value="${params?.get('to') || fmtUs(today)}">
+      <button id="apply"><span> Appliquer les filtres </span></button>
+    </div>
+    <table><tbody id="grid"></tbody></table><p id="total"></p>`;
+  document.getElementById('filtrer').addEventListener('click', () =>
+    document.getElementById('panel').classList.remove('hidden'));
+  for (const input of document.querySelectorAll('#panel input')) {
+    for (const type of ['input', 'change', 'blur']) {
+      input.addEventListener(type, () => {
+        const ok = parseUs(input.value) !== null;
+        input.classList.toggle('ng-valid', ok);
+        input.classList.toggle('ng-invalid', !ok);
+      });
+    }
+  }
+  document.getElementById('apply').addEventListener('click', loadGrid);
+  document.getElementById('exporter').addEventListener('click', () => {
+    const a = document.createElement('a');
+    a.href = '/api/alerts/export?' + currentQuery();
+    document.body.appendChild(a); a.click(); a.remove();
+  });
+  loadGrid();
+}
+
+function currentQuery() {
+  const b = document.querySelector('input[name=beginDate]').value;
+  const e = document.querySelector('input[name=endDate]').value;
+  return new URLSearchParams({ from: b, to: e }).toString();
+}
+
+async function loadGrid() {
+  const r = await api('/api/alerts?' + currentQuery());
+  if (r.status === 401) { history.pushState({}, '', '/'); return showLogin(); }
+  const data = await r.json();
+  // Le filtre est reporté dans l'URL (vue partageable, rechargeable)
+  history.replaceState({}, '', '/app/alertes-internes?' + currentQuery());
+  const grid = document.getElementById('grid');
+  grid.innerHTML = data.rows.map(row =>
+    `<tr role="row" class="mat-row">${row.map(c => `<td>${c}</td>`).join('')}</tr>`).join('');
+  document.getElementById('total').textContent = data.total ? `${data.total} alertes` : 'Aucune alerte trouvée';
+  document.getElementById('exporter').disabled = data.total === 0;
+}
+
+(async () => {
+  const r = await api('/api/me');
+  if (!r.ok) return showLogin();
+  showApp();
+  // Lien direct vers une vue (routes Angular) : /app/alertes-internes?from=MM/DD/YYYY&to=MM/DD/YYYY
+  if (location.pathname === '/app/alertes-internes') showAlerts(new URLSearchParams(location.search));
+})();
+</script></body></html>
+"""
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    dataset = Dataset()
+    latency_ms = 0
+    sessions = set()
+
+    # ---- utilitaires ----
+    def _send(self, status, body, content_type, extra_headers=()):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in extra_headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, status, payload, extra_headers=()):
+        self._send(status, json.dumps(payload, ensure_ascii=False), "application/json", extra_headers)
+
+    def _authenticated(self):
+        for part in self.headers.get("Cookie", "").split(";"):
+            name, _, value = part.strip().partition("=")
+            if name == COOKIE_NAME and value in self.sessions:
+                return True
+        return False
+
+    def _date_range(self, query):
+        begin = datetime.strptime(query["from"][0], "%m/%d/%Y").date()
+        end = datetime.strptime(query["to"][0], "%m/%d/%Y").date()
+        return begin, end
+
+    def _api_delay(self):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+    # ---- routes ----
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+
+        if not url.path.startswith("/api/"):
+            # Application "monopage" : toutes les routes servent le même document
+            return self._send(200, APP_HTML, "text/html; charset=utf-8")
+
+        self._api_delay()
+        if not self._authenticated():
+            return self._json(401, {"error": "unauthorized"})
+
+        if url.path == "/api/me":
+            return self._json(200, {"login": MOCK_ID})
+
+        try:
+            begin, end = self._date_range(query)
+        except (KeyError, ValueError):
+            return self._json(400, {"error": "from/to attendus au format MM/DD/YYYY"})
+
+        if url.path == "/api/alerts":
+            rows = self.dataset.between(begin, end)
+            return self._json(200, {"total": len(rows), "rows": [r[:8] for r in rows[:PAGE_SIZE]]})
+
+        if url.path == "/api/alerts/export":
+            lines = [HEADER] + [";".join(r) for r in self.dataset.between(begin, end)]
+            filename = f"Alertes_{begin:%Y-%m-%d}_{end:%Y-%m-%d}.csv"
+            return self._send(
+                200, ("\ufeff" + "\n".join(lines) + "\n").encode("utf-8"), "text/csv; charset=utf-8",
+                [("Content-Disposition", f'attachment; filename="{filename}"')],
+            )
+
+        self._json(404, {"error": "inconnu"})
+
+    def do_POST(self):
+        if urlsplit(self.path).path != "/api/login":
+            return self._json(404, {"error": "inconnu"})
+        self._api_delay()
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            credentials = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            credentials = {}
+        if credentials.get("login") != MOCK_ID or credentials.get("password") != MOCK_PASSWORD:
+            return self._json(401, {"error": "invalid credentials"})
+        token = secrets.token_hex(16)
+        self.sessions.add(token)
+        self._json(200, {"ok": True}, [("Set-Cookie", f"{COOKIE_NAME}={token}; Path=/; HttpOnly")])
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host="127.0.0.1", port=8000, latency_ms=0, alerts_per_day=20, seed=42):
+    """Serveur prêt à l'emploi (chaque serveur a son propre jeu de données et ses sessions)."""
+    handler = type("ConfiguredMockHandler", (MockHandler,), {
+        "dataset": Dataset(alerts_per_day, seed),
+        "latency_ms": latency_ms,
+        "sessions": set(),
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def start_in_thread(port=0, **kwargs):
+    """Démarre la doublure en tâche de fond ; retourne (serveur, URL). port=0 : port libre."""
+    server = make_server(port=port, **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Doublure locale de WaryMe")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=int, default=0, help="Latence ajoutée aux appels d'API (ms)")
+    parser.add_argument("--alerts-per-day", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    server = make_server(port=args.port, latency_ms=args.latency,
+                         alerts_per_day=args.alerts_per_day, seed=args.seed)
+    print(f"✅ Doublure WaryMe sur http://127.0.0.1:{args.port}/ (identifiants {MOCK_ID} / {MOCK_PASSWORD})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
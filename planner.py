@@ -0,0 +1,148 @@
+"""
+===============================================================================
+ Module : planner.py
+ Auteur : Bruno Coulet - RTM - Dopex
+-------------------------------------------------------------------------------
+ Objectif :
+     N'exporter que les périodes MANQUANTES. Un run en échec laissait un trou
+     définitif (seul un mail était envoyé), et relancer un run créait des
+     doublons `alertes_..._1.csv`.
+
+ Fonctionnement :
+
+ 1. Couverture connue = union de :
+    - des fichiers `alertes_YYYY-MM-DD_YYYY-MM-DD[_N].csv` présents dans
+      `alertes/` ;
+    - du fichier d'état `.session/coverage.json`, complété après chaque export
+      réussi (`record`) : les périodes restent connues même une fois les CSV
+      déplacés ou consolidés par rename.py.
+ 2. `plan(since, until)` : trous de la couverture entre `since` (par défaut
+    le début de la couverture connue, sinon la semaine précédente) et `until`
+    (par défaut le dimanche de la dernière semaine complète : pas d'export
+    partiel de la semaine en cours, que le run suivant ne compléterait que
+    par un second fichier), découpés en semaines lundi → dimanche.
+    Un `until` explicite (--backfill) est pris tel quel, à la journée.
+ Un rattrapage coûte donc le nombre de semaines manquantes, pas la longueur
+ de l'historique.
+===============================================================================
+"""
+
+import os
+import re
+import json
+import logging
+import threading
+from datetime import date, datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+COVERAGE_FILE = os.path.join(BASE_DIR, ".session", "coverage.json")
+FILE_PATTERN = re.compile(r"^alertes_(\d{4}-\d{2}-\d{2})_(\d{4}-\d{2}-\d{2})(?:_\d+)?\.csv$")
+
+_lock = threading.Lock()
+
+
+def merge_ranges(ranges):
+    """Fusionne des périodes (bornes incluses) qui se chevauchent ou se touchent."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def week_ranges(start_date: date, end_date: date):
+    """
+    Découpe [start_date, end_date] en semaines lundi → dimanche.
+    La première et la dernière semaine sont bornées à la période demandée.
+    """
+    ranges = []
+    monday = start_date - timedelta(days=start_date.weekday())
+    while monday <= end_date:
+        sunday = monday + timedelta(days=6)
+        ranges.append((max(monday, start_date), min(sunday, end_date)))
+        monday += timedelta(days=7)
+    return ranges
+
+
+def scan_files(download_dir):
+    """Périodes couvertes par les exports présents dans `download_dir`."""
+    ranges = []
+    if not os.path.isdir(download_dir):
+        return ranges
+    for name in os.listdir(download_dir):
+        match = FILE_PATTERN.match(name)
+        if match:
+            start, end = (datetime.strptime(d, "%Y-%m-%d").date() for d in match.groups())
+            ranges.append((start, end))
+    return ranges
+
+
+def load_state(path=None):
+    try:
+        with open(path or COVERAGE_FILE, encoding="utf-8") as f:
+            return [(date.fromisoformat(s), date.fromisoformat(e)) for s, e in json.load(f)["covered"]]
+    except (OSError, ValueError, KeyError):
+        return []
+
+
+def record(start_date: date, end_date: date, path=None):
+    """Ajoute une période exportée avec succès au fichier d'état."""
+    path = path or COVERAGE_FILE
+    with _lock:
+        covered = merge_ranges(load_state(path) + [(start_date, end_date)])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"covered": [[s.isoformat(), e.isoformat()] for s, e in covered]}, f, indent=2)
+        os.replace(tmp_path, path)
+
+
+def covered_ranges(download_dir, state_file=None):
+    return merge_ranges(scan_files(download_dir) + load_state(state_file))
+
+
+def missing_ranges(since: date, until: date, covered):
+    """Trous de `covered` dans [since, until]."""
+    gaps, cursor = [], since
+    for start, end in merge_ranges(covered):
+        if end < cursor:
+            continue
+        if start > until:
+            break
+        if start > cursor:
+            gaps.append((cursor, start - timedelta(days=1)))
+        cursor = max(cursor, end + timedelta(days=1))
+    if cursor <= until:
+        gaps.append((cursor, until))
+    return gaps
+
+
+def plan(download_dir, since=None, until=None, state_file=None, today=None):
+    """
+    Semaines (bornées aux trous) à exporter pour couvrir [since, until].
+    Sans `until`, la période s'arrête à la dernière semaine complète.
+    Retourne une liste de (début, fin), vide si tout est déjà exporté.
+    """
+    today = today or date.today()
+    # Dimanche précédant la semaine en cours
+    until = until or today - timedelta(days=today.weekday() + 1)
+    covered = covered_ranges(download_dir, state_file)
+    if since is None:
+        if covered:
+            since = covered[0][0]
+        else:
+            # Aucun historique : comportement d'origine, la semaine précédente
+            since = today - timedelta(days=today.weekday()) - timedelta(days=7)
+
+    gaps = missing_ranges(since, until, covered)
+    ranges = [week for gap in gaps for week in week_ranges(*gap)]
+    if gaps:
+        logger.info(f"Périodes manquantes entre {since} et {until} : "
+                    + ", ".join(f"{s} → {e}" for s, e in gaps))
+    else:
+        logger.info(f"Couverture complète entre {since} et {until}")
+    return ranges
@@ -0,0 +1,188 @@
+"""
+===============================================================================
+ Module : range_split.py
+ Auteur : Bruno Coulet - RTM - Dopex
+-------------------------------------------------------------------------------
+ Objectif :
+     Exporter une période TROP VOLUMINEUSE en plusieurs morceaux plutôt que
+     d'échouer ("Aucun fichier CSV téléchargé") : sur les sites à fort volume,
+     une semaine peut dépasser le délai de téléchargement.
+
+ Fonctionnement :
+
+ 1. `export(export_fn, début, fin, site, dossier)` :
+    - découpe la période selon la taille mémorisée pour le site (en jours) ;
+    - exporte chaque morceau avec `export_fn(début, fin)` ;
+    - si un export lève `ExportTooLarge` (délai dépassé) ou contient au moins
+      `MAX_ROWS` lignes (export probablement tronqué), le morceau est coupé
+      en deux (semaine → jours) et chaque moitié réexportée ;
+    - si un morceau échoue, ceux déjà exportés sont supprimés avant de
+      propager l'erreur ;
+    - les morceaux sont recollés en un seul fichier
+      `alertes_YYYY-MM-DD_YYYY-MM-DD.csv` (un seul en-tête, ordre des exports
+      réels : plus récent en premier).
+    Le filtre de WaryMe est à la journée : un jour est le plus petit morceau.
+
+ 2. Taille mémorisée par site (`.session/range_sizes.json`) :
+    après un découpage, la plus grande taille qui a réussi (sous la plus petite
+    en échec) devient la taille de départ des runs suivants ; elle double à
+    nouveau quand les exports sont nettement sous le seuil.
+===============================================================================
+"""
+
+import os
+import csv
+import json
+import logging
+import threading
+from datetime import timedelta
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SIZES_FILE = os.path.join(BASE_DIR, ".session", "range_sizes.json")
+
+# Nombre de lignes à partir duquel un export est considéré comme tronqué
+MAX_ROWS = int(os.getenv("EXPORT_MAX_ROWS", "50000"))
+# Au-delà d'une semaine, pas de taille mémorisée (période entière)
+MAX_DAYS = 7
+
+_lock = threading.Lock()
+
+
+class ExportTooLarge(Exception):
+    """L'export de la période n'a pas abouti dans le délai : période à découper."""
+
+
+def load_sizes(path=None):
+    try:
+        with open(path or SIZES_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_size(site, days, path=None):
+    path = path or SIZES_FILE
+    with _lock:
+        sizes = load_sizes(path)
+        if days >= MAX_DAYS:
+            sizes.pop(site, None)
+        else:
+            sizes[site] = days
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(sizes, f, indent=2)
+        os.replace(tmp_path, path)
+
+
+def split_days(start_date, end_date, size):
+    """Découpe [start_date, end_date] en morceaux consécutifs de `size` jours."""
+    chunks = []
+    while start_date <= end_date:
+        chunk_end = min(start_date + timedelta(days=size - 1), end_date)
+        chunks.append((start_date, chunk_end))
+        start_date = chunk_end + timedelta(days=1)
+    return chunks
+
+
+def count_rows(path):
+    """Nombre d'enregistrements (hors en-tête) d'un export CSV `;`."""
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        return max(sum(1 for _ in csv.reader(f, delimiter=";")) - 1, 0)
+
+
+def stitch(pieces, output_path):
+    """Recolle les exports `pieces` (chronologiques) en un seul CSV, plus récent en premier."""
+    tmp_path = f"{output_path}.part"
+    with open(tmp_path, "wb") as out:
+        for idx, path in enumerate(reversed(pieces)):
+            with open(path, "rb") as f:
+                if idx:
+                    f.readline()  # en-tête (et BOM) déjà écrits par le premier morceau
+                data = f.read()
+            if data and not data.endswith(b"\n"):
+                data += b"\n"
+            out.write(data)
+    os.replace(tmp_path, output_path)
+    for path in pieces:
+        os.remove(path)
+    return output_path
+
+
+def _export_piece(export_fn, start_date, end_date, max_rows, stats, pieces):
+    """Exporte un morceau dans `pieces`, en le coupant en deux tant qu'il est trop volumineux."""
+    days = (end_date - start_date).days + 1
+    try:
+        path = export_fn(start_date, end_date)
+        rows = count_rows(path)
+        if max_rows and rows >= max_rows:
+            if days == 1:
+                logger.warning(f"{start_date} : {rows} lignes (seuil {max_rows}) sur une seule journée, "
+                               f"export conservé tel quel")
+            else:
+                os.remove(path)
+                raise ExportTooLarge(f"{rows} lignes, export probablement tronqué")
+    except ExportTooLarge as e:
+        if days == 1:
+            raise
+        half = start_date + timedelta(days=days // 2 - 1)
+        logger.warning(f"Période {start_date} → {end_date} trop volumineuse ({e}), découpage en deux")
+        stats["failed_days"].append(days)
+        _export_piece(export_fn, start_date, half, max_rows, stats, pieces)
+        _export_piece(export_fn, half + timedelta(days=1), end_date, max_rows, stats, pieces)
+        return
+
+    stats["ok_days"].append(days)
+    stats["max_rows"] = max(stats["max_rows"], rows)
+    pieces.append(path)
+
+
+def export(export_fn, start_date, end_date, site, output_dir, max_rows=MAX_ROWS, sizes_file=None):
+    """
+    Exporte [start_date, end_date] avec `export_fn(début, fin) -> chemin`, en
+    découpant si nécessaire. Retourne le chemin du fichier final (un seul).
+    En cas d'échec, les morceaux déjà exportés sont supprimés : pas de
+    fichiers partiels laissés dans `output_dir`.
+    """
+    size = load_sizes(sizes_file).get(site)
+    chunks = split_days(start_date, end_date, size) if size else [(start_date, end_date)]
+    if len(chunks) > 1:
+        logger.info(f"[{site}] Export par morceaux de {size} jour(s) (taille mémorisée)")
+
+    stats = {"failed_days": [], "ok_days": [], "max_rows": 0}
+    pieces = []
+    try:
+        for s, e in chunks:
+            _export_piece(export_fn, s, e, max_rows, stats, pieces)
+    except BaseException:
+        for path in pieces:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        if pieces:
+            logger.warning(f"[{site}] Échec de l'export, {len(pieces)} morceau(x) partiel(s) supprimé(s)")
+        raise
+
+    # Taille de départ des prochains runs
+    if stats["failed_days"]:
+        # Plus grande taille réussie sous la plus petite taille en échec
+        best = max(d for d in stats["ok_days"] if d < min(stats["failed_days"]))
+        _save_size(site, best, sizes_file)
+        logger.info(f"[{site}] Taille de période mémorisée : {best} jour(s)")
+    elif size and max_rows and stats["max_rows"] < max_rows / 4:
+        _save_size(site, size * 2, sizes_file)
+
+    if len(pieces) == 1:
+        return pieces[0]
+
+    base_name = f"alertes_{start_date.strftime('%Y-%m-%d')}_{end_date.strftime('%Y-%m-%d')}"
+    output_path = os.path.join(output_dir, f"{base_name}.csv")
+    counter = 1
+    while os.path.exists(output_path):
+        output_path = os.path.join(output_dir, f"{base_name}_{counter}.csv")
+        counter += 1
+    logger.info(f"{len(pieces)} morceaux recollés dans {output_path}")
+    return stitch(pieces, output_path)
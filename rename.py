@@ -3,7 +3,7 @@
 ===============================================================================
 Script : regroupement et renommage d’alertes CSV par mois (avec déduplication)
 Auteur : Coulet Bruno  |  Dernière mise à jour : 2025-12-14
-Python : 3.10+  |  Dépendances : pandas, numpy
+Python : 3.10+  |  Dépendances : pandas, numpy (pyarrow optionnel, lecture rapide)
 
 OBJET
 -----
@@ -21,10 +21,20 @@ PRINCIPE DE FONCTIONNEMENT
 2) **Header de référence** : lit uniquement l’en-tête (ligne 1) du **fichier
    le plus récent** trouvé et s’en sert comme schéma colonne → ordre attendu.
 
-3) **Lecture & alignement** :
-   - Lit chaque CSV **sans** son en-tête (skiprows=1), en `dtype=str`,
-     séparateur `;`, encodage `utf-8-sig`, moteur `python` (tolérant).
-   - Tronque les colonnes excédentaires si un fichier en possède plus.
+3) **Lecture & alignement** (une source par processus, `MAX_WORKERS`) :
+   - Lit chaque CSV **sans** son en-tête, en `dtype=str`, séparateur `;`,
+     encodage `utf-8-sig`. Chaque ligne est d'abord triée (`sanitize`) selon
+     son nombre de champs par rapport au header de référence :
+       • conforme (ou plus courte, complétée) → moteur rapide `pyarrow`
+         (à défaut `c`) ;
+       • `;` excédentaires vides en fin de ligne → réparée, moteur rapide ;
+       • autre (`;` perdus dans les données, retour à la ligne entre
+         guillemets) → quarantaine, relue par le moteur `python` (tolérant).
+     Le nombre de lignes passées par chaque voie est affiché.
+   - Chaque processus renvoie une table Arrow (colonnes texte alignées) ; les
+     tables sont assemblées sans copie puis converties une seule fois en
+     DataFrame (sans pyarrow : DataFrames et `pd.concat`).
+   - Tronque les colonnes excédentaires si une ligne en possède plus.
    - Renomme/alimente les colonnes selon le header de référence (colonnes
      manquantes → NaN), puis concatène toutes les sources alignées.
 
@@ -32,7 +42,9 @@ PRINCIPE DE FONCTIONNEMENT
    - Si la colonne **"Référence"** existe : supprime les doublons sur
      "Référence" (garde le premier).
    - Puis seconde passe de déduplication **sur toutes les colonnes** (lignes
-     strictement identiques).
+     strictement identiques), sur une empreinte 64 bits par ligne
+     (fingerprint.py) plutôt qu'une copie texte de toutes les cellules.
+   - Le nombre de doublons supprimés est affiché par fichier source.
 
 5) **Construction de la date** :
    - Si la colonne **"Date"** existe : parse selon ces formats, dans l’ordre :
@@ -49,6 +61,30 @@ PRINCIPE DE FONCTIONNEMENT
      du header de référence.
    - Les lignes **sans date** sont exportées dans `alertes_sans_date.csv`.
 
+7) **Fusion incrémentale** (`merge_into_outputs`, utilisée par scrap_plw.py
+   `--merge-dir`) : des exports déjà en mémoire sont alignés, dédoublonnés
+   et fusionnés dans les fichiers mensuels existants ; seuls les mois touchés
+   sont relus et réécrits (les lignes déjà exportées restent prioritaires).
+
+8) **Manifeste** (`OUTPUT_DIR/manifest.json`) : pour chaque source fusionnée,
+   taille, date de modification, empreinte SHA-256, nombre de lignes et
+   fichiers mensuels touchés, plus le header de référence utilisé.
+   Les runs suivants ne lisent que les sources nouvelles ou modifiées (taille
+   ou date changée ET contenu différent ; un fichier déplacé ou copié est
+   reconnu à son empreinte) et les fusionnent par `merge_into_outputs` : seuls
+   les mois touchés sont réécrits. Reconstruction complète (étapes 3 à 7 sur
+   toutes les sources) avec `--full`, sans manifeste, sans sorties ou si le
+   header de référence a changé. La fusion est additive : des lignes retirées
+   d'une source modifiée restent dans les sorties jusqu'au prochain `--full`.
+
+9) **Index des Références** (`OUTPUT_DIR/references.sqlite`) : table
+   Référence → fichier mensuel, recréée à chaque reconstruction complète et
+   complétée à chaque fusion. Une fusion écarte les lignes dont la Référence
+   est déjà indexée (quel que soit leur mois) sans relire les mois passés ;
+   un mois dont toutes les nouvelles lignes ont une Référence est complété
+   par ajout, sans relecture. `python rename.py --where REF` indique le
+   fichier qui contient l'alerte REF.
+
 ENTRÉES / SORTIES
 -----------------
 • Entrées  : tous les `*.csv` sous `SOURCE_DIR` (séparateur `;`, encodage UTF-8 SIG).
@@ -64,7 +100,8 @@ PARAMÈTRES & CONSTANTES
 
 ROBUSTESSE / CHOIX TECHNIQUES
 -----------------------------
-• Lecture en `engine='python'` pour mieux tolérer des `;` "perdus" dans les données.
+• Moteur `python` réservé aux lignes en quarantaine (`;` "perdus" dans les
+  données) : 5 à 20 fois plus lent que `pyarrow` / `c` sur les archives.
 • Écritures "safe" : passage par fichier temporaire + `.replace()` (Windows)
   pour éviter les conflits d’accès.
 • Normalisation des espaces (espaces insécables, multiples) avant parse des dates.
@@ -83,11 +120,17 @@ LIMITES & ATTENTES SUR LES DONNÉES
 UTILISATION
 -----------
 1) Vérifier / adapter `SOURCE_DIR` et `OUTPUT_DIR` ci-dessous.
-2) Lancer le script : `python rename.py`
+2) Lancer le script : `python rename.py` (`--full` pour tout reconstruire)
 3) Surveiller la console pour le résumé (nb de fichiers, dédup, exports).
 
 HISTORIQUE (résumé)
 -------------------
+• 2026-10-16 : dédoublonnage strict par empreinte de ligne (fingerprint.py).
+• 2026-10-16 : index SQLite des Références (dédoublonnage entre runs, --where).
+• 2026-10-16 : manifeste des sources, fusion incrémentale des seuls mois touchés.
+• 2026-10-16 : lecture des sources en parallèle (processus, tables Arrow).
+• 2026-10-16 : lecture rapide (pyarrow/c) après tri des lignes, quarantaine python.
+• 2026-10-16 : étapes en fonctions importables + fusion incrémentale en mémoire.
 • 2025-12-14 : ajout du cartouche documentaire, clarifications, commentaires.
 • 2025-??-?? : ajout fallback parse dates + détection s/ms pour "Timestamp".
 • 2025-??-?? : écriture sécurisée via fichier temporaire + replace().
@@ -99,16 +142,38 @@ HISTORIQUE (résumé)
 import pandas as pd
 import numpy as np
 from pathlib import Path
+import io
 import re
+import json
+import codecs
+import hashlib
+import argparse
+import shutil
+import sqlite3
 import tempfile
 import os
+import sys
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import fingerprint
+
+try:
+    import pyarrow as pa  # moteur de lecture rapide de pandas + tables Arrow entre processus
+    FAST_ENGINE = "pyarrow"
+except ImportError:
+    pa = None
+    FAST_ENGINE = "c"
 
 # --- Configuration et Chemins ---
 # VEUILLEZ VÉRIFIER QUE LE CHEMIN EST CORRECT
 SOURCE_DIR = Path(r"C:\Users\bcoulet\Documents\projets\rtm_alerte\waryme\alertes_a_renommer") 
 OUTPUT_DIR = Path(r"C:\Users\bcoulet\Documents\projets\rtm_alerte\waryme\alertes_recomposees")
-OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+# Processus de lecture en parallèle (None = nombre de cœurs ; 1 = lecture dans le processus principal)
+MAX_WORKERS = None
 SEP = ";"
+SEP_BYTES = SEP.encode()
 ENCODING = "utf-8-sig"
 
 # --- Fonctions Utilitaires ---
@@ -125,7 +190,7 @@ def safe_write_csv(df: pd.DataFrame, path: Path):
 def normalize_ws(s: pd.Series) -> pd.Series:
     """Nettoie les espaces non-standards et multiples."""
     return (s.astype(str)
-             .str.replace(r"[\u00A0\u200B]", " ", regex=True)
+             .str.replace("[\u00A0\u200B]", " ", regex=True)
              .str.replace(r"\s+", " ", regex=True)
              .str.strip())
 
@@ -167,140 +232,621 @@ def parse_ts_series(series: pd.Series) -> pd.Series:
     return pd.Series(pd.NaT, index=series.index)
 
 
-# --- Processus Principal ---
+MONTH_FILE_PATTERN = re.compile(r"^alertes_(\d{4})_(\d{2})\.csv$", flags=re.IGNORECASE)
+NO_DATE_FILE = "alertes_sans_date.csv"
+NO_DATE_LABEL = "sans_date"
+MANIFEST_NAME = "manifest.json"
+INDEX_NAME = "references.sqlite"
+
+
+def is_generated(name: str) -> bool:
+    """Fichiers produits par ce script (à ne pas reprendre comme sources)."""
+    return bool(MONTH_FILE_PATTERN.match(name)) or name.lower() == NO_DATE_FILE
+
+
+def list_sources(source_dir: Path) -> list[Path]:
+    """Tous les `*.csv` sous `source_dir` (récursif), hors fichiers générés."""
+    return [p for p in sorted(source_dir.rglob("*.csv")) if not is_generated(p.name)]
+
+
+def read_header(source) -> list[str]:
+    """En-tête nettoyé d'une source (chemin ou contenu en mémoire)."""
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    header_df = pd.read_csv(source, sep=SEP, encoding=ENCODING, nrows=0)
+    return [c.strip() for c in header_df.columns]
+
+
+def field_count(record: bytes) -> int:
+    """Nombre de champs d'un enregistrement (les `;` entre guillemets ne comptent pas)."""
+    if b'"' not in record:
+        return record.count(SEP_BYTES) + 1
+    return sum(part.count(SEP_BYTES) for part in record.split(b'"')[::2]) + 1
+
+
+def sanitize(data: bytes, n_fields: int):
+    """
+    Tri des enregistrements d'une source (en-tête exclu) selon leur nombre de
+    champs par rapport au header de référence :
+    - conformes (champs manquants complétés par des `;`) → `clean`, flux
+      d'une largeur fixe lisible par le moteur rapide ;
+    - trop de champs, uniquement vides en fin de ligne → réparés (`;` retirés) ;
+    - autres (`;` perdus dans les données, retours à la ligne entre
+      guillemets) → `quarantine`, relus par le moteur python.
+    Retourne (clean, positions clean, quarantine, positions quarantine, nb réparés) ;
+    les positions permettent de restituer l'ordre d'origine des lignes.
+    """
+    if data.startswith(codecs.BOM_UTF8):
+        data = data[len(codecs.BOM_UTF8):]
+    clean, clean_pos, quarantine, quarantine_pos = [], [], [], []
+    repaired = 0
+    pending = None  # enregistrement dont un champ entre guillemets contient un retour à la ligne
+    position = 0
+    for line in data.splitlines()[1:]:
+        if pending is not None:
+            pending += b"\n" + line
+            if pending.count(b'"') % 2 == 0:
+                quarantine.append(pending)
+                quarantine_pos.append(position)
+                position += 1
+                pending = None
+            continue
+        if not line.strip():
+            continue
+        if line.count(b'"') % 2:
+            pending = line
+            continue
+        count = field_count(line)
+        if count > n_fields:
+            stripped = line.rstrip(SEP_BYTES)
+            if field_count(stripped) <= n_fields:
+                line, count = stripped, field_count(stripped)
+                repaired += 1
+        if count <= n_fields:
+            clean.append(line + SEP_BYTES * (n_fields - count))
+            clean_pos.append(position)
+        else:
+            quarantine.append(line)
+            quarantine_pos.append(position)
+        position += 1
+    if pending is not None:
+        # Guillemet jamais refermé : laissé au moteur python
+        quarantine.append(pending)
+        quarantine_pos.append(position)
+    return clean, clean_pos, quarantine, quarantine_pos, repaired
+
+
+def read_source(source, header_reference: list[str], name: str = "", stats: dict = None) -> pd.DataFrame:
+    """
+    Lit une source (chemin ou contenu CSV en mémoire) sans son en-tête et
+    l'aligne sur `header_reference`. Les lignes conformes sont lues par le
+    moteur rapide (pyarrow, sinon C), les lignes en quarantaine (voir
+    `sanitize`) par le moteur python. `stats` cumule le nombre de lignes par voie.
+    """
+    data = source if isinstance(source, bytes) else Path(source).read_bytes()
+    n_fields = len(header_reference)
+    clean, clean_pos, quarantine, quarantine_pos, repaired = sanitize(data, n_fields)
+
+    parts = []
+    if clean:
+        fast = pd.read_csv(
+            # Fin de ligne finale : sans elle, pyarrow ne lit pas un enregistrement unique
+            io.BytesIO(b"\n".join(clean) + b"\n"),
+            sep=SEP,
+            encoding="utf-8",
+            header=None,
+            dtype=str,
+            engine=FAST_ENGINE,
+        )
+        fast.index = clean_pos
+        parts.append(fast)
+    if quarantine:
+        widths = [field_count(line) for line in quarantine]
+        # Moteur python (tolérant) réservé aux lignes en quarantaine
+        slow = pd.read_csv(
+            io.BytesIO(b"\n".join(quarantine)),
+            sep=SEP,
+            encoding="utf-8",
+            header=None,
+            names=range(max(widths)),
+            dtype=str,
+            engine='python'
+        )
+        slow.index = quarantine_pos
+        if max(widths) > n_fields:
+            # S'assurer que le nombre de colonnes n'excède pas le header de référence
+            print(f"⚠️ Avertissement : Le fichier {name} a {sum(w > n_fields for w in widths)} ligne(s) avec plus de colonnes de données que le header de référence ({n_fields}). Les colonnes excédentaires seront ignorées.")
+            slow = slow.iloc[:, :n_fields]
+        parts.append(slow)
+
+    if stats is not None:
+        stats["fast"] = stats.get("fast", 0) + len(clean)
+        stats["repaired"] = stats.get("repaired", 0) + repaired
+        stats["python"] = stats.get("python", 0) + len(quarantine)
+
+    if not parts:
+        return pd.DataFrame(columns=header_reference, dtype=str)
+    # Ordre d'origine des lignes (la déduplication garde la première occurrence)
+    df = pd.concat(parts).sort_index() if len(parts) > 1 else parts[0]
+    df = df.reset_index(drop=True)
+
+    # Renommer les colonnes lues (0, 1, 2...) avec les noms du header de référence
+    df.columns = header_reference[:df.shape[1]]
+    
+    # Alignement explicite sur toutes les colonnes de référence (ajoute les colonnes manquantes en NaN)
+    return df.reindex(columns=header_reference)
 
-print(f"Dossier source : {SOURCE_DIR}")
-print(f"Dossier d'exportation : {OUTPUT_DIR}")
 
-# 1. Lister tous les fichiers source
-files = []
-for p in sorted(SOURCE_DIR.rglob("*.csv")):
-    name = p.name
-    # Exclure les fichiers générés par le script
-    if re.match(r"^alertes_\d{4}_\d{2}\.csv$", name, flags=re.IGNORECASE):
-        continue
-    if name.lower() == "alertes_sans_date.csv":
-        continue
-    files.append(p)
+def parse_file(path: Path, header_reference: list[str]):
+    """
+    Lecture d'une source dans un processus de lecture. Retourne (données,
+    stats, erreur) : données = table Arrow de colonnes texte alignées sur
+    `header_reference` (DataFrame sans pyarrow), erreur = message ou None.
+    """
+    stats = {}
+    try:
+        df = read_source(path, header_reference, path.name, stats)
+    except Exception as e:
+        return None, stats, str(e)
+    if pa is None:
+        return df, stats, None
+    schema = pa.schema([(c, pa.string()) for c in header_reference])
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False), stats, None
+
+
+def concat_sources(parts: list) -> pd.DataFrame:
+    """Concatène les sources lues (DataFrames, ou tables Arrow assemblées sans copie puis converties une fois)."""
+    if pa is None or isinstance(parts[0], pd.DataFrame):
+        return pd.concat(parts, ignore_index=True)
+    df = pa.concat_tables(parts).to_pandas()
+    # Valeurs absentes en NaN, comme après une lecture pandas
+    return df.where(df.notna())
+
+
+def deduplicate(df: pd.DataFrame, sources=None):
+    """
+    Dédoublonne sur "Référence" (si présente) puis sur toutes les colonnes
+    (empreinte par ligne, fingerprint.py) ; garde la première occurrence.
+    Retourne (DataFrame, {source: lignes supprimées}) ; `sources` = source de chaque ligne.
+    """
+    keep = np.ones(len(df), dtype=bool)
+
+    if "Référence" in df.columns:
+        # 1. Déduplication sur l'ID de référence
+        keep &= ~df["Référence"].astype(str).duplicated(keep="first").to_numpy()
+        
+    # 2. Déduplication sur l'ensemble des colonnes (pour capturer les lignes sans Référence ou les doublons stricts)
+    keep[keep] = ~fingerprint.duplicated(fingerprint.row_fingerprints(df, rows=keep))
+    return df[keep], fingerprint.count_by_source(~keep, sources)
+
 
-if not files:
-    print(f"❌ AUCUN fichier source trouvé dans {SOURCE_DIR}.")
-    exit()
+def build_dates(df_final: pd.DataFrame) -> pd.Series:
+    """Série datetime TEMP pour le groupement : colonne "Date", complétée par "Timestamp"."""
+    dates = pd.Series(pd.NaT, index=df_final.index) 
 
-print(f"\nFichiers sources pris en compte ({len(files)}) : {[p.name for p in files]}")
+    if "Date" in df_final.columns:
+        dates = parse_date_series(df_final["Date"]) 
 
-# 2. Déterminer le header de référence (du fichier le plus récent)
-latest_file_path = files[-1]
-try:
-    # Lire uniquement la première ligne pour obtenir les noms de colonnes
-    header_reference_df = pd.read_csv(latest_file_path, sep=SEP, encoding=ENCODING, nrows=0)
-    # Nettoyer et définir l'ordre de référence des colonnes
-    header_reference = [c.strip() for c in header_reference_df.columns]
-    print(f"Header de référence (du fichier {latest_file_path.name}) : {len(header_reference)} colonnes.")
-except Exception as e:
-    print(f"❌ Erreur critique lors de la lecture du header de référence du fichier {latest_file_path.name}: {e}")
-    exit()
-
-# 3. Lire toutes les sources (sans header), les aligner et les concaténer
-rows = []
-print("\n--- Étape 3 : Lecture, Alignement et Concaténation ---")
-for p in files:
+    ts_col = detect_ts_col(df_final)
+    if ts_col:
+        # Utiliser le Timestamp pour combler les dates manquantes
+        dates = dates.fillna(parse_ts_series(df_final[ts_col]))
+    return dates
+
+
+def month_file(output_dir: Path, period) -> Path:
+    """Nommage du fichier selon le format "alertes_YYYY_MM.csv"."""
+    return output_dir / f"alertes_{period.year}_{period.month:02d}.csv"
+
+
+def read_output(path: Path, header: list[str]) -> pd.DataFrame:
+    """Relit un fichier déjà exporté (avec en-tête), aligné sur `header`."""
+    df = pd.read_csv(path, sep=SEP, encoding=ENCODING, dtype=str)
+    df.columns = [c.strip() for c in df.columns]
+    return df.reindex(columns=header)
+
+
+def month_label(dates: pd.Series) -> pd.Series:
+    """Libellé du fichier de sortie de chaque ligne : "YYYY_MM" ou "sans_date"."""
+    return dates.dt.strftime("%Y_%m").fillna(NO_DATE_LABEL)
+
+
+def months_by_source(index: pd.Index, dates: pd.Series, lengths: list[int]) -> list[list[str]]:
+    """
+    Fichiers de sortie touchés par chaque source, d'après la position (dans la
+    concaténation) des lignes conservées : `index` et `dates` après
+    déduplication, `lengths` = nombre de lignes de chaque source.
+    """
+    source = np.searchsorted(np.cumsum(lengths), index.to_numpy(), side="right")
+    per_source = pd.Series(month_label(dates).to_numpy()).groupby(source).unique()
+    return [sorted(per_source.get(i, [])) for i in range(len(lengths))]
+
+
+def output_file(output_dir: Path, label: str) -> Path:
+    """Fichier de sortie d'un libellé de `month_label`."""
+    return output_dir / (NO_DATE_FILE if label == NO_DATE_LABEL else f"alertes_{label}.csv")
+
+
+def append_csv(df: pd.DataFrame, path: Path):
+    """Ajoute des lignes à un CSV existant SANS le relire : copie brute + ajout dans un temporaire, puis replace()."""
+    with tempfile.NamedTemporaryFile("wb", delete=False, dir=path.parent, suffix=".tmp") as tmpf:
+        with open(path, "rb") as src:
+            shutil.copyfileobj(src, tmpf)
+        tmpf.write(df.to_csv(sep=SEP, index=False, header=False).encode("utf-8"))
+        tmp_path = Path(tmpf.name)
+    tmp_path.replace(path)
+
+
+def merge_into_outputs(frames: list, header: list[str], output_dir: Path = None):
+    """
+    Fusionne de NOUVELLES lignes (sources déjà alignées sur `header`) dans les
+    fichiers mensuels existants ; seuls les mois touchés sont réécrits.
+    Avec l'index des Références (créé par une reconstruction complète), les
+    lignes déjà exportées sont écartées par recherche dans l'index et les mois
+    touchés sont complétés sans être relus ; sinon ils sont relus et
+    dédoublonnés (lignes existantes prioritaires).
+    Retourne ({nom de fichier: nb de lignes écrites}, [mois touchés par chaque source]).
+    """
+    output_dir = Path(output_dir or OUTPUT_DIR)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    new_df, _ = deduplicate(concat_sources(frames))
+    dates = build_dates(new_df)
+    labels = month_label(dates)
+
+    conn = None
+    keep = pd.Series(True, index=new_df.index)
+    if "Référence" in new_df.columns and (output_dir / INDEX_NAME).exists():
+        conn = open_index(output_dir)
+        refs = new_df["Référence"]
+        has_ref = valid_references(refs)
+        keep = ~(has_ref & refs.isin(known_references(conn, refs[has_ref])))
+        if not keep.all():
+            print(f"Lignes déjà exportées (index des Références) : {int((~keep).sum())} ignorée(s)")
+
+    written = {}
     try:
-        # 1. Lire les données en sautant la ligne d'en-tête (header=None)
-        df = pd.read_csv(
-            p, 
-            sep=SEP, 
-            encoding=ENCODING, 
-            header=None,  
-            skiprows=1,   
-            dtype=str,  # Lecture en chaîne de caractères pour éviter les confusions de types
-            # CORRECTION : Utilisation du moteur Python pour tolérer les erreurs de formatage (;) dans les données  
-            engine='python'
-        )
-        
-        # S'assurer que le nombre de colonnes du DataFrame n'excède pas le header de référence
-        # C'est une vérification de sécurité
-        if df.shape[1] > len(header_reference):
-             print(f"⚠️ Avertissement : Le fichier {p.name} a plus de colonnes de données ({df.shape[1]}) que le header de référence ({len(header_reference)}). Les colonnes excédentaires seront ignorées.")
-             df = df.iloc[:, :len(header_reference)]
-             
-        # 2. Renommer les colonnes lues (0, 1, 2...) avec les noms du header de référence
-        df.columns = header_reference[:df.shape[1]]
-        
-        # 3. Alignement explicite sur toutes les colonnes de référence (ajoute les colonnes manquantes en NaN)
-        df_aligned = df.reindex(columns=header_reference) 
-        rows.append(df_aligned)
-        
-    except Exception as e:
-        print(f"❌ Erreur lors du traitement du fichier {p.name} : {e}")
+        for label, group in new_df[keep].groupby(labels[keep], sort=True):
+            out_path = output_file(output_dir, label)
+            if out_path.exists() and conn is not None and has_ref[group.index].all():
+                # Références toutes nouvelles : aucun doublon possible avec le fichier existant
+                append_csv(group[header], out_path)
+                written[out_path.name] = len(group)
+                print(f"✅ Complété : {out_path.name} (+{len(group)} lignes)")
+                continue
+            if out_path.exists():
+                group, _ = deduplicate(pd.concat([read_output(out_path, header), group], ignore_index=True))
+            safe_write_csv(group[header], out_path)
+            written[out_path.name] = len(group)
+            print(f"✅ Écrit : {out_path.name} ({len(group)} lignes)")
+        if conn is not None:
+            added = keep & has_ref
+            add_references(conn, new_df.loc[added, "Référence"], labels[added])
+    finally:
+        if conn is not None:
+            conn.close()
+    return written, months_by_source(new_df.index[keep], dates[keep], [len(f) for f in frames])
+
+
+# --- Index des Références ---
+
+def open_index(output_dir: Path) -> sqlite3.Connection:
+    """Index persistant Référence → fichier mensuel (`OUTPUT_DIR/references.sqlite`)."""
+    conn = sqlite3.connect(output_dir / INDEX_NAME)
+    conn.execute("CREATE TABLE IF NOT EXISTS refs (reference TEXT PRIMARY KEY, month TEXT NOT NULL) WITHOUT ROWID")
+    return conn
+
+
+def valid_references(refs: pd.Series) -> pd.Series:
+    """Lignes avec une Référence exploitable (les absentes ne sont ni indexées ni recherchées)."""
+    return refs.notna() & ~refs.isin(["", "nan", "None"])
+
+
+def known_references(conn: sqlite3.Connection, refs: pd.Series) -> set:
+    """Références de `refs` déjà présentes dans l'index."""
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS lookup (reference TEXT PRIMARY KEY)")
+    conn.execute("DELETE FROM lookup")
+    conn.executemany("INSERT OR IGNORE INTO lookup VALUES (?)", ((r,) for r in refs))
+    return {r for (r,) in conn.execute("SELECT reference FROM lookup JOIN refs USING (reference)")}
+
+
+def add_references(conn: sqlite3.Connection, refs: pd.Series, labels: pd.Series):
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO refs VALUES (?, ?)", zip(refs, labels))
+
+
+def rebuild_index(output_dir: Path, refs: pd.Series, labels: pd.Series):
+    """Recrée l'index à partir des lignes exportées par une reconstruction complète."""
+    conn = open_index(output_dir)
+    try:
+        with conn:
+            conn.execute("DELETE FROM refs")
+        has_ref = valid_references(refs)
+        add_references(conn, refs[has_ref], labels[has_ref])
+    finally:
+        conn.close()
+
+
+def find_reference(reference: str, output_dir: Path = None) -> str | None:
+    """Fichier de sortie contenant l'alerte `reference`, ou None."""
+    output_dir = Path(output_dir or OUTPUT_DIR)
+    if not (output_dir / INDEX_NAME).exists():
+        return None
+    conn = open_index(output_dir)
+    try:
+        row = conn.execute("SELECT month FROM refs WHERE reference = ?", (reference,)).fetchone()
+    finally:
+        conn.close()
+    return output_file(output_dir, row[0]).name if row else None
 
-if not rows:
-    print("Aucune donnée valide à traiter.")
-    exit()
 
-# Concaténation de toutes les données ALIGNÉES
-all_df = pd.concat(rows, ignore_index=True)
-header = header_reference 
+# --- Manifeste des sources ---
 
-total_rows_before_dedup = len(all_df)
-print(f"\nNombre total de lignes avant déduplication : {total_rows_before_dedup}")
+def file_digest(path: Path) -> str:
+    """Empreinte SHA-256 du contenu d'une source."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-# 4. Déduplication globale
-df_final = all_df.copy()
 
-if "Référence" in df_final.columns:
-    # 1. Déduplication sur l'ID de référence
-    df_final['Référence'] = df_final['Référence'].astype(str)
-    df_final = df_final.drop_duplicates(subset=["Référence"], keep="first")
-    
-# 2. Déduplication sur l'ensemble des colonnes (pour capturer les lignes sans Référence ou les doublons stricts)
-df_final = df_final.astype(str).drop_duplicates(keep="first")
+def load_manifest(output_dir: Path) -> dict:
+    try:
+        with open(output_dir / MANIFEST_NAME, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(output_dir: Path, manifest: dict):
+    """Écriture atomique du manifeste (fichier temporaire + replace)."""
+    tmp_path = output_dir / f"{MANIFEST_NAME}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    tmp_path.replace(output_dir / MANIFEST_NAME)
+
+
+def source_key(path: Path, source_dir: Path) -> str:
+    return path.relative_to(source_dir).as_posix()
+
+
+def manifest_entry(path: Path, digest: str, rows: int, months: list[str]) -> dict:
+    st = path.stat()
+    return {"size": st.st_size, "mtime": st.st_mtime, "sha256": digest, "rows": rows, "months": months}
+
+
+def record_sources(output_dir: Path, header: list[str], merged: list, source_dir: Path = None) -> bool:
+    """
+    Inscrit au manifeste de `output_dir` des sources fusionnées hors de main()
+    (ex. scrap_plw.py --merge-dir) : [(chemin, empreinte, lignes, mois)].
+    Une source hors de `source_dir` est enregistrée sous son chemin absolu ;
+    copiée ou déplacée ensuite dans `source_dir`, plan_sources la reconnaît
+    par son empreinte. Retourne False (manifeste inchangé) si le header de
+    référence diffère : le prochain run de rename.py reconstruira tout.
+    """
+    output_dir = Path(output_dir)
+    source_dir = Path(source_dir or SOURCE_DIR)
+    manifest = load_manifest(output_dir)
+    if manifest.setdefault("header", header) != header:
+        return False
+    sources = manifest.setdefault("sources", {})
+    for path, digest, rows, months in merged:
+        path = Path(path)
+        try:
+            key = source_key(path, source_dir)
+        except ValueError:
+            key = path.resolve().as_posix()
+        sources[key] = manifest_entry(path, digest, rows, months)
+    save_manifest(output_dir, manifest)
+    return True
+
+
+def plan_sources(files: list[Path], source_dir: Path, manifest: dict):
+    """
+    Sépare les sources déjà fusionnées de celles à lire. Taille + date de
+    modification identiques → inchangée, sans relecture ; sinon l'empreinte du
+    contenu tranche (fichier simplement touché, ou déplacé / copié).
+    Retourne (sources à lire, {chemin: empreinte}, nb de sources inchangées).
+    """
+    entries = manifest.setdefault("sources", {})
+    known = {entry["sha256"]: entry for entry in entries.values()}
+    todo, digests, unchanged = [], {}, 0
+    for p in files:
+        key = source_key(p, source_dir)
+        entry = entries.get(key)
+        st = p.stat()
+        if entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+            unchanged += 1
+            continue
+        digest = file_digest(p)
+        previous = entry if entry and entry["sha256"] == digest else known.get(digest)
+        if previous:
+            entries[key] = manifest_entry(p, digest, previous["rows"], previous["months"])
+            unchanged += 1
+            continue
+        todo.append(p)
+        digests[p] = digest
+    return todo, digests, unchanged
+
 
+# --- Processus Principal ---
 
-rows_after_dedup = len(df_final)
-print(f"Nombre total de lignes après déduplication : {rows_after_dedup} (supprimé {total_rows_before_dedup - rows_after_dedup})")
+class RenameError(Exception):
+    """Traitement impossible (aucune source, header illisible, aucune donnée) : rien n'est écrit."""
+
+
+def read_sources(files: list[Path], header_reference: list[str]):
+    """
+    Lit les sources (sans header) en parallèle et les aligne. Affiche les
+    erreurs par fichier et le nombre de lignes par voie de lecture.
+    Retourne (sources lues, données de chacune).
+    """
+    read, rows = [], []
+    stats = {}
+    if MAX_WORKERS == 1 or len(files) == 1:
+        results = map(parse_file, files, repeat(header_reference))
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=MAX_WORKERS)
+        # Résultats dans l'ordre des fichiers : la déduplication garde la première occurrence
+        results = pool.map(parse_file, files, repeat(header_reference))
+    try:
+        for p, (part, file_stats, error) in zip(files, results):
+            if error is not None:
+                print(f"❌ Erreur lors du traitement du fichier {p.name} : {error}")
+                continue
+            read.append(p)
+            rows.append(part)
+            if file_stats.get("python") or file_stats.get("repaired"):
+                print(f"⚠️ {p.name} : {file_stats['repaired']} ligne(s) réparée(s), {file_stats['python']} ligne(s) en quarantaine (moteur python)")
+            for key, value in file_stats.items():
+                stats[key] = stats.get(key, 0) + value
+    finally:
+        if pool is not None:
+            pool.shutdown()
 
+    print(f"Lignes lues : {stats.get('fast', 0)} par le moteur rapide ({FAST_ENGINE}, dont "
+          f"{stats.get('repaired', 0)} réparées), {stats.get('python', 0)} par le moteur python (quarantaine)")
+    return read, rows
 
-# 5. Construction de la série datetime TEMP pour le groupement
-dates = pd.Series(pd.NaT, index=df_final.index) 
 
-if "Date" in df_final.columns:
-    dates = parse_date_series(df_final["Date"]) 
+def full_rebuild(files: list[Path], header_reference: list[str]):
+    """Étapes 3 à 7 sur toutes les sources ; retourne (sources lues, lignes et mois touchés de chacune)."""
+    # 3. Lire toutes les sources (sans header) en parallèle, les aligner et les concaténer
+    print("\n--- Étape 3 : Lecture, Alignement et Concaténation ---")
+    read, rows = read_sources(files, header_reference)
 
-ts_col = detect_ts_col(df_final)
-if ts_col:
-    # Utiliser le Timestamp pour combler les dates manquantes
-    dates = dates.fillna(parse_ts_series(df_final[ts_col]))
+    if not rows:
+        raise RenameError("Aucune donnée valide à traiter.")
 
-na_count = int(dates.isna().sum())
-print(f"Dates valides pour le groupement: {len(df_final)-na_count} | Dates manquantes/invalides (NaT): {na_count}")
+    # Concaténation de toutes les données ALIGNÉES
+    all_df = concat_sources(rows)
+    header = header_reference 
 
+    total_rows_before_dedup = len(all_df)
+    print(f"\nNombre total de lignes avant déduplication : {total_rows_before_dedup}")
 
-# 6. Groupement par mois/année et Exportation
-periods = dates.dt.to_period("M")
-unique_periods = sorted(periods.dropna().unique())
+    # 4. Déduplication globale (doublons supprimés comptés par fichier source)
+    lengths = [len(part) for part in rows]
+    df_final, removed = deduplicate(all_df, np.repeat(np.arange(len(rows)), lengths))
 
-print(f"\nDébut de l'exportation par mois dans le dossier : {OUTPUT_DIR}")
+    rows_after_dedup = len(df_final)
+    print(f"Nombre total de lignes après déduplication : {rows_after_dedup} (supprimé {total_rows_before_dedup - rows_after_dedup})")
+    for i, count in sorted(removed.items()):
+        print(f"   - {read[i].name} : {count} doublon(s) supprimé(s)")
+
+
+    # 5. Construction de la série datetime TEMP pour le groupement
+    dates = build_dates(df_final)
+
+    na_count = int(dates.isna().sum())
+    print(f"Dates valides pour le groupement: {len(df_final)-na_count} | Dates manquantes/invalides (NaT): {na_count}")
 
-for p in unique_periods:
-    mask = periods == p
-    group = df_final.loc[mask].copy() 
-    
-    # S'assurer que les colonnes sont dans l'ordre du header de référence
-    group_to_export = group[header]
-    
-    # Nommage du fichier selon le format "alertes_YYYY_MM.csv"
-    out_name = f"alertes_{p.year}_{p.month:02d}.csv"
-    out_path = OUTPUT_DIR / out_name
-    
-    safe_write_csv(group_to_export, out_path)
-    print(f"✅ Écrit : {out_name} ({len(group_to_export)} lignes)")
 
-# 7. Lignes sans date (audit)
-if na_count > 0:
-    df_sans_date = df_final.loc[dates.isna()]
-    out_name_audit = "alertes_sans_date.csv"
-    safe_write_csv(df_sans_date[header], OUTPUT_DIR / out_name_audit)
-    print(f"⚠️ Écrit l'audit des lignes sans date : {out_name_audit} ({len(df_sans_date)} lignes)")
+    # 6. Groupement par mois/année et Exportation
+    periods = dates.dt.to_period("M")
+    unique_periods = sorted(periods.dropna().unique())
 
-print("\nProcessus de traitement et d'exportation terminé.")
\ No newline at end of file
+    print(f"\nDébut de l'exportation par mois dans le dossier : {OUTPUT_DIR}")
+
+    for p in unique_periods:
+        mask = periods == p
+        group = df_final.loc[mask].copy() 
+        
+        # S'assurer que les colonnes sont dans l'ordre du header de référence
+        group_to_export = group[header]
+        
+        out_path = month_file(OUTPUT_DIR, p)
+        safe_write_csv(group_to_export, out_path)
+        print(f"✅ Écrit : {out_path.name} ({len(group_to_export)} lignes)")
+
+    # 7. Lignes sans date (audit)
+    if na_count > 0:
+        df_sans_date = df_final.loc[dates.isna()]
+        safe_write_csv(df_sans_date[header], OUTPUT_DIR / NO_DATE_FILE)
+        print(f"⚠️ Écrit l'audit des lignes sans date : {NO_DATE_FILE} ({len(df_sans_date)} lignes)")
+
+    # 8. Index des Références (dédoublonnage des runs incrémentaux, recherche d'une alerte)
+    if "Référence" in df_final.columns:
+        rebuild_index(OUTPUT_DIR, df_final["Référence"], month_label(dates))
+
+    return read, list(zip(lengths, months_by_source(df_final.index, dates, lengths)))
+
+
+def incremental_merge(files: list[Path], header_reference: list[str]):
+    """Étapes 3 à 7 limitées aux sources nouvelles ou modifiées, fusionnées dans les mois existants."""
+    print("\n--- Étape 3 : Lecture des sources nouvelles ou modifiées ---")
+    read, rows = read_sources(files, header_reference)
+    if not rows:
+        print("Aucune donnée valide à traiter.")
+        return read, []
+    print(f"\nFusion de {sum(len(part) for part in rows)} ligne(s) dans le dossier : {OUTPUT_DIR}")
+    _, months = merge_into_outputs(rows, header_reference, OUTPUT_DIR)
+    return read, list(zip([len(part) for part in rows], months))
+
+
+def main(full=False):
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    print(f"Dossier source : {SOURCE_DIR}")
+    print(f"Dossier d'exportation : {OUTPUT_DIR}")
+
+    # 1. Lister tous les fichiers source (hors fichiers générés par le script)
+    files = list_sources(SOURCE_DIR)
+
+    if not files:
+        raise RenameError(f"AUCUN fichier source trouvé dans {SOURCE_DIR}.")
+
+    print(f"\nFichiers sources pris en compte ({len(files)}) : {[p.name for p in files]}")
+
+    # 2. Déterminer le header de référence (du fichier le plus récent)
+    latest_file_path = files[-1]
+    try:
+        # Lire uniquement la première ligne pour obtenir les noms de colonnes
+        header_reference = read_header(latest_file_path)
+        print(f"Header de référence (du fichier {latest_file_path.name}) : {len(header_reference)} colonnes.")
+    except Exception as e:
+        raise RenameError(f"Erreur critique lors de la lecture du header de référence du fichier "
+                          f"{latest_file_path.name}: {e}") from e
+
+    # Manifeste : reconstruction complète si absent, si le header a changé ou si les sorties ont disparu
+    manifest = load_manifest(OUTPUT_DIR)
+    has_outputs = any(is_generated(p.name) for p in OUTPUT_DIR.glob("*.csv"))
+    missing_index = "Référence" in header_reference and not (OUTPUT_DIR / INDEX_NAME).exists()
+    if full or not has_outputs or missing_index or manifest.get("header") != header_reference:
+        if not full and manifest:
+            print("⚠️ Header de référence modifié, sorties ou index absents : reconstruction complète")
+        manifest = {"header": header_reference, "sources": {}}
+        digests = {p: file_digest(p) for p in files}
+        read, results = full_rebuild(files, header_reference)
+    else:
+        todo, digests, unchanged = plan_sources(files, SOURCE_DIR, manifest)
+        print(f"\nSources déjà fusionnées : {unchanged} | nouvelles ou modifiées : {len(todo)}")
+        if todo:
+            read, results = incremental_merge(todo, header_reference)
+        else:
+            print("Aucune nouvelle source : aucun fichier mensuel à réécrire.")
+            read, results = [], []
+
+    for p, (rows, months) in zip(read, results):
+        manifest["sources"][source_key(p, SOURCE_DIR)] = manifest_entry(p, digests[p], rows, months)
+    save_manifest(OUTPUT_DIR, manifest)
+
+    print("\nProcessus de traitement et d'exportation terminé.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regroupement des alertes CSV par mois")
+    parser.add_argument("--full", action="store_true",
+                        help="Ignorer le manifeste : relire toutes les sources et réécrire tous les mois")
+    parser.add_argument("--where", metavar="REFERENCE",
+                        help="Indiquer le fichier mensuel qui contient l'alerte REFERENCE, sans rien traiter")
+    args = parser.parse_args()
+    if args.where:
+        location = find_reference(args.where)
+        print(f"{args.where} : {location}" if location else f"❌ {args.where} absente de l'index {OUTPUT_DIR / INDEX_NAME}")
+    else:
+        try:
+            main(full=args.full)
+        except RenameError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
@@ -1,9 +1,14 @@
 import argparse
 import os
+import sys
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import logging
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fingerprint  # noqa: E402  (module partagé à la racine du dépôt)
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
 logger = logging.getLogger(__name__)
 
@@ -32,10 +37,11 @@ def main(input_dir, output_dir, dry_run=False):
     all_files = [os.path.join(input_dir, f) for f in os.listdir(input_dir) if f.lower().endswith('.csv')]
     logger.info(f"Found {len(all_files)} CSV files in {input_dir}")
 
-    # global set of hashes to avoid duplicates across months
+    # global set of row fingerprints to avoid duplicates across files and months
+    # (set lookups: each file costs its own size, not the size of all previous files)
     seen_hashes = set()
 
-    monthly_groups = {}  # (year, month) -> list of rows (DataFrame)
+    monthly_groups = {}  # (year, month) -> list of DataFrames
 
     for fp in all_files:
         try:
@@ -54,28 +60,27 @@ def main(input_dir, output_dir, dry_run=False):
             logger.warning(f"All dates invalid in {fp}, skipping")
             continue
 
-        # For each row, determine month-year and append
-        for _, row in df.iterrows():
-            dt = row[date_col]
-            if pd.isna(dt):
-                continue
-            key = (dt.year, dt.month)
-            row_tuple = tuple(row.astype(str).tolist())
-            row_hash = hash(row_tuple)
-            if (row_hash) in seen_hashes:
-                continue
-            seen_hashes.add(row_hash)
-            if key not in monthly_groups:
-                monthly_groups[key] = []
-            monthly_groups[key].append(row)
+        # Vectorized: drop rows without a date, then duplicates (within the file and vs previous files)
+        df = df[df[date_col].notna()]
+        hashes = fingerprint.row_fingerprints(df)
+        seen = np.fromiter(map(seen_hashes.__contains__, hashes.tolist()), dtype=bool, count=len(hashes))
+        dup = fingerprint.duplicated(hashes) | seen
+        if dup.any():
+            logger.info(f"{int(dup.sum())} duplicate row(s) removed from {fp}")
+        df, hashes = df[~dup], hashes[~dup]
+        seen_hashes.update(hashes.tolist())
+
+        # Determine month-year of each row and append per month
+        for (y, m), group in df.groupby([df[date_col].dt.year, df[date_col].dt.month]):
+            monthly_groups.setdefault((y, m), []).append(group)
 
     # Write per-month files
-    for (y, m), rows in sorted(monthly_groups.items()):
+    for (y, m), frames in sorted(monthly_groups.items()):
         out_name = os.path.join(output_dir, f"alertes_{y:04d}-{m:02d}.csv")
-        logger.info(f"Writing {len(rows)} rows to {out_name}")
+        out_df = pd.concat(frames, ignore_index=True)
+        logger.info(f"Writing {len(out_df)} rows to {out_name}")
         if dry_run:
             continue
-        out_df = pd.DataFrame(rows)
         # ensure date column is first column
         cols = list(out_df.columns)
         # try to place date-like col first
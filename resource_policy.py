@@ -0,0 +1,271 @@
+"""
+===============================================================================
+ Module : resource_policy.py
+ Auteur : Bruno Coulet - RTM - Dopex
+-------------------------------------------------------------------------------
+ Objectif :
+     Alléger le navigateur des scrapers : ne pas charger images, médias,
+     scripts d'analytics ni tuiles de carte de l'application WaryMe, et garder
+     les bundles Angular dans un cache disque persistant. Les icônes (sprites
+     SVG de mat-icon, polices d'icônes) restent chargées : boutons et entrées
+     de menu cherchés par leur texte en dépendent.
+
+ Politique :
+    `DEFAULT_POLICY` ci-dessous, surchargeable par un fichier
+    `resource_policy.json` à la racine du projet (mêmes clés) :
+      * enabled        : active / désactive le blocage ;
+      * block_types    : types de ressources Playwright bloqués ;
+      * block_patterns : motifs d'URL bloqués (jokers `*`, syntaxe CDP) ;
+      * allow_patterns : motifs d'URL jamais bloqués (prioritaires) ;
+      * disk_cache     : cache disque persistant (Selenium) dans `.cache/`.
+
+ Application :
+    * Selenium (scrap.py)      : options Chrome allégées + `--disk-cache-dir`,
+      puis `Network.setBlockedURLs` via CDP. Cette commande ne connaît que
+      des motifs à bloquer (ni types, ni exceptions) : avec des
+      `allow_patterns`, le blocage d'URL et la désactivation des images sont
+      abandonnés côté Selenium (avertissement), pour qu'une ressource
+      autorisée soit chargée par les deux moteurs ;
+    * Playwright (scrap_plw.py): `context.route` qui abandonne les requêtes
+      non essentielles. Les contextes Playwright étant éphémères (pas de
+      profil disque), le cache persistant ne concerne que Selenium.
+
+ Mesure :
+    `python resource_policy.py --bench [--engine selenium|playwright] [--runs N]`
+    compare, avec et sans blocage, les octets transférés et le temps jusqu'à
+    la première ligne de la grille des alertes. Chaque run part d'un cache
+    disque vide (`cold_cache`) : seul l'effet du blocage est mesuré.
+===============================================================================
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+import shutil
+import argparse
+from contextlib import contextmanager
+from fnmatch import fnmatchcase
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+POLICY_FILE = os.path.join(BASE_DIR, "resource_policy.json")
+CACHE_DIR = os.path.join(BASE_DIR, ".cache", "chrome")
+
+DEFAULT_POLICY = {
+    "enabled": True,
+    "block_types": ["image", "media"],
+    "block_patterns": [
+        # Images et médias lourds ; SVG et polices (icônes Angular Material) non bloqués
+        "*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.ico*",
+        "*.mp4*", "*.webm*",
+        "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+        "*hotjar.com*", "*matomo*", "*sentry.io*",
+        "*tile.openstreetmap.org*", "*maps.googleapis.com*", "*maps.gstatic.com*",
+    ],
+    "allow_patterns": [],
+    "disk_cache": True,
+}
+
+# Trafic de fond de Chrome inutile pour un scraper
+LEAN_CHROME_ARGUMENTS = [
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--no-first-run",
+    "--mute-audio",
+    "--blink-settings=imagesEnabled=false",
+]
+
+
+def load_policy(path=POLICY_FILE):
+    """Politique par défaut, surchargée par `resource_policy.json` s'il existe."""
+    policy = dict(DEFAULT_POLICY)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            policy.update(json.load(f))
+    return policy
+
+
+def is_blocked(url, resource_type, policy):
+    """Décide si une requête doit être abandonnée."""
+    if any(fnmatchcase(url, p) for p in policy["allow_patterns"]):
+        return False
+    if resource_type in policy["block_types"]:
+        return True
+    return any(fnmatchcase(url, p) for p in policy["block_patterns"])
+
+
+# ================================================================
+# SELENIUM
+# ================================================================
+
+def apply_to_chrome_options(options, policy, cache_name="main"):
+    """
+    Ajoute les options Chrome allégées et le cache disque persistant.
+    `cache_name` sépare les caches des sessions parallèles (un cache disque
+    Chrome ne se partage pas entre processus).
+    """
+    if not policy["enabled"]:
+        return options
+    for arg in LEAN_CHROME_ARGUMENTS:
+        if arg.startswith("--blink-settings=imagesEnabled") and policy["allow_patterns"]:
+            continue  # toutes les images, y compris celles autorisées
+        options.add_argument(arg)
+    if policy["disk_cache"]:
+        cache_dir = os.path.join(CACHE_DIR, cache_name)
+        os.makedirs(cache_dir, exist_ok=True)
+        options.add_argument(f"--disk-cache-dir={cache_dir}")
+    return options
+
+
+@contextmanager
+def cold_cache(prefix="bench"):
+    """
+    Nom de cache disque neuf, supprimé à la sortie : chaque run de mesure part
+    à froid, avec ou sans blocage (un cache chaud fausserait la comparaison).
+    """
+    name = f"{prefix}_{os.getpid()}_{time.time_ns()}"
+    try:
+        yield name
+    finally:
+        shutil.rmtree(os.path.join(CACHE_DIR, name), ignore_errors=True)
+
+
+def apply_to_selenium(driver, policy):
+    """
+    Bloque les URL non essentielles via CDP (à appeler avant le premier driver.get).
+    `Network.setBlockedURLs` ne sait pas exprimer d'exception : avec des
+    `allow_patterns`, aucun motif n'est bloqué (mieux vaut charger trop que
+    priver la page d'une ressource autorisée, comme le fait Playwright).
+    """
+    if not policy["enabled"]:
+        return
+    if policy["allow_patterns"]:
+        logger.warning("allow_patterns non pris en charge par Selenium (Network.setBlockedURLs) : "
+                       "blocage d'URL désactivé pour ce navigateur")
+        return
+    patterns = list(policy["block_patterns"])
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+    logger.info(f"Blocage réseau actif ({len(patterns)} motifs)")
+
+
+# ================================================================
+# PLAYWRIGHT
+# ================================================================
+
+async def apply_to_playwright(context, policy):
+    """Installe sur le contexte une route qui abandonne les requêtes non essentielles."""
+    if not policy["enabled"]:
+        return
+
+    async def handle(route):
+        request = route.request
+        if is_blocked(request.url, request.resource_type, policy):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    await context.route("**/*", handle)
+    logger.info("Blocage réseau actif (context.route)")
+
+
+# ================================================================
+# MESURE (avec / sans blocage)
+# ================================================================
+
+FIRST_ROW_XPATH = "//tr[@role='row' or contains(@class, 'mat-row')]"
+
+
+def _bench_selenium(policy, cache_name):
+    import scrap
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from utils import click_menu_item, wait_until
+
+    start = time.perf_counter()
+    driver = scrap.start_driver(policy=policy, cache_name=cache_name)
+    try:
+        scrap.ensure_logged_in(driver)
+        click_menu_item(driver, "Alertes internes")
+        wait_until(driver, EC.presence_of_element_located((By.XPATH, FIRST_ROW_XPATH)), 30, "Première ligne")
+        elapsed = time.perf_counter() - start
+
+        transferred = 0
+        for entry in driver.get_log("performance"):
+            message = json.loads(entry["message"])["message"]
+            if message.get("method") == "Network.loadingFinished":
+                transferred += message["params"].get("encodedDataLength", 0)
+        return transferred, elapsed
+    finally:
+        driver.quit()
+
+
+async def _bench_playwright(policy):
+    import scrap_plw
+    from dotenv import load_dotenv
+    from playwright.async_api import async_playwright
+
+    load_dotenv()
+    start = time.perf_counter()
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        try:
+            context, page = await scrap_plw.new_logged_in_context(
+                browser, os.getenv("ID"), os.getenv("PASSWORD"), os.getenv("URL"),
+                policy=policy,
+            )
+            # Octets réellement reçus (hors requêtes abandonnées), via CDP
+            transferred = 0
+
+            def on_finished(params):
+                nonlocal transferred
+                transferred += params.get("encodedDataLength", 0)
+            cdp = await context.new_cdp_session(page)
+            await cdp.send("Network.enable")
+            cdp.on("Network.loadingFinished", on_finished)
+
+            await page.click("text=Alertes internes")
+            await page.wait_for_selector(FIRST_ROW_XPATH, state="attached", timeout=30000)
+            return transferred, time.perf_counter() - start
+        finally:
+            await browser.close()
+
+
+def benchmark(engine="selenium", runs=3):
+    """Compare blocage actif / inactif ; retourne les mesures et affiche un tableau."""
+    results = []
+    for enabled in (False, True):
+        # Sans blocage : profil temporaire neuf de chromedriver ; avec : cache
+        # disque neuf (cold_cache). Les deux bras partent donc à froid.
+        policy = dict(load_policy(), enabled=enabled)
+        for run in range(1, runs + 1):
+            if engine == "selenium":
+                with cold_cache() as cache_name:
+                    transferred, elapsed = _bench_selenium(policy, cache_name)
+            else:
+                transferred, elapsed = asyncio.run(_bench_playwright(policy))
+            results.append({"blocking": enabled, "run": run, "bytes": transferred, "seconds": elapsed})
+
+    print(f"{'Blocage':<10} {'Run':>4} {'Octets':>14} {'1re ligne (s)':>14}")
+    for r in results:
+        print(f"{'oui' if r['blocking'] else 'non':<10} {r['run']:>4} {r['bytes']:>14,} {r['seconds']:>14.2f}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Politique de blocage des ressources du navigateur")
+    parser.add_argument("--bench", action="store_true", help="Mesurer avec et sans blocage")
+    parser.add_argument("--engine", choices=["selenium", "playwright"], default="selenium")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.bench:
+        benchmark(args.engine, args.runs)
+    else:
+        print(json.dumps(load_policy(), indent=2))
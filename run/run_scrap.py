@@ -2,51 +2,310 @@ import os
 import subprocess
 import sys
 import io
+import json
+import time
+import shlex
+import signal
+import argparse
+import threading
+import urllib.request
+import urllib.error
+from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 
-# Force l'encodage UTF-8 pour stdout et stderr
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
-sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+try:
+    import psutil  # optionnel : pic mémoire et arbre de processus (Chrome) à tuer
+except ImportError:
+    psutil = None
 
 # Chemin absolu du dossier du script
 SCRIPT_DIR = r"C:\Users\bcoulet\Documents\projets\RTM_alerte\rtm_waryme"
-os.chdir(SCRIPT_DIR)
 
 # Chemin vers l'exécutable Python de l'environnement uv
 UV_PYTHON = os.path.join(SCRIPT_DIR, ".venv", "Scripts", "python.exe")
+FALLBACK_PYTHON = r"C:\Users\bcoulet\AppData\Local\anaconda3\python.exe"
+
+# Démon scrap_daemon.py : si un navigateur chaud et connecté répond, lui confier l'export
+DAEMON_URL = os.getenv("SCRAP_DAEMON_URL", "http://127.0.0.1:8765")
+# Secret généré par le démon au démarrage, exigé sur /export
+DAEMON_TOKEN_FILE = os.path.join(SCRIPT_DIR, ".session", "daemon_token")
+
 
-# Vérifie si l'environnement uv existe et utilise-le
-if os.path.exists(UV_PYTHON):
-    python_exe = UV_PYTHON
-    print(f"Utilisation de l'environnement uv : {python_exe}")
-else:
-    python_exe = r"C:\Users\bcoulet\AppData\Local\anaconda3\python.exe"
+def build_parser():
+    parser = argparse.ArgumentParser(description="Client d'export WaryMe")
+    parser.add_argument("--start", help="Début YYYY-MM-DD (défaut : périodes manquantes, voir planner.py)")
+    parser.add_argument("--end", help="Fin YYYY-MM-DD (défaut : hier si --start est donné)")
+    parser.add_argument("--menu", default="Alertes internes")
+    parser.add_argument("--output", help="Nom du CSV à produire, sous alertes/ (démon uniquement)")
+    parser.add_argument("--engine", choices=["auto", "http", "browser"], default="auto",
+                        help="auto : export HTTP direct puis repli navigateur")
+    parser.add_argument("--supervise", action="store_true",
+                        help="Superviser scrap.py : logs en continu, délai maximal, mémoire et durée par run")
+    parser.add_argument("--job", action="append", metavar="ARGS",
+                        help="Arguments d'un run scrap.py supervisé (répétable, ex. --job=\"--backfill 2025-01-01 2025-03-31\")")
+    parser.add_argument("--max-parallel", type=int, default=2, help="Nombre de runs supervisés simultanés")
+    parser.add_argument("--deadline", type=float, default=1800,
+                        help="Durée maximale d'un run supervisé (s) avant arrêt de scrap.py et de Chrome")
+    return parser
+
+
+def find_python():
+    """Python de l'environnement uv s'il existe (Selenium installé), sinon celui d'Anaconda."""
+    if os.path.exists(UV_PYTHON):
+        print(f"Utilisation de l'environnement uv : {UV_PYTHON}")
+        return UV_PYTHON
     print("Attention : L'environnement uv n'est pas trouvé. Selenium peut manquer.")
+    return FALLBACK_PYTHON
 
-# Exécuter scrap.py avec l'encodage UTF-8
-try:
-    result = subprocess.run(
-        [python_exe, "scrap.py"],
-        check=True,
+
+def daemon_job(args):
+    """Demande envoyée au démon : uniquement les clés de /export (voir scrap_daemon.py)."""
+    job = {"start": args.start, "end": args.end, "menu": args.menu, "output": args.output, "engine": args.engine}
+    return {k: v for k, v in job.items() if v is not None}
+
+
+def scrap_args(args):
+    """
+    Arguments de scrap.py équivalents à la demande (mêmes bornes que le démon),
+    ou None si scrap.py ne sait pas l'honorer (--menu, --output).
+    """
+    if args.menu != "Alertes internes" or args.output:
+        return None
+    engine = ["--engine", args.engine] if args.engine != "auto" else []
+    if not (args.start or args.end):
+        return engine
+    start = args.start or args.end
+    end = args.end or (date.today() - timedelta(days=1)).isoformat()
+    # Période demandée explicitement : exportée même si déjà couverte
+    return ["--backfill", start, end, "--force", *engine]
+
+
+# ========== Mode supervisé ==========
+# scrap.py écrit dans run_scraper.log ligne par ligne pendant son exécution
+# (un Chrome bloqué laisse une trace), est tué avec tout son arbre de
+# processus (chromedriver, Chrome) au-delà de --deadline, et chaque run est
+# historisé dans run_history.jsonl (durée, mémoire max, code retour).
+LOG_FILE = "run_scraper.log"
+HISTORY_FILE = "run_history.jsonl"
+SAMPLE_INTERVAL = 0.5  # secondes entre deux mesures mémoire / contrôles du délai
+_log_lock = threading.Lock()
+
+
+def log_line(text):
+    with _log_lock:
+        with open(LOG_FILE, "a", encoding="utf-8") as log_file:
+            log_file.write(text + "\n")
+
+
+def pump(name, stream, prefix=""):
+    """Recopie la sortie du run dans le log au fil de l'eau."""
+    for line in stream:
+        log_line(f"[{name}] {prefix}{line.rstrip()}")
+
+
+def tree_rss(proc):
+    """Mémoire résidente (octets) du run et de tous ses descendants."""
+    if psutil is None:
+        return 0
+    try:
+        parent = psutil.Process(proc.pid)
+        procs = [parent] + parent.children(recursive=True)
+    except psutil.Error:
+        return 0
+    total = 0
+    for p in procs:
+        try:
+            total += p.memory_info().rss
+        except psutil.Error:
+            pass
+    return total
+
+
+def kill_tree(proc):
+    """Tue le run et tous ses descendants (chromedriver, Chrome et ses processus de rendu)."""
+    if psutil is not None:
+        try:
+            children = psutil.Process(proc.pid).children(recursive=True)
+        except psutil.Error:
+            children = []
+        proc.kill()
+        for p in children:
+            try:
+                p.kill()
+            except psutil.Error:
+                pass
+        psutil.wait_procs(children, timeout=10)
+    elif os.name == "nt":
+        subprocess.run(["taskkill", "/PID", str(proc.pid), "/T", "/F"], capture_output=True)
+    else:
+        # Groupe de processus créé par start_new_session
+        os.killpg(proc.pid, signal.SIGKILL)
+    proc.wait()
+
+
+def supervise(name, job_args, deadline, python_exe):
+    """Exécute scrap.py `job_args` avec `python_exe` sous surveillance ; retourne le bilan du run."""
+    cmd = [python_exe, "scrap.py"] + job_args
+    started = datetime.now()
+    start = time.perf_counter()
+    log_line(f"=== [{name}] Démarrage {started:%Y-%m-%d %H:%M:%S} : {' '.join(cmd)} ===")
+
+    # Sortie non bufferisée et en UTF-8 : les lignes arrivent dès leur écriture
+    env = dict(os.environ, PYTHONUNBUFFERED="1", PYTHONIOENCODING="utf-8")
+    proc = subprocess.Popen(
+        cmd,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
-        # text=True,
-        encoding='utf-8',  # Force l'encodage UTF-8 pour subprocess
-        errors='replace',  # Remplace les caractères invalides
+        encoding='utf-8',
+        errors='replace',
+        env=env,
+        start_new_session=(os.name != "nt"),
+    )
+    readers = [
+        threading.Thread(target=pump, args=(name, proc.stdout), daemon=True),
+        threading.Thread(target=pump, args=(name, proc.stderr, "Erreurs : "), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+
+    peak, timed_out = 0, False
+    while True:
+        try:
+            proc.wait(timeout=SAMPLE_INTERVAL)
+            break
+        except subprocess.TimeoutExpired:
+            peak = max(peak, tree_rss(proc))
+            if time.perf_counter() - start > deadline:
+                timed_out = True
+                log_line(f"=== [{name}] Délai de {deadline:.0f}s dépassé : arrêt de scrap.py et de Chrome ===")
+                kill_tree(proc)
+                break
+    for reader in readers:
+        reader.join(timeout=5)
+
+    run = {
+        "job": name,
+        "args": job_args,
+        "started": started.isoformat(timespec="seconds"),
+        "seconds": round(time.perf_counter() - start, 1),
+        "peak_mb": round(peak / 2**20, 1) if psutil is not None else None,
+        "returncode": proc.returncode,
+        "timed_out": timed_out,
+    }
+    log_line(f"=== [{name}] Fin : code {run['returncode']} en {run['seconds']}s, "
+             f"mémoire max {run['peak_mb']} Mo ===")
+    with _log_lock:
+        with open(HISTORY_FILE, "a", encoding="utf-8") as history:
+            history.write(json.dumps(run, ensure_ascii=False) + "\n")
+    return run
+
+
+def run_supervised(jobs, max_parallel, deadline, python_exe):
+    """Lance les runs (au plus `max_parallel` à la fois) ; code retour 1 si l'un échoue."""
+    named = [(f"job{i}", shlex.split(job)) for i, job in enumerate(jobs, 1)]
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel)) as pool:
+        runs = list(pool.map(lambda job: supervise(job[0], job[1], deadline, python_exe), named))
+    for run in runs:
+        status = "délai dépassé" if run["timed_out"] else f"code {run['returncode']}"
+        print(f"{run['job']} {' '.join(run['args'])} : {status}, {run['seconds']}s, mémoire max {run['peak_mb']} Mo")
+    if any(run["returncode"] != 0 or run["timed_out"] for run in runs):
+        print("Erreur détectée, vérifier run_scraper.log")
+        return 1
+    return 0
+
+
+def export_via_daemon(job):
+    """Envoie la demande au démon ; retourne sa réponse JSON, ou None s'il ne tourne pas."""
+    try:
+        with open(DAEMON_TOKEN_FILE, encoding="utf-8") as f:
+            token = f.read().strip()
+    except OSError:
+        return None  # démon jamais démarré sur ce poste
+    try:
+        with urllib.request.urlopen(f"{DAEMON_URL}/health", timeout=2):
+            pass
+    except OSError:
+        return None
+
+    request = urllib.request.Request(
+        f"{DAEMON_URL}/export",
+        data=json.dumps(job).encode("utf-8"),
+        headers={"Content-Type": "application/json", "X-Scrap-Token": token},
+        method="POST",
     )
+    try:
+        with urllib.request.urlopen(request, timeout=900) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as e:
+        return json.load(e)
+
+
+def main(argv=None):
+    # Force l'encodage UTF-8 pour stdout et stderr
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+    args = build_parser().parse_args(argv)
+    os.chdir(SCRIPT_DIR)
+    python_exe = find_python()
+    scrap_argv = scrap_args(args)
+
+    if args.supervise or args.job:
+        if not args.job and scrap_argv is None:
+            print("Erreur : --menu et --output ne sont pris en charge que par le démon (scrap_daemon.py)")
+            return 2
+        return run_supervised(args.job or [shlex.join(scrap_argv)], args.max_parallel, args.deadline, python_exe)
+
+    result = export_via_daemon(daemon_job(args))
+    if result is not None:
+        with open("run_scraper.log", "a", encoding='utf-8') as log_file:
+            log_file.write(f"=== Démon {DAEMON_URL} : {json.dumps(result, ensure_ascii=False)} ===\n")
+        if not result.get("ok"):
+            print("Erreur détectée, vérifier run_scraper.log")
+            return 1
+        if not result.get("paths"):
+            print("Démon : aucune période manquante, rien à exporter")
+        else:
+            print(f"Export par le démon : {', '.join(result['paths'])} ({result['seconds']}s)")
+        return 0
+
+    # Repli : exécuter scrap.py avec l'encodage UTF-8, sur la période demandée
+    if scrap_argv is None:
+        with open("run_scraper.log", "a", encoding='utf-8') as log_file:
+            log_file.write(f"=== Démon {DAEMON_URL} injoignable : --menu/--output non pris en charge par scrap.py ===\n")
+        print("Erreur : démon injoignable, --menu et --output ne peuvent pas être honorés par scrap.py")
+        return 2
+
+    try:
+        result = subprocess.run(
+            [python_exe, "scrap.py", *scrap_argv],
+            check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            # text=True,
+            encoding='utf-8',  # Force l'encodage UTF-8 pour subprocess
+            errors='replace',  # Remplace les caractères invalides
+        )
+
+        # Écrire les logs dans run_scraper.log (avec encodage UTF-8)
+        with open("run_scraper.log", "a", encoding='utf-8') as log_file:
+            # log_file.write("=== Exécution réussie ===\n")
+            # log_file.write(result.stdout + "\n")
+            if result.stdout:
+                log_file.write(result.stdout + "\n")
+            if result.stderr:
+                log_file.write("Erreurs : " + result.stderr + "\n")
+
+    except subprocess.CalledProcessError as e:
+        with open("run_scraper.log", "a", encoding='utf-8') as log_file:
+            log_file.write("=== ERREUR lors de l'exécution ===\n")
+            log_file.write(e.stdout + "\n")
+            log_file.write(e.stderr + "\n")
+        print("Erreur détectée, vérifier run_scraper.log")
+        return 1
+
+    return 0
+
 
-    # Écrire les logs dans run_scraper.log (avec encodage UTF-8)
-    with open("run_scraper.log", "a", encoding='utf-8') as log_file:
-        # log_file.write("=== Exécution réussie ===\n")
-        # log_file.write(result.stdout + "\n")
-        if result.stdout:
-            log_file.write(result.stdout + "\n")
-        if result.stderr:
-            log_file.write("Erreurs : " + result.stderr + "\n")
-
-except subprocess.CalledProcessError as e:
-    with open("run_scraper.log", "a", encoding='utf-8') as log_file:
-        log_file.write("=== ERREUR lors de l'exécution ===\n")
-        log_file.write(e.stdout + "\n")
-        log_file.write(e.stderr + "\n")
-    print("Erreur détectée, vérifier run_scraper.log")
-    sys.exit(1)
+if __name__ == "__main__":
+    sys.exit(main())
@@ -19,14 +19,24 @@
  2. Lancement du Navigateur :
     Lance une instance de Chrome via Selenium Manager avec un profil configuré 
     pour autoriser les téléchargements automatiques dans le dossier `alertes/`.
+    Le profil est allégé (images, médias, analytics et tuiles de carte bloqués, 
+    cache disque persistant dans `.cache/chrome/`), voir resource_policy.py.
 
  3. Connexion (login) :
     Navigue vers l'URL WaryMe et utilise la fonction `safe_find` pour localiser 
-    les champs d'identifiant et de mot de passe de manière robuste (gestion 
-    des sélecteurs multiples en cascade).
+    les champs d'identifiant et de mot de passe de manière robuste (tous les 
+    sélecteurs candidats testés en même temps dans la page ; le gagnant est 
+    mémorisé dans `.session/selectors.json` et essayé en premier ensuite).
+    Après une connexion réussie, les cookies et le localStorage sont sauvegardés 
+    dans `.session/selenium_state.json` ; les runs suivants les restaurent 
+    (`ensure_logged_in`) et ne refont la connexion complète que si la session 
+    a expiré.
 
  4. Application des Filtres (apply_filters) :
-    a. Navigation : Accède au menu "Alertes internes" et clique sur "Filtrer".
+    a. Navigation : Ouvre directement la vue "Alertes internes" par sa route 
+       apprise (déjà filtrée sur la période si l'application reporte le filtre 
+       dans l'URL, voir deep_link.py) ; à défaut, passe par le menu. Clique 
+       ensuite sur "Filtrer".
     b. Injection des dates (Robustesse Angular) : Pour contourner les validations 
        strictes de la plateforme Angular, le script utilise une injection 
        JavaScript (`inject_date_js`) qui :
@@ -37,29 +47,80 @@
          nécessaires pour forcer la mise à jour du modèle Angular.
     c. Application : Clique sur le bouton "Appliquer les filtres" et attend 
        que la grille de résultats se rafraîchisse.
+    Les étapes b et c (et le clic sur "Filtrer") sont regroupées en un seul 
+    script asynchrone (`utils.ScriptBatch`) : un seul aller-retour WebDriver.
 
  5. Export et Sauvegarde (export_csv) :
     a. Export : Clique sur le bouton "Exporter", également via une injection 
        JavaScript forcée pour garantir le déclenchement du téléchargement.
-    b. Attente et Renommage : Attend l'apparition du fichier CSV dans le répertoire 
-       `alertes/` (tout en ignorant les fichiers temporaires `.crdownload`). Le 
-       fichier est ensuite renommé au format `alertes_YYYY-MM-JJ_YYYY-MM-JJ.csv` 
+    b. Attente et Renommage : Attend la fin du téléchargement signalée par les 
+       événements DevTools `Browser.downloadProgress` (repli inotify, puis 
+       scrutation du dossier `alertes/`, voir downloads.py). Le fichier, 
+       synchronisé sur disque, est ensuite renommé au format `alertes_YYYY-MM-JJ_YYYY-MM-JJ.csv` 
        de manière sécurisée, ajoutant un suffixe numérique (`_1`, `_2`, etc.) 
        en cas de doublon.
 
  6. Gestion des Erreurs :
-    En cas de `TimeoutException` (élément non trouvé, chargement trop long) ou 
-    d'autres exceptions, le script envoie automatiquement un email d'alerte 
-    aux destinataires définis et ferme le navigateur (`driver.quit()`).
+    Une phase en échec (connexion, filtre, export) est rejouée seule, dans la 
+    session ouverte (reconnexion uniquement si elle a expiré), jusqu'à 
+    `--retries` fois avec un délai exponentiel et une gigue (workflow.py). 
+    Une fois ce budget épuisé, le script envoie un email d'alerte aux 
+    destinataires définis, avec la durée et l'erreur de chaque essai, et ferme 
+    le navigateur (`driver.quit()`).
+
+ Export HTTP direct (http_export.py) :
+    Chaque export navigateur réussi apprend, via le journal "performance" de 
+    Chrome, la requête HTTP qui renvoie le CSV. Les runs suivants la rejouent 
+    directement avec les cookies de la session persistée (`--engine auto`, 
+    par défaut) ; le navigateur n'est utilisé qu'en repli, pour réapprendre 
+    la requête. `--engine browser` force le parcours navigateur, `--engine http`
+    interdit le repli.
+
+ Attentes :
+    Aucune pause fixe : chaque étape attend une condition (stabilité Angular, 
+    changement de la grille, valeur acceptée par le champ), voir utils.py. 
+    `--profile fast` scrute plus souvent avec des timeouts réduits. La durée 
+    réelle de chaque attente est affichée et journalisée en fin de run.
+
+ Mesures :
+    Les phases (login, click_menu_item, apply_filters, filter_batch, 
+    export_csv...) sont mesurées par spans.py, avec le nombre de commandes 
+    WebDriver (allers-retours) de chacune. Chaque run écrit un rapport JSON 
+    dans `reports/` (`--metrics-file` : fichier OpenMetrics en plus) ; 
+    `python spans.py --summary` donne p50 / p95 par phase.
+
+ 7. Mode rattrapage (backfill) :
+    `python scrap.py --backfill 2025-01-01 2025-06-30 --workers 3`
+    Découpe la période en semaines (lundi → dimanche, bornées à la période) 
+    et les répartit sur N sessions Chrome connectées en parallèle (une seule 
+    connexion par session). Chaque session télécharge dans son propre 
+    sous-dossier `alertes/worker_N/` pour que la détection du nouveau fichier 
+    d'`export_csv` ne récupère pas le fichier d'une autre session ; le fichier 
+    renommé est ensuite déplacé dans `alertes/`.
+    Seules les semaines absentes de `alertes/` et de `.session/coverage.json` 
+    sont exportées (`--force` pour tout réexporter).
+
+ 8. Exports incrémentaux (planner.py) :
+    Sans option, le script n'exporte plus aveuglément la semaine précédente : 
+    il calcule les périodes manquantes depuis le début de la couverture connue 
+    jusqu'à la dernière semaine complète et n'exporte qu'elles (rien si tout 
+    est à jour). Un run en échec est ainsi rattrapé au run suivant, sans 
+    doublon `_1.csv`. 
+    `--last-week` force l'ancien comportement.
 ===============================================================================
 """
 
 import os
-import time
+import json
+import queue
 import logging
 import smtplib
+import argparse
+import threading
 from email.mime.text import MIMEText
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
 
 from dotenv import load_dotenv
 from selenium import webdriver
@@ -71,7 +132,22 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 
 # Assurez-vous que ces fonctions sont définies dans utils.py
-from utils import click_menu_item, safe_find 
+from utils import (
+    click_menu_item, safe_find, set_wait_profile, WAIT_PROFILES, wait_report, wait_until,
+    wait_angular_stable, count_round_trips, ScriptBatch,
+)
+import deep_link
+import downloads
+import http_export
+import planner
+import range_split
+import resource_policy
+import spans
+from spans import traced
+from planner import week_ranges
+from http_export import HttpExporter, ExportReplayError
+from range_split import ExportTooLarge
+from workflow import Workflow
 
 # ========== Logging ==========
 logging.basicConfig(
@@ -108,45 +184,80 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DOWNLOAD_DIR = os.path.join(BASE_DIR, "alertes")
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 
+# ========== Session persistée (cookies + localStorage) ==========
+SESSION_FILE = os.path.join(BASE_DIR, ".session", "selenium_state.json")
+
+# Essais par phase (connexion, filtre, export) avant abandon et mail d'erreur
+PHASE_RETRIES = 3
+
 # ========== Chrome Options ==========
-chrome_options = Options()
-prefs = {
-    "download.default_directory": DOWNLOAD_DIR,
-    "download.prompt_for_download": False,
-    "download.directory_upgrade": True,
-    "safebrowsing.enabled": True,
-}
-chrome_options.add_experimental_option("prefs", prefs)
+def build_chrome_options(download_dir=DOWNLOAD_DIR, policy=None, cache_name="main"):
+    """
+    Options Chrome avec téléchargement automatique dans `download_dir`, profil
+    allégé et cache disque persistant `.cache/chrome/<cache_name>` (resource_policy.py).
+    """
+    options = Options()
+    prefs = {
+        "download.default_directory": download_dir,
+        "download.prompt_for_download": False,
+        "download.directory_upgrade": True,
+        "safebrowsing.enabled": True,
+    }
+    options.add_experimental_option("prefs", prefs)
+    # Journal réseau : permet d'apprendre la requête d'export (http_export.py)
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    resource_policy.apply_to_chrome_options(options, policy or resource_policy.load_policy(), cache_name)
+    return options
+
+
+chrome_options = build_chrome_options()
+
+
+def start_driver(download_dir=DOWNLOAD_DIR, policy=None, cache_name="main"):
+    """Lance Chrome avec le profil allégé et le blocage des requêtes non essentielles."""
+    policy = policy or resource_policy.load_policy()
+    driver = webdriver.Chrome(options=build_chrome_options(download_dir, policy, cache_name))
+    resource_policy.apply_to_selenium(driver, policy)
+    return count_round_trips(driver)
 
 # ================================================================
 # FONCTION DE SUPPORT (Extraction de la fonction locale)
 # ================================================================
 
+# Étapes JS des dates (ScriptBatch) : `ctx.inputs` = champs, `args` = valeurs MM/DD/YYYY.
+# Enlève disabled, définit la valeur, simule input/change/blur pour forcer la
+# validation Angular, puis attend que les champs gardent la valeur sans ng-invalid.
+INJECT_DATES_JS = """
+    ctx.inputs.forEach((el, i) => {
+        el.removeAttribute('disabled');
+        el.value = args[i];
+        for (const type of ['input', 'change', 'blur']) el.dispatchEvent(new Event(type, { bubbles: true }));
+    });
+"""
+VALIDATE_DATES_JS = """
+    await waitFor(() => ctx.inputs.every((el, i) => el.value === args[i] && !el.classList.contains('ng-invalid')),
+                  'validation Angular des dates');
+"""
+
+
+@traced("inject_date_js")
 def inject_date_js(driver, element, date_string):
     """
     Définit la date par JS, enlève disabled, et simule les événements clés
-    pour forcer la validation Angular.
+    pour forcer la validation Angular ; attend que la valeur soit acceptée.
+    Un seul aller-retour WebDriver.
     """
-    # 1. Enlever disabled
-    driver.execute_script("arguments[0].removeAttribute('disabled');", element)
-    time.sleep(0.1)
-    
-    # 2. Définir la valeur directement via la propriété value
-    driver.execute_script("arguments[0].value = arguments[1];", element, date_string)
-    time.sleep(0.1)
-    
-    # 3. Simuler les événements nécessaires (Input, Change, Blur)
-    driver.execute_script("""
-        arguments[0].dispatchEvent(new Event('input',  { bubbles: true }));
-        arguments[0].dispatchEvent(new Event('change', { bubbles: true }));
-        arguments[0].dispatchEvent(new Event('blur',   { bubbles: true })); 
-    """, element)
-    time.sleep(0.2)
+    (ScriptBatch("Injection date")
+        .add("Champ", "ctx.inputs = args;", element)
+        .add("Injection", INJECT_DATES_JS, date_string)
+        .add("Validation", VALIDATE_DATES_JS, date_string)
+        .run(driver, timeout=5))
 
 # ================================================================
 # FONCTIONS PRINCIPALES
 # ================================================================
 
+@traced("login")
 def login(driver):
     logger.info("Ouverture page de connexion")
     driver.get(URL)
@@ -157,7 +268,7 @@ def login(driver):
         ("css", "input[formcontrolname='login']"), 
         ("css", "input[placeholder='Email']"), 
         ("xpath", "//input[@type='text' or @type='email']") 
-    ])
+    ], key="username")
     username_element.send_keys(ID)
     logger.info("Identifiant saisi")
 
@@ -173,7 +284,7 @@ def login(driver):
         ("css", "input[type='password']"), 
         ("css", "input[aria-label='Mot de passe']"), 
         ("xpath", "//input[@type='password']") 
-    ])
+    ], key="password")
 
     password_element.send_keys(PASSWORD + Keys.RETURN)
     logger.info("Mot de passe saisi")
@@ -182,99 +293,213 @@ def login(driver):
     logger.info("Connexion réussie")
 
 
-def apply_filters(driver, start_date: date, end_date: date):
-    logger.info("Accès au menu 'Alertes internes'")
-    click_menu_item(driver, "Alertes internes", screenshot_path="debug_alertes.png")
-    time.sleep(2)
+# ================================================================
+# SESSION PERSISTÉE (évite le formulaire de connexion à chaque run)
+# ================================================================
 
-    # Bouton Filtrer
-    filtrer_btn = WebDriverWait(driver, 15).until(
-        EC.element_to_be_clickable((By.XPATH, "//button[.//span[text()='Filtrer']]"))
-    )
-    driver.execute_script("arguments[0].click();", filtrer_btn)
-    logger.info("Bouton 'Filtrer' cliqué, panneau de filtre ouvert")
-    time.sleep(1) 
-
-    # ------------------------------------
-    # Injection des dates : Utilisation de la fonction externalisée
-    # ------------------------------------
-    
-    # Format MM/DD/YYYY (Mois/Jour/Année - format requis par l'UI)
-    start_txt = start_date.strftime("%m/%d/%Y")
-    end_txt   = end_date.strftime("%m/%d/%Y")
+# Renvoie 'login' si le formulaire de connexion est affiché, 'app' si le menu
+# de l'application est présent, null tant que la page n'est pas prête.
+_SESSION_STATE_JS = """
+    if (document.querySelector("input[formcontrolname='login'], input[type='password']")) return 'login';
+    const menu = document.evaluate("//*[normalize-space(text())='Alertes internes']", document, null,
+                                   XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    return menu ? 'app' : null;
+"""
+
+
+def save_session(driver, path=SESSION_FILE):
+    """Sauvegarde les cookies et le localStorage de la session connectée."""
+    state = {
+        "cookies": driver.get_cookies(),
+        "local_storage": driver.execute_script(
+            "const o = {}; for (let i = 0; i < localStorage.length; i++) {"
+            " const k = localStorage.key(i); o[k] = localStorage.getItem(k); } return o;"
+        ),
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Écriture atomique : plusieurs sessions de backfill peuvent sauvegarder en même temps
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+    logger.info(f"Session sauvegardée : {path}")
+
+
+@traced("restore_session")
+def restore_session(driver, path=SESSION_FILE, timeout=15):
+    """
+    Recharge cookies + localStorage puis vérifie que l'application s'affiche
+    sans repasser par le formulaire. Retourne True si la session est valide.
+    """
+    if not os.path.exists(path):
+        return False
+    try:
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Session illisible, connexion complète : {e}")
+        return False
 
-    logger.info(f"Injection des dates (format MM/DD/YYYY par JS): {start_txt} -> {end_txt}")
-    
-    begin_input = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.NAME, "beginDate")))
-    end_input = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.NAME, "endDate")))
-
-    # Appel des fonctions d'injection
-    inject_date_js(driver, begin_input, start_txt)
-    inject_date_js(driver, end_input, end_txt)
-    time.sleep(1) 
-
-    # ------------------------------------
-    # Appliquer filtres
-    # ------------------------------------
-    apply_btn = WebDriverWait(driver, 15).until(
-        EC.element_to_be_clickable((By.XPATH, "//span[normalize-space(text())='Appliquer les filtres']/ancestor::button"))
+    # Cookies et localStorage ne peuvent être posés que sur l'origine chargée
+    driver.get(URL)
+    for cookie in state.get("cookies", []):
+        try:
+            driver.add_cookie(cookie)
+        except Exception:
+            pass
+    driver.execute_script(
+        "for (const [k, v] of Object.entries(arguments[0])) localStorage.setItem(k, v);",
+        state.get("local_storage", {}),
     )
-    
-    driver.execute_script("arguments[0].click();", apply_btn)
-    logger.info("Bouton 'Appliquer les filtres' cliqué")
-    
-    # Attente conditionnelle pour le rafraîchissement de la grille
+    driver.get(URL)
+
     try:
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, "//tr[@role='row' or contains(@class, 'mat-row')]"))
-        )
-        logger.info("La grille d'alertes s'est rafraîchie.")
+        page_state = WebDriverWait(driver, timeout).until(lambda d: d.execute_script(_SESSION_STATE_JS))
     except TimeoutException:
-        logger.warning("La grille d'alertes ne s'est pas rafraîchie ou est vide.")
+        return False
+    return page_state == "app"
 
-    time.sleep(3)
 
+def is_session_alive(driver):
+    """Vrai si la page courante est l'application (et non le formulaire de connexion)."""
+    try:
+        return driver.execute_script(_SESSION_STATE_JS) == "app"
+    except Exception:
+        return False
+
+
+def ensure_logged_in(driver, path=SESSION_FILE):
+    """Réutilise la session persistée si elle est encore valide, sinon connexion complète."""
+    if restore_session(driver, path):
+        logger.info("Session restaurée, formulaire de connexion évité")
+        return
+    logger.info("Session absente ou expirée, connexion complète")
+    login(driver)
+    save_session(driver, path)
+
+
+# Bouton "Filtrer" de la vue des alertes (sert aussi à vérifier qu'un lien direct a abouti)
+FILTRER_XPATH = "//button[.//span[text()='Filtrer']]"
+_FILTER_DATES_JS = """
+    const b = document.querySelector("input[name='beginDate']"), e = document.querySelector("input[name='endDate']");
+    return b && e ? [b.value, e.value] : null;
+"""
 
-def export_csv(driver, start_date: date, end_date: date):
-    before = set(os.listdir(DOWNLOAD_DIR))
 
-    # Trouver et cliquer sur le bouton Export
-    export_btn = WebDriverWait(driver, 20).until(
-        EC.presence_of_element_located((
-            By.XPATH,
-            "//button[.//span[normalize-space(text())='Exporter']]"
-        ))
-    )
-    
-    # Forcer le clic via JS 
-    driver.execute_script("""
-        const btn = arguments[0];
-        btn.removeAttribute('disabled');
-        btn.click();
-    """, export_btn)
-    logger.info("Bouton 'Exporter' cliqué via JS forcé")
-    print("🔎 Vérification JS : export_btn.disabled =", driver.execute_script("return arguments[0].disabled;", export_btn))
-
-    print("📥 En attente de téléchargement dans :", DOWNLOAD_DIR)
-
-    # Attente du fichier téléchargé
-    file_path = None
-    end_time = time.time() + 60
-    while time.time() < end_time:
-        after = set(os.listdir(DOWNLOAD_DIR))
-        new_files = after - before
-        csvs = [f for f in new_files if f.endswith(".csv") and not f.endswith(".crdownload")]
-        if csvs:
-            file_path = os.path.join(DOWNLOAD_DIR, csvs[0])
-            if not file_path.endswith(".crdownload"):
-                break
-        time.sleep(1)
+def open_view(driver, menu, start_date: date, end_date: date):
+    """
+    Ouvre la vue `menu` par lien direct si sa route est connue (deep_link.py),
+    sinon par le menu. Retourne True si la vue est déjà filtrée sur la période.
+    """
+    url, prefiltered = deep_link.target(menu, start_date, end_date)
+    if url:
+        with spans.span("deep_link", prefiltered=prefiltered):
+            driver.get(url)
+            ok = wait_until(driver, EC.element_to_be_clickable((By.XPATH, FILTRER_XPATH)), 15,
+                            "Lien direct", raise_on_timeout=False)
+        if ok:
+            wait_angular_stable(driver, 15, label="Chargement vue alertes")
+            if not prefiltered:
+                logger.info(f"Vue '{menu}' ouverte par lien direct")
+                return False
+            expected = [start_date.strftime("%m/%d/%Y"), end_date.strftime("%m/%d/%Y")]
+            if driver.execute_script(_FILTER_DATES_JS) == expected:
+                logger.info(f"Vue '{menu}' ouverte par lien direct, déjà filtrée : {expected[0]} -> {expected[1]}")
+                return True
+            deep_link.forget(menu, filtered_only=True)
+            return False
+        deep_link.forget(menu)
+
+    logger.info(f"Accès au menu '{menu}'")
+    url_before = driver.current_url
+    click_menu_item(driver, menu, screenshot_path="debug_alertes.png")
+    wait_angular_stable(driver, 15, label="Chargement vue alertes")
+    if driver.current_url != url_before:
+        deep_link.learn_route(menu, driver.current_url, landing=url_before)
+    return False
+
+
+@traced("apply_filters")
+def apply_filters(driver, start_date: date, end_date: date, menu="Alertes internes"):
+    if open_view(driver, menu, start_date, end_date):
+        return
 
-    if not file_path:
+    # Format MM/DD/YYYY (Mois/Jour/Année - format requis par l'UI)
+    start_txt = start_date.strftime("%m/%d/%Y")
+    end_txt   = end_date.strftime("%m/%d/%Y")
+    logger.info(f"Filtre (format MM/DD/YYYY par JS): {start_txt} -> {end_txt}")
+
+    # Panneau "Filtrer", injection des deux dates, validation Angular, "Appliquer
+    # les filtres" et rafraîchissement de la grille : un seul aller-retour WebDriver
+    with spans.span("filter_batch"):
+        *_, grid_changed = (ScriptBatch("Filtre et grille")
+            .add("Bouton 'Filtrer'", """
+                const btn = await waitFor(() => { const b = byXPath(args[0]);
+                    return b && !b.disabled && b.getClientRects().length ? b : null; }, "bouton 'Filtrer'");
+                btn.click();
+            """, FILTRER_XPATH)
+            .add("Panneau filtre", """
+                ctx.inputs = await waitFor(() => {
+                    const b = document.querySelector("input[name='beginDate']");
+                    const e = document.querySelector("input[name='endDate']");
+                    return b && e ? [b, e] : null;
+                }, 'champs beginDate / endDate');
+            """)
+            .add("Injection", INJECT_DATES_JS, start_txt, end_txt)
+            .add("Validation", VALIDATE_DATES_JS, start_txt, end_txt)
+            .add("Bouton 'Appliquer les filtres'", """
+                const btn = await waitFor(() => byXPath(args[0]), "bouton 'Appliquer les filtres'");
+                ctx.signature = gridSignature();
+                btn.click();
+            """, "//span[normalize-space(text())='Appliquer les filtres']/ancestor::button")
+            .add("Grille", """
+                // Grille posée : signature changée, ou Angular revenu stable (filtre sans effet visible)
+                try {
+                    await waitFor(() => gridSignature() !== ctx.signature || angularStable(), 'grille');
+                    await waitFor(angularStable, 'rendu de la grille');
+                    return true;
+                } catch (e) { return false; }
+            """)
+            .run(driver, timeout=30))
+    logger.info("Bouton 'Appliquer les filtres' cliqué")
+
+    if grid_changed:
+        logger.info("La grille d'alertes s'est rafraîchie.")
+    else:
+        logger.warning("La grille d'alertes ne s'est pas rafraîchie ou est vide.")
+    deep_link.learn_filtered(menu, driver.current_url, start_date, end_date)
+
+
+@traced("export_csv")
+def export_csv(driver, start_date: date, end_date: date, download_dir=DOWNLOAD_DIR):
+    """
+    Exporte la grille courante. `download_dir` est le dossier de téléchargement 
+    configuré dans Chrome (sous-dossier propre à chaque session en backfill) ;
+    le fichier renommé est toujours rangé dans `DOWNLOAD_DIR`.
+    """
+    def click_export():
+        # Trouver le bouton Export et forcer le clic via JS, en un aller-retour
+        disabled = (ScriptBatch("Bouton 'Exporter'")
+            .add("Exporter", """
+                const btn = await waitFor(() => byXPath(args[0]), "bouton 'Exporter'");
+                const disabled = btn.disabled;
+                btn.removeAttribute('disabled');
+                btn.click();
+                return disabled;
+            """, "//button[.//span[normalize-space(text())='Exporter']]")
+            .run(driver, timeout=20))[0]
+        logger.info(f"Bouton 'Exporter' cliqué via JS forcé (désactivé avant clic : {disabled})")
+        print("📥 En attente de téléchargement dans :", download_dir)
+
+    # Attente du fichier téléchargé (événements DevTools, sinon inotify, sinon scrutation)
+    try:
+        file_path = downloads.wait_for_download(driver, download_dir, click_export, timeout=60)
+    except TimeoutError:
         page_content = driver.page_source
         if "Aucune alerte trouvée" in page_content or "No alerts found" in page_content:
-             logger.warning("Aucun fichier CSV téléchargé, probablement car la grille est vide.")
-        raise Exception("Aucun fichier CSV téléchargé")
+            logger.warning("Aucun fichier CSV téléchargé, probablement car la grille est vide.")
+            raise Exception("Aucun fichier CSV téléchargé")
+        raise ExportTooLarge("Aucun fichier CSV téléchargé (délai dépassé)")
 
     # Nouveau nom basé sur les dates
     base_name = f"alertes_{start_date.strftime('%Y-%m-%d')}_{end_date.strftime('%Y-%m-%d')}"
@@ -288,35 +513,313 @@ def export_csv(driver, start_date: date, end_date: date):
 
     # Un seul renommage
     os.rename(file_path, new_path)
+    spans.annotate(bytes=os.path.getsize(new_path))
     logger.info(f"Fichier téléchargé et renommé : {new_path}")
     print(f"✅ Fichier sauvegardé : {new_path}")
 
+    # Apprendre la requête d'export pour les prochains runs (sans navigateur)
+    try:
+        captured = http_export.capture_from_performance_log(driver)
+    except Exception as e:
+        captured = None
+        logger.warning(f"Journal performance indisponible : {e}")
+    if captured:
+        http_export.learn(captured["method"], captured["url"], captured["headers"],
+                          captured["post_data"], start_date, end_date)
+    return new_path
+
+
+def site_key(menu="Alertes internes"):
+    """Clé du site pour les tailles de période mémorisées (range_split.py)."""
+    return f"{urlsplit(URL or '').netloc}|{menu}"
+
+
+def _ensure_session(driver):
+    """Remise en état avant un nouvel essai : reconnexion seulement si la session est perdue."""
+    if not is_session_alive(driver):
+        logger.info("Session perdue, reconnexion avant nouvel essai")
+        ensure_logged_in(driver)
+
+
+def new_workflow(retries=None):
+    """
+    Phases rejouées `retries` fois (PHASE_RETRIES par défaut) ; une période
+    trop volumineuse est découpée, pas rejouée.
+    """
+    return Workflow(PHASE_RETRIES if retries is None else retries, no_retry=(ExportTooLarge,))
+
+
+def export_range(driver, start_date: date, end_date: date, download_dir=DOWNLOAD_DIR, menu="Alertes internes",
+                 wf=None, retries=None):
+    """
+    Filtre + export navigateur de la période, découpée si trop volumineuse (range_split.py).
+    Chaque phase en échec est rejouée seule (workflow.py) dans la session ouverte,
+    jusqu'à `retries` essais si `wf` n'est pas fourni.
+    """
+    wf = wf or new_workflow(retries)
+
+    def export_piece(s, e):
+        # Point de reprise : un export en échec refiltre la grille avant de réessayer
+        checkpoint = {"filtered": False}
+
+        def filter_phase():
+            apply_filters(driver, s, e, menu=menu)
+            checkpoint["filtered"] = True
+
+        def export_phase():
+            if not checkpoint["filtered"]:
+                filter_phase()
+            return export_csv(driver, s, e, download_dir=download_dir)
+
+        def recover_export(error):
+            checkpoint["filtered"] = False
+            _ensure_session(driver)
+
+        wf.run("apply_filters", filter_phase, recover=lambda error: _ensure_session(driver))
+        return wf.run("export_csv", export_phase, recover=recover_export)
+
+    return range_split.export(export_piece, start_date, end_date, site_key(menu), DOWNLOAD_DIR)
+
+
+def http_export_range(exporter, start_date: date, end_date: date, menu="Alertes internes"):
+    """Export HTTP direct de la période, découpée si trop volumineuse (range_split.py)."""
+    return range_split.export(lambda s, e: exporter.export(s, e, DOWNLOAD_DIR),
+                              start_date, end_date, site_key(menu), DOWNLOAD_DIR)
+
+
+def http_exporter():
+    """Exporteur HTTP direct à partir de la recette apprise et de la session persistée."""
+    return HttpExporter.from_files(SESSION_FILE)
+
+
+# ================================================================
+# MODE RATTRAPAGE (BACKFILL MULTI-SEMAINES)
+# ================================================================
+
+def _backfill_worker(worker_id, weeks, results, lock, retries=None):
+    """
+    Une session Chrome connectée une seule fois, qui exporte les semaines
+    de la file `weeks` jusqu'à épuisement.
+    """
+    worker_dir = os.path.join(DOWNLOAD_DIR, f"worker_{worker_id}")
+    os.makedirs(worker_dir, exist_ok=True)
+
+    driver = start_driver(worker_dir, cache_name=f"worker_{worker_id}")
+    wait_report.reset()
+    wf = new_workflow(retries)
+    try:
+        wf.run("login", lambda: ensure_logged_in(driver))
+        logger.info(f"[worker {worker_id}] Session connectée")
+        while True:
+            try:
+                start_date, end_date = weeks.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                path = export_range(driver, start_date, end_date, download_dir=worker_dir, wf=wf)
+                planner.record(start_date, end_date)
+                with lock:
+                    results["ok"].append((start_date, end_date, path))
+            except Exception as e:
+                logger.error(f"[worker {worker_id}] Échec {start_date} → {end_date} : {e}")
+                with lock:
+                    results["failed"].append((start_date, end_date, str(e)))
+    finally:
+        driver.quit()
+        logger.info(f"[worker {worker_id}] Navigateur fermé")
+        logger.info(f"[worker {worker_id}] Durée des attentes :\n{wait_report.summary()}")
+        logger.info(f"[worker {worker_id}] Essais par phase :\n{wf.summary()}")
+
+
+def _browser_backfill(ranges, workers, results, lock, retries=None):
+    """Répartit `ranges` sur `workers` sessions Chrome connectées en parallèle."""
+    weeks = queue.Queue()
+    for r in ranges:
+        weeks.put(r)
+
+    workers = max(1, min(workers, len(ranges)))
+    print(f"🗓️ Backfill navigateur : {len(ranges)} semaine(s) sur {workers} session(s)")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(_backfill_worker, i, weeks, results, lock, retries)
+            for i in range(1, workers + 1)
+        ]
+        for f in futures:
+            try:
+                f.result()
+            except Exception as e:
+                # Échec de la session elle-même (lancement Chrome, connexion...)
+                logger.error(f"Session de backfill en échec : {e}")
+
+    # Semaines jamais traitées (toutes les sessions sont tombées)
+    while not weeks.empty():
+        s, e = weeks.get_nowait()
+        results["failed"].append((s, e, "non traitée (aucune session disponible)"))
+
+
+def backfill(start_date: date, end_date: date, workers: int = 3, engine: str = "auto", force: bool = False,
+             retries=None):
+    """
+    Exporte les semaines de la période : seulement celles qui manquent (planner.py),
+    toutes si `force`. Voir `export_ranges`.
+    """
+    if force:
+        ranges = week_ranges(start_date, end_date)
+    else:
+        ranges = planner.plan(DOWNLOAD_DIR, since=start_date, until=end_date)
+    print(f"🗓️ Backfill : {len(ranges)} semaine(s) à exporter de {start_date} à {end_date}")
+    return export_ranges(ranges, workers, engine, retries)
+
+
+def export_ranges(ranges, workers: int = 3, engine: str = "auto", retries=None):
+    """
+    Exporte les périodes `ranges` : en HTTP direct si possible (`engine`
+    auto/http), sinon sur `workers` sessions Chrome en parallèle
+    (`retries` essais par phase, PHASE_RETRIES par défaut).
+    Retourne un dict {"ok": [...], "failed": [...]}.
+    """
+    results = {"ok": [], "failed": []}
+    lock = threading.Lock()
+
+    # 1. Export HTTP direct tant que la recette et la session sont valides
+    remaining = list(ranges)
+    if engine != "browser":
+        try:
+            exporter = http_exporter()
+            while remaining:
+                s, e = remaining[0]
+                try:
+                    results["ok"].append((s, e, http_export_range(exporter, s, e)))
+                    planner.record(s, e)
+                except ExportTooLarge as err:
+                    results["failed"].append((s, e, str(err)))
+                remaining.pop(0)
+        except ExportReplayError as e:
+            logger.info(f"Export HTTP direct indisponible : {e}")
+            if engine == "http":
+                results["failed"].extend((s, en, str(e)) for s, en in remaining)
+                remaining = []
+
+    # 2. Repli navigateur : sessions Chrome en parallèle
+    if remaining:
+        _browser_backfill(remaining, workers, results, lock, retries)
+
+    if results["failed"]:
+        lines = "\n".join(f"{s} → {e} : {err}" for s, e, err in sorted(results["failed"]))
+        send_error_mail("🚨 Export alertes incomplet", f"Périodes en échec :\n{lines}")
+
+    print(f"✅ Export terminé : {len(results['ok'])} export(s), {len(results['failed'])} échec(s)")
+    return results
+
 
 # ========== Main Execution ==========
+def last_week(today=None):
+    """Lundi et dimanche de la semaine précédente."""
+    today = today or date.today()
+    start_date = today - timedelta(days=today.weekday()) - timedelta(days=7)
+    return start_date, start_date + timedelta(days=6)
+
+
+def _parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
 if __name__ == "__main__":
-    
-    # Correction de la logique de date pour obtenir la SEMAINE PRÉCÉDENTE
-    today = date.today()
-    start_date = today - timedelta(days=today.weekday()) - timedelta(days=7) 
-    end_date = start_date + timedelta(days=6) 
-    print(f"🗓️ Plage des alertes : {start_date} → {end_date}")
 
-    driver = webdriver.Chrome(options=chrome_options)
+    parser = argparse.ArgumentParser(description="Export des alertes internes WaryMe")
+    parser.add_argument("--backfill", nargs=2, metavar=("DEBUT", "FIN"), type=_parse_date,
+                        help="Exporter toutes les semaines entre DEBUT et FIN (YYYY-MM-DD)")
+    parser.add_argument("--workers", type=int, default=3,
+                        help="Nombre de sessions Chrome en parallèle pour --backfill")
+    parser.add_argument("--engine", choices=["auto", "http", "browser"], default="auto",
+                        help="auto : export HTTP direct puis repli navigateur")
+    parser.add_argument("--profile", choices=sorted(WAIT_PROFILES), default="normal",
+                        help="Profil d'attente : fast = scrutation plus fréquente, timeouts réduits")
+    parser.add_argument("--metrics-file", help="Écrire aussi les durées par phase au format OpenMetrics")
+    parser.add_argument("--last-week", action="store_true",
+                        help="Exporter la semaine précédente même si elle l'est déjà (sans planification)")
+    parser.add_argument("--force", action="store_true",
+                        help="--backfill : réexporter aussi les semaines déjà couvertes")
+    parser.add_argument("--retries", type=int, default=PHASE_RETRIES,
+                        help="Essais par phase (connexion, filtre, export) avant mail d'erreur")
+    args = parser.parse_args()
+    set_wait_profile(args.profile)
+
+    if args.backfill:
+        spans.start_run("selenium", mode="backfill", start=str(args.backfill[0]), end=str(args.backfill[1]))
+        results = backfill(args.backfill[0], args.backfill[1], workers=args.workers, engine=args.engine,
+                           force=args.force, retries=args.retries)
+        spans.finish_run("error" if results["failed"] else "ok", metrics_file=args.metrics_file)
+        raise SystemExit(1 if results["failed"] else 0)
+
+    # Périodes manquantes depuis le dernier export réussi (planner.py),
+    # ou la SEMAINE PRÉCÉDENTE si demandé
+    ranges = [last_week()] if args.last_week else planner.plan(DOWNLOAD_DIR)
+    if not ranges:
+        print("✅ Aucune période manquante : rien à exporter")
+        raise SystemExit(0)
+
+    if len(ranges) > 1:
+        # Rattrapage de plusieurs semaines (runs précédents en échec ou non lancés)
+        spans.start_run("selenium", mode="catch-up", start=str(ranges[0][0]), end=str(ranges[-1][1]))
+        print(f"🗓️ Rattrapage : {len(ranges)} période(s) manquante(s)")
+        results = export_ranges(ranges, workers=args.workers, engine=args.engine, retries=args.retries)
+        spans.finish_run("error" if results["failed"] else "ok", metrics_file=args.metrics_file)
+        raise SystemExit(1 if results["failed"] else 0)
+
+    start_date, end_date = ranges[0]
+    print(f"🗓️ Plage des alertes : {start_date} → {end_date}")
+    spans.start_run("selenium", mode="weekly", start=str(start_date), end=str(end_date))
+
+    if args.engine != "browser":
+        try:
+            path = http_export_range(http_exporter(), start_date, end_date)
+            planner.record(start_date, end_date)
+            print(f"✅ Fichier sauvegardé (HTTP direct) : {path}")
+            spans.finish_run("ok", metrics_file=args.metrics_file)
+            raise SystemExit(0)
+        except ExportTooLarge as e:
+            logger.error(f"Export HTTP direct en échec : {e}")
+            send_error_mail("🚨 Échec scraping alertes", f"Export trop volumineux même sur une journée :\n{e}")
+            spans.finish_run("error", metrics_file=args.metrics_file)
+            raise SystemExit(1)
+        except ExportReplayError as e:
+            logger.warning(f"Export HTTP direct impossible : {e}")
+            if args.engine == "http":
+                send_error_mail("🚨 Échec scraping alertes", f"Export HTTP direct impossible :\n{e}")
+                spans.finish_run("error", metrics_file=args.metrics_file)
+                raise SystemExit(1)
+
+    with spans.span("start_driver"):
+        driver = start_driver()
+    run_status = "error"
+    wf = new_workflow(args.retries)
 
     try:
         print("✅ Debug : driver.title =", driver.title)
-        login(driver)
+        # Chaque phase est rejouée seule en cas d'erreur passagère (workflow.py)
+        wf.run("login", lambda: ensure_logged_in(driver))
         
-        apply_filters(driver, start_date, end_date)
-        export_csv(driver, start_date, end_date)
+        export_range(driver, start_date, end_date, wf=wf)
+        planner.record(start_date, end_date)
         
         print("✅ Script terminé avec succès")
+        run_status = "ok"
 
     except (TimeoutException, NoSuchElementException, Exception) as e:
+        # Budget d'essais épuisé : seulement maintenant, mail avec le détail des essais
         logger.error(f"Erreur dans le script : {e}")
-        send_error_mail("🚨 Échec scraping alertes", f"Le script a échoué avec l'erreur :\n{e}")
+        send_error_mail("🚨 Échec scraping alertes",
+                        f"Le script a échoué avec l'erreur :\n{e}\n\nEssais par phase :\n{wf.summary()}")
         print(f"❌ Erreur : {e}")
 
     finally:
+        round_trips = driver.round_trips
         driver.quit()
-        logger.info("Navigateur fermé")
\ No newline at end of file
+        logger.info("Navigateur fermé")
+        logger.info(f"Durée des attentes :\n{wait_report.summary()}")
+        print(wait_report.summary())
+        print(f"🔁 Allers-retours WebDriver : {round_trips}")
+        print(wf.summary())
+        print(f"📊 Rapport de run : {spans.finish_run(run_status, metrics_file=args.metrics_file)}")
\ No newline at end of file
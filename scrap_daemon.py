@@ -0,0 +1,273 @@
+"""
+===============================================================================
+ Script : scrap_daemon.py
+ Auteur : Bruno Coulet - RTM - Dopex
+-------------------------------------------------------------------------------
+ Objectif :
+     Garder un ou plusieurs Chrome CHAUDS et CONNECTÉS à WaryMe pour répondre
+     aux demandes d'export en quelques secondes, au lieu de relancer Selenium,
+     Chrome et la connexion à chaque exécution de `scrap.py`.
+
+ Fonctionnement :
+
+ 1. Démarrage : `python scrap_daemon.py --browsers 2 --port 8765`
+    Lance N sessions Chrome (profil allégé, session persistée réutilisée) et
+    ouvre un petit serveur HTTP sur 127.0.0.1 uniquement.
+
+ 2. Requêtes (JSON) :
+    * GET  /health  → {"ok": true, "browsers": N, "idle": k}
+    * POST /export  → en-tête `X-Scrap-Token` (secret de `.session/daemon_token`,
+                      généré au premier démarrage ; 401 sinon), Content-Type
+                      `application/json` (415 sinon), corps
+                      {"start": "YYYY-MM-DD", "end": "YYYY-MM-DD",
+                       "menu": "Alertes internes", "output": "nom.csv",
+                       "engine": "auto", "retries": 3}
+      Toutes les clés sont optionnelles (par défaut : périodes manquantes
+      calculées par planner.py comme dans scrap.py, "end" par défaut hier,
+      menu "Alertes internes", fichier rangé dans `alertes/`, "retries" :
+      essais par phase, celui de `--retries` au démarrage). "output" est
+      relatif à `alertes/` et ne peut ni en sortir ni écraser un fichier
+      existant (HTTP 400).
+      Réponse : {"ok": true, "path": ..., "paths": [...], "seconds": ...} ou
+                {"ok": false, "error": ...} (HTTP 500).
+
+ 3. Session :
+    Avant chaque export, la session du navigateur est vérifiée ; si WaryMe
+    a déconnecté l'utilisateur, reconnexion transparente (`ensure_logged_in`).
+    Les reprises d'un export en échec sont celles de `scrap.export_range`
+    (workflow.py), sans boucle supplémentaire côté démon.
+
+ 4. Client :
+    `run/run_scrap.py` envoie la demande au démon s'il répond (avec le
+    secret lu dans `.session/daemon_token`), et ne lance
+    `scrap.py` en sous-processus qu'en repli.
+===============================================================================
+"""
+
+import os
+import hmac
+import json
+import time
+import secrets
+import queue
+import shutil
+import logging
+import argparse
+from datetime import date, datetime, timedelta
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import scrap
+import planner
+from http_export import ExportReplayError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = int(os.getenv("SCRAP_DAEMON_PORT", "8765"))
+# Secret partagé avec run/run_scrap.py : une page web ouverte dans le navigateur
+# de l'utilisateur peut joindre 127.0.0.1, mais ne peut pas lire ce fichier
+TOKEN_FILE = os.path.join(scrap.BASE_DIR, ".session", "daemon_token")
+TOKEN_HEADER = "X-Scrap-Token"
+
+
+class JobError(ValueError):
+    """Demande d'export refusée (paramètre invalide) : réponse HTTP 400."""
+
+
+def load_token(path=TOKEN_FILE):
+    """Secret du démon, généré (lisible par l'utilisateur seul) au premier démarrage."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            token = f.read().strip()
+        if token:
+            return token
+    except OSError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    token = secrets.token_urlsafe(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token)
+    return token
+
+
+class BrowserPool:
+    """Sessions Chrome connectées, prêtées une par une aux exports."""
+
+    def __init__(self, size):
+        self.size = size
+        self.idle = queue.Queue()
+        for slot in range(1, size + 1):
+            download_dir = os.path.join(scrap.DOWNLOAD_DIR, f"daemon_{slot}")
+            os.makedirs(download_dir, exist_ok=True)
+            driver = scrap.start_driver(download_dir, cache_name=f"daemon_{slot}")
+            scrap.ensure_logged_in(driver)
+            logger.info(f"[démon] Navigateur {slot} prêt")
+            self.idle.put((slot, driver, download_dir))
+
+    @contextmanager
+    def acquire(self, timeout=600):
+        slot = self.idle.get(timeout=timeout)
+        try:
+            yield slot
+        finally:
+            self.idle.put(slot)
+
+    def close(self):
+        while not self.idle.empty():
+            _, driver, _ = self.idle.get_nowait()
+            driver.quit()
+
+
+def job_ranges(job):
+    """
+    Périodes à exporter : celle demandée, sinon les trous de couverture
+    (planner.plan, comme scrap.py sans option). Avec "output", les trous
+    sont regroupés en une seule période pour produire un seul fichier.
+    """
+    if job.get("start") or job.get("end"):
+        start_date = datetime.strptime(job.get("start") or job["end"], "%Y-%m-%d").date()
+        end_date = (datetime.strptime(job["end"], "%Y-%m-%d").date() if job.get("end")
+                    else date.today() - timedelta(days=1))
+        return [(start_date, end_date)]
+    ranges = planner.plan(scrap.DOWNLOAD_DIR)
+    if ranges and job.get("output"):
+        return [(ranges[0][0], ranges[-1][1])]
+    return ranges
+
+
+def export_one(pool, start_date, end_date, menu, engine, retries=None):
+    """Exporte une période (HTTP direct puis navigateur du pool) ; retourne le chemin."""
+    path = None
+    if engine != "browser" and menu == "Alertes internes":
+        try:
+            path = scrap.http_export_range(scrap.http_exporter(), start_date, end_date)
+        except ExportReplayError as e:
+            logger.info(f"[démon] Export HTTP direct impossible, navigateur : {e}")
+            if engine == "http":
+                raise
+
+    if path is None:
+        with pool.acquire() as (slot, driver, download_dir):
+            if not scrap.is_session_alive(driver):
+                logger.info(f"[démon] Navigateur {slot} : session perdue, reconnexion")
+                scrap.ensure_logged_in(driver)
+            # Reprises (et reconnexion) assurées par le Workflow de export_range
+            path = scrap.export_range(driver, start_date, end_date, download_dir=download_dir, menu=menu,
+                                      retries=retries)
+    return path
+
+
+def output_path(output):
+    """
+    Destination demandée par le client, résolue (liens, `..`) : elle doit
+    rester sous `scrap.DOWNLOAD_DIR` et ne pas exister (pas d'écrasement).
+    """
+    root = os.path.realpath(scrap.DOWNLOAD_DIR)
+    path = os.path.realpath(os.path.join(root, output))
+    if os.path.commonpath([root, path]) != root or path == root:
+        raise JobError(f"output doit désigner un fichier sous {root} : {output}")
+    if os.path.lexists(path):
+        raise JobError(f"output existe déjà, pas d'écrasement : {path}")
+    return path
+
+
+def run_job(pool, job, retries=None):
+    """
+    Exécute une demande d'export et retourne les chemins des fichiers produits.
+    `retries` : essais par phase si la demande n'en précise pas.
+    """
+    menu = job.get("menu", "Alertes internes")
+    engine = job.get("engine", "auto")
+    retries = job.get("retries", retries)
+    if retries is not None and (not isinstance(retries, int) or isinstance(retries, bool) or retries < 1):
+        raise JobError(f"retries doit être un entier >= 1 : {retries!r}")
+    # Destination vérifiée avant l'export, pas après
+    output = output_path(job["output"]) if job.get("output") else None
+
+    paths = []
+    for start_date, end_date in job_ranges(job):
+        paths.append(export_one(pool, start_date, end_date, menu, engine, retries))
+        if menu == "Alertes internes":
+            planner.record(start_date, end_date)
+
+    if output and paths:
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        if os.path.lexists(output):
+            raise JobError(f"output existe déjà, pas d'écrasement : {output}")
+        paths = [shutil.move(paths[0], output)]
+    return paths
+
+
+class DaemonHandler(BaseHTTPRequestHandler):
+    pool = None
+    token = None
+    retries = None
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._reply(404, {"ok": False, "error": "inconnu"})
+        self._reply(200, {"ok": True, "browsers": self.pool.size, "idle": self.pool.idle.qsize()})
+
+    def do_POST(self):
+        if self.path != "/export":
+            return self._reply(404, {"ok": False, "error": "inconnu"})
+        if not hmac.compare_digest(self.headers.get(TOKEN_HEADER, "").encode(), self.token.encode()):
+            logger.warning(f"[démon] Demande refusée : secret absent ou invalide ({self.client_address[0]})")
+            return self._reply(401, {"ok": False, "error": "secret du démon absent ou invalide"})
+        # Un POST "simple" inter-sites (text/plain, formulaire) n'a pas de pré-vérification CORS
+        if self.headers.get_content_type() != "application/json":
+            return self._reply(415, {"ok": False, "error": "Content-Type application/json attendu"})
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            job = json.loads(self.rfile.read(length) or b"{}")
+            start = time.perf_counter()
+            paths = run_job(self.pool, job, self.retries)
+        except JobError as e:
+            logger.warning(f"[démon] Demande refusée : {e}")
+            return self._reply(400, {"ok": False, "error": str(e)})
+        except Exception as e:
+            logger.error(f"[démon] Export en échec : {e}")
+            return self._reply(500, {"ok": False, "error": str(e)})
+        seconds = round(time.perf_counter() - start, 2)
+        logger.info(f"[démon] Export {job} → {paths} en {seconds}s")
+        self._reply(200, {"ok": True, "path": paths[-1] if paths else None, "paths": paths, "seconds": seconds})
+
+    def log_message(self, format, *args):
+        logger.info("[démon] " + format % args)
+
+
+def serve(browsers=1, port=DEFAULT_PORT, retries=None):
+    DaemonHandler.token = load_token()
+    DaemonHandler.retries = retries
+    DaemonHandler.pool = BrowserPool(browsers)
+    server = ThreadingHTTPServer(("127.0.0.1", port), DaemonHandler)
+    print(f"✅ Démon prêt sur http://127.0.0.1:{port} ({browsers} navigateur(s))")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        DaemonHandler.pool.close()
+        logger.info("[démon] Arrêt, navigateurs fermés")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Démon d'export WaryMe (navigateurs chauds)")
+    parser.add_argument("--browsers", type=int, default=1, help="Nombre de navigateurs gardés connectés")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--profile", choices=sorted(scrap.WAIT_PROFILES), default="normal")
+    parser.add_argument("--retries", type=int, default=scrap.PHASE_RETRIES,
+                        help="Essais par phase (connexion, filtre, export) si la demande n'en précise pas")
+    args = parser.parse_args()
+    scrap.set_wait_profile(args.profile)
+    serve(args.browsers, args.port, args.retries)
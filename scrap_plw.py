@@ -33,7 +33,42 @@
     Le fichier téléchargé est déplacé et renommé de manière sécurisée (avec suffixe 
     numérique en cas de doublon) dans le répertoire `alertes/`.
 
- 5. Robustesse Générale :
+ 5. Session persistée :
+    Après une connexion réussie, le `storage_state` Playwright (cookies + 
+    localStorage) est sauvegardé dans `.session/playwright_state.json`. Les runs 
+    suivants créent leur contexte à partir de ce fichier et ne refont la 
+    connexion complète que si la session a expiré.
+
+ 6. Export HTTP direct (http_export.py) :
+    Pendant l'export navigateur, les réponses sont écoutées pour apprendre la 
+    requête HTTP qui renvoie le CSV. Les runs suivants la rejouent directement 
+    avec les cookies du `storage_state` ; le navigateur n'est lancé qu'en repli.
+
+ 7. Ressources :
+    Images, médias, analytics et tuiles de carte sont abandonnés par une route 
+    Playwright (voir resource_policy.py).
+
+ 8. Mesures :
+    Les phases (login, click_menu_item, apply_filters, inject_date_js, 
+    export_csv) sont mesurées par spans.py ; un rapport JSON est écrit dans 
+    `reports/` à chaque run.
+
+ 9. Rattrapage parallèle (`--backfill DEBUT FIN --contexts K`) :
+    Les semaines manquantes (planner.py) sont exportées dans UN seul Chromium :
+    connexion une seule fois, puis chaque semaine a son propre contexte créé à
+    partir du `storage_state` connecté (cookies isolés, pas de reconnexion).
+    Au plus K contextes travaillent en même temps (`asyncio.Semaphore`), les
+    attentes réseau des uns recouvrant le travail des autres.
+
+ 10. Fusion en mémoire (`--merge-dir DOSSIER`) :
+    Le contenu de l'export (corps de la réponse, sinon fichier temporaire du 
+    téléchargement ; octets de la requête rejouée en HTTP direct) est gardé en 
+    mémoire et fusionné directement dans les fichiers mensuels de DOSSIER 
+    (rename.merge_into_outputs : dédoublonnage, seuls les mois touchés sont 
+    réécrits). La copie brute dans `alertes/` (audit) est écrite en parallèle, 
+    puis inscrite au manifeste de rename.py, qui ne la refusionnera pas.
+
+ 11. Robustesse Générale :
     Les méthodes Playwright comme `page.click()` et `page.fill()` attendent 
     automatiquement que les éléments soient prêts et visibles, ce qui simplifie 
     le code et réduit le besoin d'attentes manuelles (`time.sleep`).
@@ -42,16 +77,30 @@
 
 import os
 import asyncio
+import argparse
 import time
 import logging
 import smtplib
 from email.mime.text import MIMEText
-from datetime import date, timedelta
+import hashlib
+from datetime import date, datetime, timedelta
 import locale
-from datetime import date
+from pathlib import Path
 
 from dotenv import load_dotenv
-from playwright.async_api import async_playwright
+from playwright.async_api import async_playwright, expect, TimeoutError as PlaywrightTimeoutError
+
+import deep_link
+import http_export
+import planner
+import resource_policy
+import spans
+from spans import traced
+from planner import week_ranges
+from http_export import HttpExporter, ExportReplayError
+import range_split
+from range_split import ExportTooLarge
+from urllib.parse import urlsplit
 # Note : Playwright est généralement utilisé de manière asynchrone
 
 # ========== Configuration & Logging ==========
@@ -62,6 +111,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# ========== Session persistée (storage_state Playwright) ==========
+STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".session", "playwright_state.json")
+
 # ========== Envoi mail en cas d'erreur ==========
 def send_error_mail(subject, body):
     # ... (inchangé) ...
@@ -82,6 +134,7 @@ def send_error_mail(subject, body):
 
 # ========== Fonctions Principales Playwright ==========
 
+@traced("login")
 async def login(page, ID, PASSWORD, URL):
     """Effectue la connexion en utilisant les identifiants."""
     logger.info("Ouverture page de connexion")
@@ -108,12 +161,102 @@ async def login(page, ID, PASSWORD, URL):
     logger.info("Connexion réussie")
 
 
-async def apply_filters(page, start_date: date, end_date: date):
-    """Accède aux filtres et injecte les dates."""
+@traced("restore_session")
+async def is_logged_in(page, URL, timeout=15000):
+    """Ouvre l'application et indique si elle s'affiche sans le formulaire de connexion."""
+    await page.goto(URL, wait_until="domcontentloaded")
+    login_field = page.locator("input[formcontrolname='login']")
+    menu = page.get_by_text("Alertes internes", exact=True)
+    try:
+        await login_field.or_(menu).first.wait_for(timeout=timeout)
+    except Exception:
+        return False
+    return not await login_field.is_visible()
+
+
+async def new_logged_in_context(browser, ID, PASSWORD, URL, state_file=STATE_FILE, policy=None, **context_options):
+    """
+    Crée un contexte connecté : restaure `state_file` si la session est encore
+    valide, sinon connexion complète puis sauvegarde du nouvel état.
+    Les requêtes non essentielles sont bloquées selon `policy` (resource_policy.py).
+    Retourne (context, page).
+    """
+    policy = policy or resource_policy.load_policy()
+    if os.path.exists(state_file):
+        context = await browser.new_context(storage_state=state_file, **context_options)
+        await resource_policy.apply_to_playwright(context, policy)
+        page = await context.new_page()
+        if await is_logged_in(page, URL):
+            logger.info("Session restaurée, formulaire de connexion évité")
+            return context, page
+        logger.info("Session expirée, connexion complète")
+        await context.close()
+
+    context = await browser.new_context(**context_options)
+    await resource_policy.apply_to_playwright(context, policy)
+    page = await context.new_page()
+    await login(page, ID, PASSWORD, URL)
+    os.makedirs(os.path.dirname(state_file), exist_ok=True)
+    await context.storage_state(path=state_file)
+    logger.info(f"Session sauvegardée : {state_file}")
+    return context, page
+
+
+async def open_view(page, start_date: date, end_date: date, menu="Alertes internes"):
+    """
+    Ouvre la vue `menu` par lien direct si sa route est connue (deep_link.py),
+    sinon par le menu. Retourne True si la vue est déjà filtrée sur la période.
+    """
+    url, prefiltered = deep_link.target(menu, start_date, end_date)
+    if url:
+        try:
+            with spans.span("deep_link", prefiltered=prefiltered):
+                await page.goto(url)
+                await page.wait_for_selector("button:has-text('Filtrer')", timeout=15000)
+        except Exception:
+            deep_link.forget(menu)
+        else:
+            await page.wait_for_load_state('networkidle')
+            if not prefiltered:
+                logger.info(f"Vue '{menu}' ouverte par lien direct")
+                return False
+            expected = [start_date.strftime("%m/%d/%Y"), end_date.strftime("%m/%d/%Y")]
+            values = [await page.input_value("input[name='beginDate']"),
+                      await page.input_value("input[name='endDate']")]
+            if values == expected:
+                logger.info(f"Vue '{menu}' ouverte par lien direct, déjà filtrée : {expected[0]} -> {expected[1]}")
+                return True
+            deep_link.forget(menu, filtered_only=True)
+            return False
+
+    logger.info(f"Accès au menu '{menu}'")
+    url_before = page.url
+    with spans.span("click_menu_item"):
+        await page.click(f"text={menu}")
+        await page.wait_for_load_state('networkidle')
+    if page.url != url_before:
+        deep_link.learn_route(menu, page.url, landing=url_before)
+    return False
+
+
+# Signature de la grille (comme utils.GRID_SIGNATURE_JS) : nombre de lignes + texte
+# de la première et de la dernière, pour détecter son rafraîchissement
+GRID_SIGNATURE_JS = """() => {
+    const rows = document.querySelectorAll("tr[role='row'], tr.mat-row, mat-row");
+    if (!rows.length) return '0';
+    return rows.length + '|' + rows[0].innerText + '|' + rows[rows.length - 1].innerText;
+}"""
+ANGULAR_STABLE_JS = """() => document.readyState === 'complete'
+    && (typeof window.getAllAngularTestabilities !== 'function'
+        || window.getAllAngularTestabilities().every(t => t.isStable()))"""
+
+
+@traced("apply_filters")
+async def apply_filters(page, start_date: date, end_date: date, menu="Alertes internes"):
+    """Accède aux filtres de la vue `menu` et injecte les dates."""
     
-    logger.info("Accès au menu 'Alertes internes'")
-    await page.click("text=Alertes internes")
-    await page.wait_for_load_state('networkidle')
+    if await open_view(page, start_date, end_date, menu):
+        return
 
     # Bouton Filtrer
     await page.click("button:has-text('Filtrer')")
@@ -131,63 +274,238 @@ async def apply_filters(page, start_date: date, end_date: date):
     begin_input_selector = "input[name='beginDate']"
     end_input_selector = "input[name='endDate']"
 
-    # --- Date de début ---
-    # Étape critique : Supprimer l'attribut 'disabled' via JS (méthode fiable)
-    await page.evaluate("selector => document.querySelector(selector).removeAttribute('disabled')", begin_input_selector)
-    await page.fill(begin_input_selector, start_txt)
-    
-    # --- Date de fin ---
-    # Étape critique : Supprimer l'attribut 'disabled' via JS (méthode fiable)
-    await page.evaluate("selector => document.querySelector(selector).removeAttribute('disabled')", end_input_selector)
-    await page.fill(end_input_selector, end_txt)
-    
-    # Simuler la perte de focus pour garantir la validation Angular
-    await page.focus(end_input_selector)
-    await page.keyboard.press("Tab") 
-    await asyncio.sleep(1) # Petite pause pour laisser Angular valider les dates
+    with spans.span("inject_date_js"):
+        # --- Date de début ---
+        # Étape critique : Supprimer l'attribut 'disabled' via JS (méthode fiable)
+        await page.evaluate("selector => document.querySelector(selector).removeAttribute('disabled')", begin_input_selector)
+        await page.fill(begin_input_selector, start_txt)
+
+        # --- Date de fin ---
+        # Étape critique : Supprimer l'attribut 'disabled' via JS (méthode fiable)
+        await page.evaluate("selector => document.querySelector(selector).removeAttribute('disabled')", end_input_selector)
+        await page.fill(end_input_selector, end_txt)
+
+        # Simuler la perte de focus pour garantir la validation Angular
+        await page.focus(end_input_selector)
+        await page.keyboard.press("Tab") 
+        # Dates validées par Angular : le bouton d'application est actif
+        await expect(page.locator("button:has-text('Appliquer les filtres')")).to_be_enabled(timeout=5000)
 
     # ------------------------------------
     # Appliquer filtres
     # ------------------------------------
+    signature = await page.evaluate(GRID_SIGNATURE_JS)
     await page.click("button:has-text('Appliquer les filtres')")
     logger.info("Bouton 'Appliquer les filtres' cliqué")
     
-    # Attendre que la grille de données ait potentiellement des lignes
-    await page.wait_for_selector("//tr[@role='row' or contains(@class, 'mat-row')]", 
-                                state='attached', timeout=10000)
-    logger.info("La grille d'alertes s'est rafraîchie.")
+    # Grille posée : signature changée, ou Angular revenu stable (filtre sans effet visible)
+    try:
+        await page.wait_for_function(
+            f"sig => ({GRID_SIGNATURE_JS})() !== sig || ({ANGULAR_STABLE_JS})()", arg=signature, timeout=10000
+        )
+        await page.wait_for_function(ANGULAR_STABLE_JS, timeout=10000)
+        logger.info("La grille d'alertes s'est rafraîchie.")
+    except PlaywrightTimeoutError:
+        logger.warning("Grille d'alertes toujours en cours de rafraîchissement après 10s")
+    deep_link.learn_filtered(menu, page.url, start_date, end_date)
 
 
-async def export_csv(page, start_date: date, end_date: date, DOWNLOAD_DIR):
-    """Déclenche l'export et gère le téléchargement/renommage."""
-    
-    logger.info("Déclenchement de l'export CSV")
-    
-    # Playwright gère l'écoute des événements de téléchargement nativement
-    async with page.expect_download() as download_info:
-        await page.click("button:has-text('Exporter')")
-        
-    download = await download_info.value
-    
-    # Renommage du fichier téléchargé
+def new_export_path(DOWNLOAD_DIR, start_date: date, end_date: date):
+    """Chemin libre `alertes_YYYY-MM-DD_YYYY-MM-DD[_N].csv` pour un export."""
     base_name = f"alertes_{start_date.strftime('%Y-%m-%d')}_{end_date.strftime('%Y-%m-%d')}"
-    new_name = f"{base_name}.csv"
-    new_path = os.path.join(DOWNLOAD_DIR, new_name)
+    new_path = os.path.join(DOWNLOAD_DIR, f"{base_name}.csv")
 
     # Si le fichier existe déjà → ajouter suffixe (Logique simplifiée)
     counter = 1
     while os.path.exists(new_path):
         new_path = os.path.join(DOWNLOAD_DIR, f"{base_name}_{counter}.csv")
         counter += 1
+    return new_path
+
+
+def write_raw(path, data: bytes):
+    """Écriture atomique d'un export brut (conservé pour audit)."""
+    tmp_path = f"{path}.part"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+async def read_export(download, export_responses):
+    """
+    Contenu de l'export en mémoire : corps de la réponse d'export s'il est
+    disponible, sinon fichier temporaire du téléchargement Playwright (pas de
+    copie vers `alertes/`).
+    """
+    if export_responses:
+        try:
+            return await export_responses[-1].body()
+        except Exception as e:
+            # Chromium ne conserve pas toujours le corps d'une réponse téléchargée
+            logger.debug(f"Corps de la réponse d'export indisponible : {e}")
+    return await asyncio.to_thread(Path(await download.path()).read_bytes)
+
+
+@traced("export_csv")
+async def export_csv(page, start_date: date, end_date: date, DOWNLOAD_DIR, in_memory=False):
+    """
+    Déclenche l'export et gère le téléchargement/renommage. Retourne le chemin.
+    `in_memory` : retourne (chemin, contenu, écriture) ; le fichier brut est
+    écrit en tâche de fond pendant que le contenu part à la fusion (rename.py).
+    """
+    
+    logger.info("Déclenchement de l'export CSV")
+
+    # Écoute des réponses pour apprendre la requête d'export (http_export.py)
+    export_responses = []
+    def on_response(response):
+        if http_export.is_export_response(None, response.headers):
+            export_responses.append(response)
+    page.on("response", on_response)
+
+    # Playwright gère l'écoute des événements de téléchargement nativement
+    try:
+        async with page.expect_download() as download_info:
+            await page.click("button:has-text('Exporter')")
+        download = await download_info.value
+    finally:
+        page.remove_listener("response", on_response)
+
+    if export_responses:
+        request = export_responses[-1].request
+        http_export.learn(request.method, request.url, await request.all_headers(),
+                          request.post_data, start_date, end_date)
+    
+    # Renommage du fichier téléchargé
+    new_path = new_export_path(DOWNLOAD_DIR, start_date, end_date)
+
+    if in_memory:
+        data = await read_export(download, export_responses)
+        spans.annotate(bytes=len(data))
+        written = asyncio.create_task(asyncio.to_thread(write_raw, new_path, data))
+        logger.info(f"Export capturé en mémoire ({len(data)} octets), copie brute : {new_path}")
+        return new_path, data, written
 
     # Sauvegarde du fichier téléchargé vers le nouveau chemin
     await download.save_as(new_path)
+    spans.annotate(bytes=os.path.getsize(new_path))
     
     logger.info(f"Fichier téléchargé et renommé : {new_path}")
     print(f"✅ Fichier sauvegardé : {new_path}")
-
-
-async def main():
+    return new_path
+
+
+async def export_http(exporter, start_date: date, end_date: date, DOWNLOAD_DIR, in_memory=False,
+                      menu="Alertes internes"):
+    """
+    Export HTTP direct de la période, découpée si trop volumineuse
+    (range_split.py, tailles mémorisées par site comme dans scrap.py).
+    Retourne le chemin, ou (chemin, contenu, écriture) si `in_memory` : la
+    période n'est alors gardée en mémoire que si elle tient en un morceau
+    (taille mémorisée) et sous range_split.MAX_ROWS lignes ; sinon elle passe
+    par range_split.export, comme sur disque.
+    Lève ExportTooLarge si même une journée dépasse le délai.
+    """
+    def export_piece(s, e):
+        return exporter.export(s, e, DOWNLOAD_DIR)
+
+    site = f"{urlsplit(os.getenv('URL') or '').netloc}|{menu}"
+    if in_memory:
+        size = range_split.load_sizes().get(site)
+        data = None
+        if not size or len(range_split.split_days(start_date, end_date, size)) == 1:
+            try:
+                data = exporter.fetch(start_date, end_date)
+            except ExportTooLarge as e:
+                logger.info(f"Export HTTP {start_date} → {end_date} trop volumineux ({e}), découpage")
+            else:
+                # Décompte par excès (retours à la ligne entre guillemets) : suffit comme seuil
+                rows = data.count(b"\n") - 1
+                if rows >= range_split.MAX_ROWS and start_date < end_date:
+                    logger.info(f"Export HTTP {start_date} → {end_date} : {rows} lignes, "
+                                f"probablement tronqué, découpage")
+                    data = None
+        if data is None:
+            # Découpage : morceaux recollés sur disque puis relus pour la fusion
+            path = range_split.export(export_piece, start_date, end_date, site, DOWNLOAD_DIR)
+            return path, await asyncio.to_thread(Path(path).read_bytes), None
+        path = new_export_path(DOWNLOAD_DIR, start_date, end_date)
+        return path, data, asyncio.create_task(asyncio.to_thread(write_raw, path, data))
+    return range_split.export(export_piece, start_date, end_date, site, DOWNLOAD_DIR)
+
+
+async def merge_exports(captured, merge_dir):
+    """
+    Fusionne des exports capturés en mémoire [(début, chemin, contenu, écriture ou None)]
+    dans les fichiers mensuels de `merge_dir` (rename.merge_into_outputs), en
+    même temps que l'écriture des copies brutes. L'en-tête de référence est
+    celui de l'export le plus récent, comme dans rename.py. Les copies brutes
+    sont ensuite inscrites au manifeste de rename.py (rename.record_sources) :
+    son prochain run ne les refusionne pas.
+    """
+    import rename  # pandas / pyarrow chargés seulement si une fusion est demandée
+
+    captured = sorted(captured, key=lambda c: c[0])
+    header = rename.read_header(captured[-1][2])
+    frames = [rename.read_source(data, header, os.path.basename(path)) for _, path, data, _ in captured]
+    with spans.span("merge", sources=len(frames)):
+        (written, months), _ = await asyncio.gather(
+            asyncio.to_thread(rename.merge_into_outputs, frames, header, merge_dir),
+            asyncio.gather(*(w for *_, w in captured if w is not None)),
+        )
+        merged = [(path, hashlib.sha256(data).hexdigest(), len(frame), source_months)
+                  for (_, path, data, _), frame, source_months in zip(captured, frames, months)]
+        if not await asyncio.to_thread(rename.record_sources, merge_dir, header, merged):
+            logger.warning(f"Manifeste de {merge_dir} non mis à jour : header de référence différent")
+    print(f"✅ Fusion dans {merge_dir} : {len(written)} fichier(s) mensuel(s) mis à jour")
+    return written
+
+
+async def export_ranges_concurrently(browser, ranges, ID, PASSWORD, URL, DOWNLOAD_DIR, contexts=3, in_memory=False,
+                                     menu="Alertes internes"):
+    """
+    Connexion UNE fois, puis export des périodes `ranges` en parallèle dans un
+    seul Chromium : chaque période a son contexte, cloné du `storage_state`
+    connecté ; au plus `contexts` contextes ouverts à la fois (sémaphore).
+    Retourne un dict {"ok": [...], "failed": [...], "captured": [...]}
+    ("captured" : exports gardés en mémoire si `in_memory`, voir merge_exports).
+    """
+    login_context, _ = await new_logged_in_context(browser, ID, PASSWORD, URL)
+    state = await login_context.storage_state()
+    await login_context.close()
+
+    policy = resource_policy.load_policy()
+    semaphore = asyncio.Semaphore(max(1, contexts))
+    results = {"ok": [], "failed": [], "captured": []}
+
+    async def export_one(start_date, end_date):
+        async with semaphore:
+            context = await browser.new_context(storage_state=state, accept_downloads=True)
+            try:
+                await resource_policy.apply_to_playwright(context, policy)
+                page = await context.new_page()
+                if deep_link.target(menu, start_date, end_date)[0] is None:
+                    # Pas de lien direct connu : passer par l'accueil et le menu
+                    await page.goto(URL, wait_until="domcontentloaded")
+                await apply_filters(page, start_date, end_date, menu)
+                path = await export_csv(page, start_date, end_date, DOWNLOAD_DIR, in_memory=in_memory)
+                if in_memory:
+                    path, data, written = path
+                    results["captured"].append((start_date, path, data, written))
+                planner.record(start_date, end_date)
+                results["ok"].append((start_date, end_date, path))
+            except Exception as e:
+                logger.error(f"Échec {start_date} → {end_date} : {e}")
+                results["failed"].append((start_date, end_date, str(e)))
+            finally:
+                await context.close()
+
+    print(f"🗓️ Export de {len(ranges)} période(s) sur {min(contexts, len(ranges))} contexte(s) en parallèle")
+    await asyncio.gather(*(export_one(s, e) for s, e in ranges))
+    return results
+
+
+async def main(metrics_file=None, backfill=None, contexts=3, force=False, merge_dir=None):
     """Fonction principale asynchrone."""
     
     # ========== Chargement des variables ==========
@@ -201,6 +519,11 @@ async def main():
     DOWNLOAD_DIR = os.path.join(BASE_DIR, "alertes")
     os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 
+    if backfill:
+        await run_backfill(backfill[0], backfill[1], ID, PASSWORD, URL, DOWNLOAD_DIR, contexts, force,
+                           metrics_file, merge_dir)
+        return
+
     # ========== Calcul des Dates de la Semaine PRÉCÉDENTE ==========
     # Définir la locale française
     locale.setlocale(locale.LC_TIME, 'fr_FR.UTF-8')  # sur Linux/macOS
@@ -209,23 +532,45 @@ async def main():
     start_date = today - timedelta(days=today.weekday()) - timedelta(days=7) 
     end_date = start_date + timedelta(days=6) 
     print(f"🗓️ Plage des alertes : {start_date.strftime('%d-%b-%Y')} → {end_date.strftime('%d-%b-%Y')}")
+    spans.start_run("playwright", mode="weekly", start=str(start_date), end=str(end_date))
+
+    # Export HTTP direct : pas de navigateur si la requête d'export est connue
+    try:
+        exporter = HttpExporter.from_files(STATE_FILE)
+        exported = await export_http(exporter, start_date, end_date, DOWNLOAD_DIR, in_memory=bool(merge_dir))
+        if merge_dir:
+            path, data, written = exported
+            await merge_exports([(start_date, path, data, written)], merge_dir)
+        else:
+            path = exported
+        print(f"✅ Fichier sauvegardé (HTTP direct) : {path}")
+        spans.finish_run("ok", metrics_file=metrics_file)
+        return
+    except (ExportReplayError, ExportTooLarge) as e:
+        logger.info(f"Export HTTP direct impossible, repli navigateur : {e}")
 
     # Lancement du contexte Playwright
+    run_status = "error"
     async with async_playwright() as p:
         # Utiliser Chromium pour la compatibilité avec Chrome
-        browser = await p.chromium.launch(headless=True) # Mettre True pour le mode silencieux
-        page = await browser.new_page(
-            # Configurer le répertoire de téléchargement natif de Playwright
-            accept_downloads=True,
-            java_script_enabled=True,
-        )
+        with spans.span("start_driver"):
+            browser = await p.chromium.launch(headless=True) # Mettre True pour le mode silencieux
 
         try:
-            await login(page, ID, PASSWORD, URL)
+            context, page = await new_logged_in_context(
+                browser, ID, PASSWORD, URL,
+                # Configurer le répertoire de téléchargement natif de Playwright
+                accept_downloads=True,
+                java_script_enabled=True,
+            )
             await apply_filters(page, start_date, end_date)
-            await export_csv(page, start_date, end_date, DOWNLOAD_DIR)
+            exported = await export_csv(page, start_date, end_date, DOWNLOAD_DIR, in_memory=bool(merge_dir))
+            if merge_dir:
+                path, data, written = exported
+                await merge_exports([(start_date, path, data, written)], merge_dir)
             
             print("✅ Script terminé avec succès")
+            run_status = "ok"
 
         except Exception as e:
             logger.error(f"Erreur dans le script : {e}")
@@ -235,9 +580,88 @@ async def main():
         finally:
             await browser.close()
             logger.info("Navigateur fermé")
+            print(f"📊 Rapport de run : {spans.finish_run(run_status, metrics_file=metrics_file)}")
+
+
+async def run_backfill(start_date, end_date, ID, PASSWORD, URL, DOWNLOAD_DIR, contexts=3, force=False,
+                       metrics_file=None, merge_dir=None):
+    """Rattrapage des semaines manquantes de la période : HTTP direct, sinon contextes parallèles."""
+    ranges = week_ranges(start_date, end_date) if force else planner.plan(DOWNLOAD_DIR, since=start_date, until=end_date)
+    print(f"🗓️ Backfill : {len(ranges)} semaine(s) à exporter de {start_date} à {end_date}")
+    spans.start_run("playwright", mode="backfill", start=str(start_date), end=str(end_date), contexts=contexts)
+    results = {"ok": [], "failed": [], "captured": []}
+
+    remaining = list(ranges)
+    try:
+        exporter = HttpExporter.from_files(STATE_FILE)
+        while remaining:
+            s, e = remaining[0]
+            try:
+                exported = await export_http(exporter, s, e, DOWNLOAD_DIR, in_memory=bool(merge_dir))
+            except ExportTooLarge as err:
+                # Même découpée à la journée, la période dépasse le délai : semaine en échec, on continue
+                logger.error(f"Export HTTP {s} → {e} trop volumineux : {err}")
+                results["failed"].append((s, e, f"export trop volumineux : {err}"))
+                remaining.pop(0)
+                continue
+            if merge_dir:
+                path, data, written = exported
+                results["captured"].append((s, path, data, written))
+            else:
+                path = exported
+            results["ok"].append((s, e, path))
+            planner.record(s, e)
+            remaining.pop(0)
+    except ExportReplayError as e:
+        logger.info(f"Export HTTP direct indisponible, repli navigateur : {e}")
+
+    if remaining:
+        async with async_playwright() as p:
+            with spans.span("start_driver"):
+                browser = await p.chromium.launch(headless=True)
+            try:
+                browser_results = await export_ranges_concurrently(
+                    browser, remaining, ID, PASSWORD, URL, DOWNLOAD_DIR, contexts, in_memory=bool(merge_dir)
+                )
+                for key in results:
+                    results[key] += browser_results[key]
+            except Exception as e:
+                # Échec de la connexion initiale : aucune période traitée
+                results["failed"] += [(s, en, str(e)) for s, en in remaining]
+            finally:
+                await browser.close()
+
+    if results["captured"]:
+        try:
+            await merge_exports(results["captured"], merge_dir)
+        except Exception as e:
+            logger.error(f"Fusion des exports en mémoire impossible : {e}")
+            results["failed"].append((start_date, end_date, f"fusion dans {merge_dir} : {e}"))
+
+    if results["failed"]:
+        lines = "\n".join(f"{s} → {e} : {err}" for s, e, err in sorted(results["failed"]))
+        send_error_mail("🚨 Backfill alertes incomplet (Playwright)", f"Semaines en échec :\n{lines}")
+    print(f"✅ Backfill terminé : {len(results['ok'])} export(s), {len(results['failed'])} échec(s)")
+    print(f"📊 Rapport de run : {spans.finish_run('error' if results['failed'] else 'ok', metrics_file=metrics_file)}")
+    return results
 
 
 # ========== Main Execution ==========
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export des alertes internes WaryMe (Playwright)")
+    parser.add_argument("--metrics-file", help="Écrire aussi les durées par phase au format OpenMetrics")
+    parser.add_argument("--backfill", nargs=2, metavar=("DEBUT", "FIN"),
+                        type=lambda v: datetime.strptime(v, "%Y-%m-%d").date(),
+                        help="Exporter les semaines manquantes entre DEBUT et FIN (YYYY-MM-DD)")
+    parser.add_argument("--contexts", type=int, default=3,
+                        help="--backfill : nombre de contextes navigateur en parallèle (un seul Chromium)")
+    parser.add_argument("--force", action="store_true",
+                        help="--backfill : réexporter aussi les semaines déjà couvertes")
+    parser.add_argument("--merge-dir", type=Path,
+                        help="Garder les exports en mémoire et les fusionner directement dans les "
+                             "fichiers mensuels de ce dossier (rename.py) ; copie brute dans alertes/")
+    args = parser.parse_args()
+
     # Exécuter la fonction principale asynchrone
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main(metrics_file=args.metrics_file, backfill=args.backfill, contexts=args.contexts,
+                     force=args.force, merge_dir=args.merge_dir))
\ No newline at end of file
@@ -0,0 +1,250 @@
+"""
+===============================================================================
+ Module : spans.py
+ Auteur : Bruno Coulet - RTM - Dopex
+-------------------------------------------------------------------------------
+ Objectif :
+     Savoir OÙ un run a été lent (connexion, menu, filtre, injection des
+     dates, téléchargement) au lieu de lignes libres dans `scraper.log`.
+
+ Fonctionnement :
+
+ 1. Un run = un rapport (`start_run` ... `finish_run`).
+ 2. Chaque phase est une "span" : décorateur `@traced("login")` (fonctions
+    normales ou async) ou bloc `with span("...")`. Sont enregistrés : début,
+    fin, durée, statut, erreur, nombre de reprises (`add_retry`), nombre de
+    commandes WebDriver (`add_round_trip`) et attributs libres
+    (`annotate(bytes=...)`).
+ 3. `finish_run` écrit un rapport JSON dans `reports/run_YYYYmmdd_HHMMSS.json`
+    et, si demandé, un fichier texte OpenMetrics (collecteur "textfile" de
+    node_exporter).
+ 4. `python spans.py --summary [reports/]` calcule p50 / p95 par phase sur
+    l'ensemble des rapports.
+
+ Hors run actif, les spans ne coûtent rien (aucun enregistrement).
+===============================================================================
+"""
+
+import os
+import json
+import time
+import glob
+import inspect
+import logging
+import argparse
+import threading
+import functools
+import contextvars
+from datetime import datetime
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPORT_DIR = os.path.join(BASE_DIR, "reports")
+
+_lock = threading.Lock()
+_run = None
+# Pile des spans ouvertes : propre à chaque thread (backfill) et à chaque tâche asyncio
+_stack = contextvars.ContextVar("span_stack", default=())
+
+
+def start_run(engine, **attrs):
+    """Ouvre le rapport du run courant (un seul par processus)."""
+    global _run
+    with _lock:
+        _run = {
+            "engine": engine,
+            "started_at": time.time(),
+            "attrs": attrs,
+            "round_trips": 0,
+            "spans": [],
+        }
+    return _run
+
+
+@contextmanager
+def span(name, **attrs):
+    """Mesure un bloc de code comme une phase du run."""
+    run = _run
+    if run is None:
+        yield None
+        return
+
+    record = {
+        "name": name,
+        "parent": _stack.get()[-1]["name"] if _stack.get() else None,
+        "thread": threading.current_thread().name,
+        "start": time.time(),
+        "retries": 0,
+        "round_trips": 0,
+        "status": "ok",
+        **attrs,
+    }
+    token = _stack.set(_stack.get() + (record,))
+    t0 = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record["status"] = "error"
+        record["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        record["end"] = time.time()
+        record["duration_s"] = round(time.perf_counter() - t0, 4)
+        _stack.reset(token)
+        with _lock:
+            # Run terminé (finish_run) ou remplacé pendant la span : rien à compléter
+            if _run is run:
+                _run["spans"].append(record)
+
+
+def traced(name):
+    """Décorateur : chaque appel de la fonction devient une span `name`."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def annotate(**attrs):
+    """Ajoute des attributs (ex. bytes=...) à la span ouverte la plus interne."""
+    if _stack.get():
+        _stack.get()[-1].update(attrs)
+
+
+def add_retry(count=1):
+    """Compte une reprise (sélecteur suivant, nouvelle stratégie de clic...)."""
+    if _stack.get():
+        _stack.get()[-1]["retries"] += count
+
+
+def add_round_trip():
+    """Compte une commande WebDriver (un aller-retour vers chromedriver)."""
+    if _run is None:
+        return
+    if _stack.get():
+        _stack.get()[-1]["round_trips"] += 1
+    with _lock:
+        if _run is not None:
+            _run["round_trips"] += 1
+
+
+def finish_run(status="ok", report_dir=REPORT_DIR, metrics_file=None):
+    """Clôt le run, écrit le rapport JSON (et OpenMetrics) ; retourne le chemin du JSON."""
+    global _run
+    with _lock:
+        run, _run = _run, None
+    if run is None:
+        return None
+
+    run["status"] = status
+    run["ended_at"] = time.time()
+    run["duration_s"] = round(run["ended_at"] - run["started_at"], 4)
+
+    os.makedirs(report_dir, exist_ok=True)
+    stamp = datetime.fromtimestamp(run["started_at"]).strftime("%Y%m%d_%H%M%S")
+    path = os.path.join(report_dir, f"run_{stamp}_{run['engine']}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(run, f, indent=2, ensure_ascii=False, default=str)
+    logger.info(f"Rapport de run écrit : {path}")
+
+    if metrics_file:
+        write_openmetrics(run, metrics_file)
+    return path
+
+
+def write_openmetrics(run, path):
+    """Fichier texte OpenMetrics : durée cumulée, nombre et reprises par phase."""
+    phases = {}
+    for s in run["spans"]:
+        p = phases.setdefault(s["name"], {"sum": 0.0, "count": 0, "retries": 0, "round_trips": 0, "errors": 0})
+        p["sum"] += s["duration_s"]
+        p["count"] += 1
+        p["retries"] += s["retries"]
+        p["round_trips"] += s.get("round_trips", 0)
+        p["errors"] += s["status"] != "ok"
+
+    engine = run["engine"]
+    lines = [
+        "# TYPE waryme_phase_duration_seconds summary",
+        "# UNIT waryme_phase_duration_seconds seconds",
+    ]
+    for name, p in phases.items():
+        lines.append(f'waryme_phase_duration_seconds_sum{{engine="{engine}",phase="{name}"}} {p["sum"]:.4f}')
+        lines.append(f'waryme_phase_duration_seconds_count{{engine="{engine}",phase="{name}"}} {p["count"]}')
+    lines.append("# TYPE waryme_phase_retries counter")
+    for name, p in phases.items():
+        lines.append(f'waryme_phase_retries_total{{engine="{engine}",phase="{name}"}} {p["retries"]}')
+    lines.append("# TYPE waryme_phase_round_trips counter")
+    for name, p in phases.items():
+        lines.append(f'waryme_phase_round_trips_total{{engine="{engine}",phase="{name}"}} {p["round_trips"]}')
+    lines.append("# TYPE waryme_phase_errors counter")
+    for name, p in phases.items():
+        lines.append(f'waryme_phase_errors_total{{engine="{engine}",phase="{name}"}} {p["errors"]}')
+    lines += [
+        "# TYPE waryme_run_success gauge",
+        f'waryme_run_success{{engine="{engine}"}} {int(run["status"] == "ok")}',
+        "# TYPE waryme_run_round_trips gauge",
+        f'waryme_run_round_trips{{engine="{engine}"}} {run["round_trips"]}',
+        "# TYPE waryme_run_duration_seconds gauge",
+        f'waryme_run_duration_seconds{{engine="{engine}"}} {run["duration_s"]}',
+        "# TYPE waryme_run_timestamp_seconds gauge",
+        f'waryme_run_timestamp_seconds{{engine="{engine}"}} {run["ended_at"]:.0f}',
+        "# EOF",
+    ]
+    # Écriture atomique : le collecteur ne doit jamais lire un fichier à moitié écrit
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    k = (len(values) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def summarize(report_dir=REPORT_DIR):
+    """p50 / p95 de la durée de chaque phase, sur tous les rapports du dossier."""
+    durations = {}
+    for path in sorted(glob.glob(os.path.join(report_dir, "run_*.json"))):
+        with open(path, encoding="utf-8") as f:
+            run = json.load(f)
+        for s in run["spans"]:
+            durations.setdefault((run["engine"], s["name"]), []).append(s["duration_s"])
+
+    summary = {}
+    for (engine, name), values in sorted(durations.items()):
+        summary[(engine, name)] = {
+            "n": len(values),
+            "p50": _percentile(values, 0.50),
+            "p95": _percentile(values, 0.95),
+        }
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthèse des rapports de run")
+    parser.add_argument("--summary", nargs="?", const=REPORT_DIR, metavar="DOSSIER",
+                        help="p50 / p95 par phase sur les rapports du dossier")
+    args = parser.parse_args()
+
+    if args.summary:
+        print(f"{'Moteur':<12} {'Phase':<28} {'n':>5} {'p50 (s)':>9} {'p95 (s)':>9}")
+        for (engine, name), s in summarize(args.summary).items():
+            print(f"{engine:<12} {name:<28} {s['n']:>5} {s['p50']:>9.2f} {s['p95']:>9.2f}")
+    else:
+        parser.print_help()
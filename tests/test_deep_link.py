@@ -0,0 +1,27 @@
+from datetime import date
+
+import deep_link
+
+
+def test_route_keeps_hash_route_and_drops_queries():
+    assert deep_link.route_of("https://waryme.fr/app/#/alertes-internes?page=2") == \
+        "https://waryme.fr/app/#/alertes-internes"
+    assert deep_link.route_of("https://waryme.fr/alertes-internes?from=01/06/2025#top") == \
+        "https://waryme.fr/alertes-internes"
+
+
+def test_learn_route_on_hash_routed_app(tmp_path):
+    routes = str(tmp_path / "routes.json")
+    deep_link.learn_route("Alertes internes", "https://waryme.fr/#/alertes-internes",
+                          landing="https://waryme.fr/#/accueil", path=routes)
+
+    url, prefiltered = deep_link.target("Alertes internes", date(2025, 1, 6), date(2025, 1, 12), path=routes)
+    assert (url, prefiltered) == ("https://waryme.fr/#/alertes-internes", False)
+
+
+def test_learn_route_ignores_landing_page(tmp_path):
+    routes = str(tmp_path / "routes.json")
+    deep_link.learn_route("Alertes internes", "https://waryme.fr/#/accueil?onglet=2",
+                          landing="https://waryme.fr/#/accueil", path=routes)
+
+    assert deep_link.load_routes(routes) == {}
@@ -0,0 +1,73 @@
+from datetime import date
+
+import planner
+
+
+def d(day, month=1, year=2025):
+    return date(year, month, day)
+
+
+def test_merge_ranges_joins_overlapping_and_adjacent():
+    ranges = [(d(10), d(12)), (d(1), d(5)), (d(6), d(7)), (d(4), d(6))]
+    assert planner.merge_ranges(ranges) == [(d(1), d(7)), (d(10), d(12))]
+
+
+def test_week_ranges_bounded_to_period():
+    # 2025-01-01 est un mercredi
+    assert planner.week_ranges(d(1), d(15)) == [
+        (d(1), d(5)),
+        (d(6), d(12)),
+        (d(13), d(15)),
+    ]
+
+
+def test_missing_ranges_without_coverage():
+    assert planner.missing_ranges(d(1), d(31), []) == [(d(1), d(31))]
+
+
+def test_missing_ranges_finds_holes():
+    covered = [(d(1), d(5)), (d(10), d(12)), (d(20), d(31))]
+    assert planner.missing_ranges(d(1), d(31), covered) == [(d(6), d(9)), (d(13), d(19))]
+
+
+def test_missing_ranges_ignores_coverage_outside_window():
+    covered = [(d(1, 12, 2024), d(31, 12, 2024)), (d(1, 3), d(31, 3))]
+    assert planner.missing_ranges(d(1), d(31), covered) == [(d(1), d(31))]
+
+
+def test_missing_ranges_fully_covered():
+    assert planner.missing_ranges(d(6), d(12), [(d(1), d(5)), (d(6), d(20))]) == []
+
+
+def test_plan_combines_files_and_state(tmp_path):
+    download_dir = tmp_path / "alertes"
+    download_dir.mkdir()
+    (download_dir / "alertes_2025-01-06_2025-01-12.csv").write_text("")
+    (download_dir / "alertes_2025-01-06_2025-01-12_1.csv").write_text("")
+    state_file = tmp_path / "coverage.json"
+    planner.record(d(20), d(26), path=str(state_file))
+
+    ranges = planner.plan(str(download_dir), since=d(6), until=d(31), state_file=str(state_file))
+    assert ranges == [(d(13), d(19)), (d(27), d(31))]
+
+
+def test_plan_defaults_to_previous_week_without_history(tmp_path):
+    ranges = planner.plan(str(tmp_path), state_file=str(tmp_path / "coverage.json"), today=d(15))
+    assert ranges == [(d(6), d(12))]
+
+
+def test_plan_stops_at_last_complete_week(tmp_path):
+    state_file = tmp_path / "coverage.json"
+    planner.record(d(6), d(12), path=str(state_file))
+
+    # Mercredi 15 : semaine en cours incomplète, rien à exporter
+    assert planner.plan(str(tmp_path), state_file=str(state_file), today=d(15)) == []
+    # Lundi 20 : la semaine du 13 au 19 est complète
+    assert planner.plan(str(tmp_path), state_file=str(state_file), today=d(20)) == [(d(13), d(19))]
+
+
+def test_record_merges_with_existing_state(tmp_path):
+    state_file = str(tmp_path / "coverage.json")
+    planner.record(d(1), d(5), path=state_file)
+    planner.record(d(6), d(12), path=state_file)
+    assert planner.load_state(state_file) == [(d(1), d(12))]
@@ -0,0 +1,113 @@
+from datetime import date, timedelta
+
+import pytest
+
+import range_split
+from range_split import ExportTooLarge
+
+HEADER = "﻿Référence;Date\n"
+
+
+def d(day):
+    return date(2025, 1, day)
+
+
+class FakeExport:
+    """export_fn de test : une ligne par jour, ExportTooLarge au-delà de `max_days` jours."""
+
+    def __init__(self, output_dir, max_days):
+        self.output_dir = output_dir
+        self.max_days = max_days
+        self.calls = []
+
+    def __call__(self, start_date, end_date):
+        self.calls.append((start_date, end_date))
+        days = (end_date - start_date).days + 1
+        if days > self.max_days:
+            raise ExportTooLarge(f"{days} jours")
+        path = self.output_dir / f"piece_{start_date}_{end_date}_{len(self.calls)}.csv"
+        # Plus récent en premier, comme les exports WaryMe
+        lines = [f"{day};{day}\n" for day in
+                 (end_date - timedelta(days=i) for i in range(days))]
+        path.write_text(HEADER + "".join(lines), encoding="utf-8")
+        return str(path)
+
+
+def test_split_days():
+    assert range_split.split_days(d(1), d(7), 3) == [(d(1), d(3)), (d(4), d(6)), (d(7), d(7))]
+
+
+def test_export_small_period_is_not_split(tmp_path):
+    export_fn = FakeExport(tmp_path, max_days=7)
+    sizes_file = str(tmp_path / "sizes.json")
+
+    path = range_split.export(export_fn, d(6), d(12), "site", str(tmp_path), sizes_file=sizes_file)
+
+    assert export_fn.calls == [(d(6), d(12))]
+    assert range_split.count_rows(path) == 7
+    assert range_split.load_sizes(sizes_file) == {}
+
+
+def test_export_bisects_and_stitches(tmp_path):
+    export_fn = FakeExport(tmp_path, max_days=2)
+    sizes_file = str(tmp_path / "sizes.json")
+
+    path = range_split.export(export_fn, d(6), d(12), "site", str(tmp_path), sizes_file=sizes_file)
+
+    assert export_fn.calls[0] == (d(6), d(12))
+    exported = [call for call in export_fn.calls if (call[1] - call[0]).days < 2]
+    assert exported == [(d(6), d(6)), (d(7), d(8)), (d(9), d(10)), (d(11), d(12))]
+
+    assert path.endswith("alertes_2025-01-06_2025-01-12.csv")
+    with open(path, encoding="utf-8-sig") as f:
+        lines = f.read().splitlines()
+    # Un seul en-tête, toutes les journées, plus récente en premier
+    assert lines[0] == "Référence;Date"
+    assert [line.split(";")[0] for line in lines[1:]] == [str(d(day)) for day in range(12, 5, -1)]
+    # Morceaux supprimés après recollage
+    assert not list(tmp_path.glob("piece_*.csv"))
+    assert range_split.load_sizes(sizes_file) == {"site": 2}
+
+
+def test_export_starts_from_remembered_size(tmp_path):
+    export_fn = FakeExport(tmp_path, max_days=2)
+    sizes_file = str(tmp_path / "sizes.json")
+    range_split._save_size("site", 2, sizes_file)
+
+    range_split.export(export_fn, d(6), d(12), "site", str(tmp_path), sizes_file=sizes_file)
+
+    assert export_fn.calls == [(d(6), d(7)), (d(8), d(9)), (d(10), d(11)), (d(12), d(12))]
+
+
+def test_export_splits_truncated_export(tmp_path):
+    export_fn = FakeExport(tmp_path, max_days=7)
+
+    path = range_split.export(export_fn, d(6), d(12), "site", str(tmp_path), max_rows=4,
+                              sizes_file=str(tmp_path / "sizes.json"))
+
+    assert export_fn.calls == [(d(6), d(12)), (d(6), d(8)), (d(9), d(12)), (d(9), d(10)), (d(11), d(12))]
+    assert range_split.count_rows(path) == 7
+
+
+def test_single_day_too_large_is_raised(tmp_path):
+    export_fn = FakeExport(tmp_path, max_days=0)
+
+    with pytest.raises(ExportTooLarge):
+        range_split.export(export_fn, d(6), d(7), "site", str(tmp_path), sizes_file=str(tmp_path / "sizes.json"))
+
+
+def test_failed_export_removes_partial_pieces(tmp_path):
+    export_fn = FakeExport(tmp_path, max_days=1)
+    sizes_file = str(tmp_path / "sizes.json")
+    range_split._save_size("site", 1, sizes_file)
+
+    def failing(start_date, end_date):
+        if start_date == d(9):
+            raise RuntimeError("session expirée")
+        return export_fn(start_date, end_date)
+
+    with pytest.raises(RuntimeError):
+        range_split.export(failing, d(6), d(12), "site", str(tmp_path), sizes_file=sizes_file)
+
+    assert len(export_fn.calls) == 3
+    assert not list(tmp_path.glob("piece_*.csv"))
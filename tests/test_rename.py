@@ -0,0 +1,175 @@
+import pandas as pd
+import pytest
+
+import rename
+
+HEADER = ["Référence", "Date", "Timestamp", "Communauté"]
+
+
+def csv_bytes(*rows, header=HEADER):
+    lines = [";".join(header)] + [";".join(row) for row in rows]
+    return ("﻿" + "\n".join(lines) + "\n").encode("utf-8")
+
+
+def read(*rows):
+    return rename.read_source(csv_bytes(*rows), HEADER)
+
+
+def test_sanitize_sorts_records_by_field_count():
+    data = csv_bytes(
+        ("1", "31/12/2024 21:59", "1735678740", "RTM"),      # conforme
+        ("2", "31/12/2024 21:58"),                           # champs manquants : complétée
+        ("3", "31/12/2024 21:57", "1735678620", "RTM;;"),    # `;` vides en fin : réparée
+        ("4", "31/12/2024 21:56", "1735678560", "A;B"),      # `;` dans les données : quarantaine
+        ("5", '"31/12/2024\n21:55"', "1735678500", "RTM"),  # retour à la ligne entre guillemets
+    )
+    clean, clean_pos, quarantine, quarantine_pos, repaired = rename.sanitize(data, len(HEADER))
+
+    assert clean == [
+        b"1;31/12/2024 21:59;1735678740;RTM",
+        b"2;31/12/2024 21:58;;",
+        b"3;31/12/2024 21:57;1735678620;RTM",
+    ]
+    assert clean_pos == [0, 1, 2]
+    assert quarantine == [b"4;31/12/2024 21:56;1735678560;A;B", b'5;"31/12/2024\n21:55";1735678500;RTM']
+    assert quarantine_pos == [3, 4]
+    assert repaired == 1
+
+
+def test_field_count_ignores_quoted_separators():
+    assert rename.field_count(b'1;"a;b";c') == 3
+
+
+def test_read_source_keeps_original_order_and_aligns_columns():
+    df = read(
+        ("1", "31/12/2024 21:59", "1735678740", "RTM"),
+        ("2", "31/12/2024 21:58", "1735678680", "A;B"),
+        ("3", "31/12/2024 21:57"),
+    )
+    assert list(df.columns) == HEADER
+    assert df["Référence"].tolist() == ["1", "2", "3"]
+    # Colonnes excédentaires ignorées, colonnes manquantes vides
+    assert df.loc[1, "Communauté"] == "A"
+    assert pd.isna(df.loc[2, "Communauté"])
+
+
+def test_deduplicate_on_reference_keeps_first():
+    df = read(
+        ("1", "31/12/2024 21:59", "1735678740", "RTM"),
+        ("2", "30/12/2024 10:00", "1735552800", "RTM"),
+        ("1", "31/12/2024 21:59", "1735678740", "Autre"),  # même Référence
+    )
+
+    deduped, removed = rename.deduplicate(df, ["a", "a", "b"])
+
+    assert deduped.index.tolist() == [0, 1]
+    assert deduped.loc[0, "Communauté"] == "RTM"
+    assert removed == {"b": 1}
+
+
+def test_deduplicate_full_row_without_reference():
+    df = pd.DataFrame({
+        "Date": ["30/12/2024 10:00", "30/12/2024 10:00", "30/12/2024 10:00", None, None],
+        "Communauté": ["RTM", "RTM", "Autre", None, None],
+    })
+
+    deduped, removed = rename.deduplicate(df, ["a", "b", "b", "a", "b"])
+
+    assert deduped.index.tolist() == [0, 2, 3]
+    assert removed == {"b": 2}
+
+
+def test_merge_into_outputs_writes_touched_months_only(tmp_path):
+    first = read(
+        ("1", "31/12/2024 21:59", "1735678740", "RTM"),
+        ("2", "02/01/2025 08:00", "1735804800", "RTM"),
+    )
+    written, months = rename.merge_into_outputs([first], HEADER, tmp_path)
+    assert written == {"alertes_2024_12.csv": 1, "alertes_2025_01.csv": 1}
+    assert months == [["2024_12", "2025_01"]]
+
+    december = (tmp_path / "alertes_2024_12.csv").stat().st_mtime_ns
+    second = read(
+        ("2", "02/01/2025 08:00", "1735804800", "RTM"),  # déjà exportée
+        ("3", "03/01/2025 09:00", "1735894800", "RTM"),
+        ("4", "", "", "RTM"),                            # sans date
+    )
+    written, months = rename.merge_into_outputs([second], HEADER, tmp_path)
+
+    assert written == {"alertes_2025_01.csv": 2, rename.NO_DATE_FILE: 1}
+    assert months == [["2025_01", rename.NO_DATE_LABEL]]
+    assert (tmp_path / "alertes_2024_12.csv").stat().st_mtime_ns == december
+    january = rename.read_output(tmp_path / "alertes_2025_01.csv", HEADER)
+    assert sorted(january["Référence"]) == ["2", "3"]
+
+
+def test_merge_into_outputs_uses_reference_index(tmp_path):
+    existing = read(("1", "31/12/2024 21:59", "1735678740", "RTM"))
+    rename.merge_into_outputs([existing], HEADER, tmp_path)
+    refs = existing["Référence"]
+    rename.rebuild_index(tmp_path, refs, pd.Series(["2024_12"], index=refs.index))
+
+    new = read(
+        ("1", "31/12/2024 21:59", "1735678740", "RTM"),
+        ("5", "31/12/2024 22:30", "1735680600", "RTM"),
+    )
+    written, _ = rename.merge_into_outputs([new], HEADER, tmp_path)
+
+    # Seule la nouvelle Référence est ajoutée, sans relire le mois
+    assert written == {"alertes_2024_12.csv": 1}
+    december = rename.read_output(tmp_path / "alertes_2024_12.csv", HEADER)
+    assert december["Référence"].tolist() == ["1", "5"]
+    assert rename.find_reference("5", tmp_path) == "alertes_2024_12.csv"
+
+
+def test_plan_sources_skips_merged_and_moved_sources(tmp_path):
+    source_dir = tmp_path / "sources"
+    source_dir.mkdir()
+    merged = source_dir / "a.csv"
+    merged.write_bytes(csv_bytes(("1", "31/12/2024 21:59", "1735678740", "RTM")))
+    manifest = {"header": HEADER, "sources": {}}
+    manifest["sources"]["a.csv"] = rename.manifest_entry(merged, rename.file_digest(merged), 1, ["2024_12"])
+
+    moved = source_dir / "sub" / "a_copie.csv"
+    moved.parent.mkdir()
+    moved.write_bytes(merged.read_bytes())
+    new = source_dir / "b.csv"
+    new.write_bytes(csv_bytes(("2", "02/01/2025 08:00", "1735804800", "RTM")))
+
+    todo, digests, unchanged = rename.plan_sources([merged, moved, new], source_dir, manifest)
+
+    assert todo == [new]
+    assert list(digests) == [new]
+    assert unchanged == 2
+    assert manifest["sources"]["sub/a_copie.csv"]["months"] == ["2024_12"]
+
+
+def test_record_sources_marks_external_exports_as_merged(tmp_path):
+    source_dir = tmp_path / "sources"
+    source_dir.mkdir()
+    raw = tmp_path / "alertes" / "alertes_2024-12-30_2025-01-05.csv"
+    raw.parent.mkdir()
+    raw.write_bytes(csv_bytes(("1", "31/12/2024 21:59", "1735678740", "RTM")))
+    output_dir = tmp_path / "sorties"
+    output_dir.mkdir()
+
+    assert rename.record_sources(output_dir, HEADER, [(raw, rename.file_digest(raw), 1, ["2024_12"])],
+                                 source_dir)
+
+    # Copiée ensuite dans les sources : reconnue sans relecture
+    copy = source_dir / raw.name
+    copy.write_bytes(raw.read_bytes())
+    todo, _, unchanged = rename.plan_sources([copy], source_dir, rename.load_manifest(output_dir))
+    assert (todo, unchanged) == ([], 1)
+
+    # Header de référence différent : manifeste inchangé
+    assert not rename.record_sources(output_dir, HEADER[:2], [], source_dir)
+
+
+def test_main_raises_instead_of_exiting(tmp_path, monkeypatch):
+    monkeypatch.setattr(rename, "SOURCE_DIR", tmp_path / "sources")
+    monkeypatch.setattr(rename, "OUTPUT_DIR", tmp_path / "sorties")
+    (tmp_path / "sources").mkdir()
+
+    with pytest.raises(rename.RenameError, match="AUCUN fichier source"):
+        rename.main()
@@ -0,0 +1,22 @@
+from run import run_scrap
+
+
+def parse(*argv):
+    return run_scrap.build_parser().parse_args(list(argv))
+
+
+def test_daemon_job_sends_export_fields_only():
+    args = parse("--start", "2025-01-06", "--supervise", "--max-parallel", "4", "--deadline", "60")
+
+    assert run_scrap.daemon_job(args) == {
+        "start": "2025-01-06", "menu": "Alertes internes", "engine": "auto",
+    }
+
+
+def test_scrap_args_matches_daemon_request():
+    assert run_scrap.scrap_args(parse()) == []
+    assert run_scrap.scrap_args(parse("--start", "2025-01-06", "--end", "2025-01-12", "--engine", "http")) == \
+        ["--backfill", "2025-01-06", "2025-01-12", "--force", "--engine", "http"]
+    # Demandes que seul le démon sait honorer
+    assert run_scrap.scrap_args(parse("--output", "semaine.csv")) is None
+    assert run_scrap.scrap_args(parse("--menu", "Alertes externes")) is None
@@ -0,0 +1,24 @@
+import pytest
+
+import spans
+
+
+def test_span_finishing_after_finish_run_keeps_its_own_exception(tmp_path):
+    spans.start_run("test")
+    with pytest.raises(RuntimeError, match="échec export"):
+        with spans.span("export_csv"):
+            # Un autre thread clôt le run pendant la span
+            spans.finish_run("error", report_dir=str(tmp_path))
+            raise RuntimeError("échec export")
+    assert spans._run is None
+
+
+def test_spans_are_recorded_in_the_report(tmp_path):
+    run = spans.start_run("test")
+    with spans.span("login"):
+        with spans.span("restore_session"):
+            pass
+    spans.finish_run(report_dir=str(tmp_path))
+
+    assert [(s["name"], s["parent"]) for s in run["spans"]] == [("restore_session", "login"), ("login", None)]
+    assert len(list(tmp_path.glob("run_*_test.json"))) == 1
@@ -0,0 +1,80 @@
+import pytest
+
+import workflow
+from range_split import ExportTooLarge
+from workflow import Workflow
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Délais demandés par Workflow, sans attendre réellement."""
+    calls = []
+    monkeypatch.setattr(workflow.time, "sleep", calls.append)
+    return calls
+
+
+class Flaky:
+    def __init__(self, failures, error=RuntimeError):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error(f"échec {self.calls}")
+        return "ok"
+
+
+def test_retries_until_success(sleeps):
+    func = Flaky(failures=2)
+    recovered = []
+    wf = Workflow(attempts=3, base_delay=1, max_delay=30)
+
+    assert wf.run("export_csv", func, recover=recovered.append) == "ok"
+    assert func.calls == 3
+    assert len(sleeps) == 2
+    assert [str(e) for e in recovered] == ["échec 1", "échec 2"]
+    assert [(phase, attempt, error) for phase, attempt, _, error in wf.history] == [
+        ("export_csv", 1, "RuntimeError: échec 1"),
+        ("export_csv", 2, "RuntimeError: échec 2"),
+        ("export_csv", 3, None),
+    ]
+
+
+def test_raises_when_attempts_exhausted(sleeps):
+    func = Flaky(failures=5)
+    wf = Workflow(attempts=3)
+
+    with pytest.raises(RuntimeError, match="échec 3"):
+        wf.run("login", func)
+    assert func.calls == 3
+    assert len(sleeps) == 2
+
+
+def test_no_retry_exceptions_are_raised_immediately(sleeps):
+    func = Flaky(failures=1, error=ExportTooLarge)
+    wf = Workflow(attempts=3, no_retry=(ExportTooLarge,))
+
+    with pytest.raises(ExportTooLarge):
+        wf.run("export_csv", func)
+    assert func.calls == 1
+    assert sleeps == []
+    assert wf.history[0][3] == "non rejouable"
+
+
+def test_failing_recover_does_not_stop_retries(sleeps):
+    func = Flaky(failures=1)
+
+    def recover(error):
+        raise OSError("reconnexion impossible")
+
+    assert Workflow(attempts=2).run("apply_filters", func, recover=recover) == "ok"
+    assert func.calls == 2
+
+
+def test_delay_is_exponential_capped_with_jitter():
+    wf = Workflow(base_delay=2, max_delay=10)
+    for attempt, ceiling in [(1, 2), (2, 4), (3, 8), (4, 10), (8, 10)]:
+        for _ in range(20):
+            assert ceiling / 2 <= wf.delay(attempt) <= ceiling
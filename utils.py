@@ -12,6 +12,203 @@ import logging
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.action_chains import ActionChains
 
+# attentes conditionnelles
+import threading
+
+# cache des Selecteurs gagnants
+import os
+import json
+
+# mesures par phase
+import spans
+from spans import traced
+
+logger = logging.getLogger(__name__)
+
+
+# ============ Attentes conditionnelles (remplacent les time.sleep) ============
+# Profils d'attente : fréquence de scrutation et facteur appliqué aux timeouts.
+# "fast" scrute plus souvent et abandonne plus tôt (runs interactifs, backfill).
+WAIT_PROFILES = {
+    "normal": {"poll": 0.25, "timeout_factor": 1.0},
+    "fast":   {"poll": 0.05, "timeout_factor": 0.5},
+}
+_wait_profile = WAIT_PROFILES["normal"]
+
+
+def set_wait_profile(name):
+    """Sélectionne le profil d'attente ("normal" ou "fast")."""
+    global _wait_profile
+    _wait_profile = WAIT_PROFILES[name]
+
+
+class WaitReport:
+    """Durée réelle de chaque attente, par thread (une session de backfill = un thread)."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def entries(self):
+        if not hasattr(self._local, "entries"):
+            self._local.entries = []
+        return self._local.entries
+
+    def record(self, label, seconds, ok=True):
+        self.entries.append((label, seconds, ok))
+
+    def reset(self):
+        self._local.entries = []
+
+    def summary(self):
+        lines = [f"{'Étape':<40} {'Durée (s)':>10}"]
+        for label, seconds, ok in self.entries:
+            lines.append(f"{label:<40} {seconds:>10.3f}{'' if ok else '  (timeout)'}")
+        total = sum(seconds for _, seconds, _ in self.entries)
+        lines.append(f"{'TOTAL attentes':<40} {total:>10.3f}")
+        return "\n".join(lines)
+
+
+wait_report = WaitReport()
+
+
+def wait_until(driver, condition, timeout, label, raise_on_timeout=True):
+    """
+    WebDriverWait selon le profil courant, avec mesure de la durée réelle.
+    Retourne la valeur de la condition, ou None si timeout et `raise_on_timeout=False`.
+    """
+    start = time.perf_counter()
+    try:
+        result = WebDriverWait(
+            driver, timeout * _wait_profile["timeout_factor"], poll_frequency=_wait_profile["poll"]
+        ).until(condition)
+    except TimeoutException:
+        wait_report.record(label, time.perf_counter() - start, ok=False)
+        if raise_on_timeout:
+            raise
+        return None
+    wait_report.record(label, time.perf_counter() - start)
+    return result
+
+
+# Vrai quand Angular n'a plus de tâche en cours (requêtes HTTP, timers, animations).
+# Si l'application n'expose pas la testabilité (build sans Zone.js), on se limite
+# à document.readyState.
+ANGULAR_STABLE_JS = """
+    if (document.readyState !== 'complete') return false;
+    if (typeof window.getAllAngularTestabilities !== 'function') return true;
+    return window.getAllAngularTestabilities().every(t => t.isStable());
+"""
+
+# Signature de la grille : nombre de lignes + texte de la première et de la dernière
+# (le nombre seul ne change pas d'une page pleine à une autre)
+GRID_SIGNATURE_JS = """
+    const rows = document.querySelectorAll("tr[role='row'], tr.mat-row, mat-row");
+    if (!rows.length) return '0';
+    return rows.length + '|' + rows[0].innerText + '|' + rows[rows.length - 1].innerText;
+"""
+
+
+def wait_angular_stable(driver, timeout=10, label="Angular stable"):
+    """Attend la stabilité d'Angular ; n'échoue pas (on poursuit avec un avertissement)."""
+    ok = wait_until(driver, lambda d: d.execute_script(ANGULAR_STABLE_JS), timeout, label,
+                    raise_on_timeout=False)
+    if ok is None:
+        logger.warning(f"Angular toujours instable après {timeout}s ({label})")
+
+
+# ============ Commandes WebDriver groupées ============
+# Chaque commande WebDriver est un aller-retour HTTP vers chromedriver : on les
+# compte (rapport de run) et on regroupe les opérations DOM d'une même étape en
+# un seul script asynchrone.
+
+def count_round_trips(driver):
+    """Compte les commandes WebDriver du driver (`driver.round_trips` et spans)."""
+    execute = driver.execute
+
+    def counted_execute(driver_command, params=None):
+        driver.round_trips += 1
+        spans.add_round_trip()
+        return execute(driver_command, params)
+
+    driver.round_trips = 0
+    driver.execute = counted_execute
+    return driver
+
+
+# Fonctions disponibles dans chaque étape d'un ScriptBatch
+_BATCH_PRELUDE_JS = """
+    const [stepArgs, timeoutMs, pollMs, done] = arguments;
+    const deadline = Date.now() + timeoutMs;
+    const sleep = ms => new Promise(r => setTimeout(r, ms));
+    const byXPath = xp => document.evaluate(xp, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    const angularStable = () => document.readyState === 'complete'
+        && (typeof window.getAllAngularTestabilities !== 'function'
+            || window.getAllAngularTestabilities().every(t => t.isStable()));
+    const gridSignature = () => {""" + GRID_SIGNATURE_JS + """};
+    // Attend que `predicate()` renvoie une valeur vraie (dans le délai global du lot)
+    const waitFor = async (predicate, what) => {
+        for (;;) {
+            const value = predicate();
+            if (value) return value;
+            if (Date.now() >= deadline) throw new Error('timeout : ' + what);
+            await sleep(pollMs);
+        }
+    };
+    const ctx = {};
+    const results = [];
+    let current = null;
+"""
+
+
+class ScriptBatch:
+    """
+    Suite d'étapes JS exécutées dans la page en UN SEUL aller-retour WebDriver.
+    Chaque étape est le corps d'une fonction async (`args`, `ctx` partagé,
+    `waitFor`, `byXPath`, `gridSignature`, `angularStable`) ; sa valeur de
+    retour est ajoutée aux résultats.
+
+        batch = ScriptBatch("Filtre")
+        batch.add("Bouton", "return (await waitFor(() => byXPath(args[0]), 'bouton')).click();", xpath)
+        results = batch.run(driver, timeout=15)
+    """
+
+    def __init__(self, label):
+        self.label = label
+        self.steps = []
+
+    def add(self, name, body, *args):
+        self.steps.append((name, body, list(args)))
+        return self
+
+    def script(self):
+        calls = "".join(
+            f"\n        current = {json.dumps(name)};"
+            f"\n        results.push(await (async (args) => {{ {body} }})(stepArgs[{i}]));"
+            for i, (name, body, _) in enumerate(self.steps)
+        )
+        return (_BATCH_PRELUDE_JS
+                + "    (async () => {\n        try {" + calls
+                + "\n            done({ok: true, results});"
+                + "\n        } catch (e) { done({ok: false, step: current, error: String(e), results}); }"
+                + "\n    })();\n")
+
+    def run(self, driver, timeout=15):
+        """Exécute le lot ; lève TimeoutException en nommant l'étape qui a échoué."""
+        timeout = timeout * _wait_profile["timeout_factor"]
+        start = time.perf_counter()
+        driver.set_script_timeout(timeout + 5)
+        outcome = driver.execute_async_script(
+            self.script(), [args for _, _, args in self.steps], int(timeout * 1000), int(_wait_profile["poll"] * 1000)
+        )
+        elapsed = time.perf_counter() - start
+        wait_report.record(self.label, elapsed, ok=outcome["ok"])
+        if not outcome["ok"]:
+            raise TimeoutException(f"{self.label} / {outcome['step']} : {outcome['error']}")
+        logger.info(f"{self.label} : {len(self.steps)} étapes en un aller-retour ({elapsed:.3f}s)")
+        return outcome["results"]
+
+
 def select_date(driver, dt: datetime, toggle_selector="mat-datepicker-toggle[matSuffix] button", timeout=15):
     """
     Selectionne la date `dt` (datetime) dans le mat-datepicker Angular Material :
@@ -42,7 +239,6 @@ def select_date(driver, dt: datetime, toggle_selector="mat-datepicker-toggle[mat
 
     driver.execute_script("arguments[0].click();", toggle)
     print("Datepicker ouvert")
-    time.sleep(0.3)
 
     overlay = WebDriverWait(driver, timeout).until(lambda d: latest_overlay())
 
@@ -52,7 +248,7 @@ def select_date(driver, dt: datetime, toggle_selector="mat-datepicker-toggle[mat
     )
     driver.execute_script("arguments[0].click();", period_btn)
     print("Selecteur mois/annee ouvert")
-    time.sleep(0.3)
+    wait_angular_stable(driver, timeout, label="Datepicker : vue annees")
 
     # --- 3) choisir l'annee
     year_btn = WebDriverWait(overlay, timeout).until(
@@ -61,7 +257,7 @@ def select_date(driver, dt: datetime, toggle_selector="mat-datepicker-toggle[mat
     driver.execute_script("arguments[0].scrollIntoView(true);", year_btn)
     driver.execute_script("arguments[0].click();", year_btn)
     print(f"Annee {year_txt} selectionnee")
-    time.sleep(0.3)
+    wait_angular_stable(driver, timeout, label="Datepicker : vue mois")
 
     # --- 4) choisir le mois
     month_btn = WebDriverWait(overlay, timeout).until(
@@ -69,7 +265,7 @@ def select_date(driver, dt: datetime, toggle_selector="mat-datepicker-toggle[mat
     )
     driver.execute_script("arguments[0].click();", month_btn)
     print(f"Mois {month_abbr} selectionne")
-    time.sleep(0.3)
+    wait_angular_stable(driver, timeout, label="Datepicker : vue jours")
 
     # --- 5) choisir le jour
     day_btn = WebDriverWait(overlay, timeout).until(
@@ -77,7 +273,7 @@ def select_date(driver, dt: datetime, toggle_selector="mat-datepicker-toggle[mat
     )
     driver.execute_script("arguments[0].click();", day_btn)
     print(f"Jour {day_txt} selectionne")
-    time.sleep(0.3)
+    wait_angular_stable(driver, timeout, label="Datepicker : fermeture")
 
     
     # Après avoir cliqué sur le jour
@@ -90,24 +286,93 @@ def select_date(driver, dt: datetime, toggle_selector="mat-datepicker-toggle[mat
 
 
 # ============ Au cas ou le selecteur de login change ============
-def safe_find(driver, selectors, timeout=15):
+# Sélecteur gagnant par champ logique ("username", "password"...), essayé en
+# premier aux runs suivants
+SELECTOR_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".session", "selectors.json")
+_selector_cache_lock = threading.Lock()
+
+# Course entre tous les sélecteurs dans la page : une seule boucle de scrutation
+# JS (un seul aller-retour WebDriver), qui renvoie le premier candidat visible et
+# actif, par ordre de priorité. arguments : sélecteurs, timeout (ms), période (ms).
+SELECTOR_RACE_JS = """
+    const [selectors, timeoutMs, pollMs, done] = arguments;
+    const usable = el => el && el.getClientRects().length > 0 && !el.disabled
+        && getComputedStyle(el).visibility !== 'hidden';
+    const find = ([method, value]) => {
+        if (method === 'css') return Array.from(document.querySelectorAll(value)).find(usable);
+        const snap = document.evaluate(value, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        for (let i = 0; i < snap.snapshotLength; i++) if (usable(snap.snapshotItem(i))) return snap.snapshotItem(i);
+    };
+    const deadline = Date.now() + timeoutMs;
+    (function poll() {
+        for (let i = 0; i < selectors.length; i++) {
+            let el;
+            try { el = find(selectors[i]); } catch (e) { continue; }  // sélecteur invalide
+            if (el) return done([i, el]);
+        }
+        if (Date.now() >= deadline) return done(null);
+        setTimeout(poll, pollMs);
+    })();
+"""
+
+
+def _load_selector_cache():
+    try:
+        with open(SELECTOR_CACHE_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _remember_selector(key, selector):
+    with _selector_cache_lock:
+        cache = _load_selector_cache()
+        if cache.get(key) == list(selector):
+            return
+        cache[key] = list(selector)
+        os.makedirs(os.path.dirname(SELECTOR_CACHE_FILE), exist_ok=True)
+        tmp_path = f"{SELECTOR_CACHE_FILE}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp_path, SELECTOR_CACHE_FILE)
+
+
+def safe_find(driver, selectors, timeout=15, key=None):
     """
-    Essaie plusieurs Selecteurs (CSS ou XPATH) jusqu'à trouver un element cliquable.
+    Trouve le premier element visible et actif parmi plusieurs Selecteurs (CSS ou XPATH),
+    testés tous à la fois dans la page.
     selectors = [("css", "input[...]"), ("xpath", "//input[...]"), ...]
+    key : nom du champ logique ("username"...) ; le Selecteur gagnant est
+          mémorisé dans `.session/selectors.json` et essayé en premier ensuite.
     """
-    for method, value in selectors:
-        try:
-            if method == "css":
-                return WebDriverWait(driver, timeout).until(
-                    EC.element_to_be_clickable((By.CSS_SELECTOR, value))
-                )
-            elif method == "xpath":
-                return WebDriverWait(driver, timeout).until(
-                    EC.element_to_be_clickable((By.XPATH, value))
-                )
-        except TimeoutException:
-            continue
-    raise TimeoutException(f"Aucun Selecteur valide trouve parmi : {selectors}")
+    selectors = [tuple(s) for s in selectors]
+    cached = tuple(_load_selector_cache().get(key) or ()) if key else ()
+    if cached in selectors:
+        selectors.remove(cached)
+        selectors.insert(0, cached)
+
+    label = f"safe_find {key or selectors[0][1]}"
+    timeout = timeout * _wait_profile["timeout_factor"]
+    start = time.perf_counter()
+    # Le script asynchrone doit pouvoir durer tout le timeout
+    driver.set_script_timeout(timeout + 5)
+    result = driver.execute_async_script(
+        SELECTOR_RACE_JS, [list(s) for s in selectors], int(timeout * 1000), int(_wait_profile["poll"] * 1000)
+    )
+    elapsed = time.perf_counter() - start
+
+    if result is None:
+        wait_report.record(label, elapsed, ok=False)
+        spans.add_retry(len(selectors))
+        raise TimeoutException(f"Aucun Selecteur valide trouve parmi : {selectors}")
+
+    index, element = result
+    wait_report.record(label, elapsed)
+    spans.add_retry(index)
+    logger.info(f"{label} : Selecteur #{index + 1} {selectors[index]} gagnant en {elapsed:.3f}s")
+    if key:
+        _remember_selector(key, selectors[index])
+    return element
 
 
 # logger = logging.getLogger(__name__)
@@ -164,133 +429,137 @@ def safe_find(driver, selectors, timeout=15):
 
 
 
-# ============== Debuggage =============
+# ============== Menu : résolution en un aller-retour =============
+# Candidats pour `text`, collectés et classés dans la page en un seul appel :
+# texte exact > texte contenu, visible, cliquable (pas masqué par un overlay),
+# balise du gagnant précédent, élément interactif (lien, bouton, item de menu).
+# Scrute jusqu'à trouver un candidat visible ; renvoie les 5 meilleurs
+# [element, balise, score], éventuellement invisibles en fin de délai.
+MENU_CANDIDATES_JS = r"""
+    const [text, preferredTag, timeoutMs, pollMs, done] = arguments;
+    const norm = s => (s || '').replace(/\s+/g, ' ').trim();
+    const interactive = 'a, button, [role=menuitem], [role=button], [role=link], mat-list-item, li';
+    const rank = () => {
+        const seen = new Set(), ranked = [];
+        const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT);
+        for (let node = walker.nextNode(); node; node = walker.nextNode()) {
+            const el = node.parentElement;
+            if (!el || seen.has(el) || !norm(node.nodeValue).includes(text)) continue;
+            seen.add(el);
+            const rect = el.getBoundingClientRect();
+            const visible = rect.width > 0 && rect.height > 0 && getComputedStyle(el).visibility !== 'hidden';
+            const top = visible ? document.elementFromPoint(rect.left + rect.width / 2, rect.top + rect.height / 2) : null;
+            const clickable = !!top && (el.contains(top) || top.contains(el));
+            const tag = el.tagName.toLowerCase();
+            const score = (norm(el.textContent) === text ? 8 : 2) + (visible ? 4 : 0) + (clickable ? 2 : 0)
+                + (tag === preferredTag ? 1 : 0) + (el.closest(interactive) ? 1 : 0);
+            ranked.push([el, tag, score, visible]);
+        }
+        return ranked.sort((a, b) => b[2] - a[2]).slice(0, 5);
+    };
+    const deadline = Date.now() + timeoutMs;
+    (function poll() {
+        const ranked = rank();
+        if (ranked.some(c => c[3]) || Date.now() >= deadline) return done(ranked.map(c => c.slice(0, 3)));
+        setTimeout(poll, pollMs);
+    })();
+"""
+
+# Diagnostic (uniquement après échec de toutes les stratégies) : outerHTML des
+# candidats et élément réellement présent en leur centre (overlay ?)
+MENU_DIAGNOSTICS_JS = """
+    return arguments[0].map(el => {
+        const r = el.getBoundingClientRect();
+        const top = document.elementFromPoint(r.left + r.width / 2, r.top + r.height / 2);
+        return [el.outerHTML.slice(0, 1000), top ? top.outerHTML.slice(0, 400) : null];
+    });
+"""
+
+
+def _click_native(driver, el):
+    el.click()
+
+
+def _click_actions(driver, el):
+    ActionChains(driver).move_to_element(el).click().perform()
+
+
+def _click_js(driver, el):
+    driver.execute_script("arguments[0].scrollIntoView({block:'center'}); arguments[0].click();", el)
+
+
+def _click_ancestor(driver, el):
+    driver.execute_script(
+        "const a = arguments[0].parentElement && arguments[0].parentElement.closest("
+        "'a, button, [role=menuitem], [role=button], [role=link], mat-list-item, li');"
+        "if (!a) throw new Error('aucun ancêtre cliquable'); a.click();",
+        el,
+    )
+
+
+# Stratégies de clic, de la plus fidèle (événements réels) à la plus forcée
+CLICK_STRATEGIES = [
+    ("click() direct", _click_native),
+    ("ActionChains", _click_actions),
+    ("JS click", _click_js),
+    ("JS click ancêtre", _click_ancestor),
+]
+
+
+def _menu_diagnostics(driver, text, candidates, failures, screenshot_path):
+    """Journalise outerHTML, overlays et erreurs de clic, puis sauvegarde un screenshot."""
+    try:
+        details = driver.execute_script(MENU_DIAGNOSTICS_JS, [el for el, _, _ in candidates])
+    except Exception as e:
+        details = []
+        logger.warning(f"Diagnostic '{text}' : outerHTML indisponible ({e!r})")
+    for idx, ((_, tag, score), (outer, top)) in enumerate(zip(candidates, details), start=1):
+        logger.warning(f"Candidat #{idx} <{tag}> score {score} :\n{outer}\nÉlément au centre : {top}")
+    for failure in failures:
+        logger.warning(f"Échec de clic : {failure}")
+    try:
+        driver.save_screenshot(screenshot_path)
+    except Exception:
+        pass
+
+
+@traced("click_menu_item")
 def click_menu_item(driver, text, timeout=20, screenshot_path='debug_alertes.png'):
     """
-    Tente de cliquer sur un item de menu contenant `text` en multipliant les approches.
-    Sauvegarde un screenshot et l'outerHTML des elements candidats si echec.
+    Clique sur l'item de menu contenant `text` : candidats classés en un seul appel
+    JS, puis stratégies de clic jusqu'au premier succès. outerHTML et screenshot
+    ne sont produits qu'en cas d'échec de toutes les tentatives.
     """
-    xpaths = [
-        f"//span[normalize-space()='{text}']",
-        f"//span[contains(normalize-space(.),'{text}')]",
-        f"//*[normalize-space(text())='{text}']",
-        f"//*[contains(normalize-space(.),'{text}')]"
-    ]
-
-    # Recuperer candidats (presence)
-    candidates = []
-    for xp in xpaths:
-        try:
-            elems = WebDriverWait(driver, timeout).until(
-                EC.presence_of_all_elements_located((By.XPATH, xp))
-            )
-            if elems:
-                candidates.extend(elems)
-        except TimeoutException:
-            pass
+    key = f"menu:{text}"
+    preferred = _load_selector_cache().get(key)
+    timeout = timeout * _wait_profile["timeout_factor"]
+    label = f"Menu '{text}'"
+
+    start = time.perf_counter()
+    driver.set_script_timeout(timeout + 5)
+    candidates = driver.execute_async_script(
+        MENU_CANDIDATES_JS, text, preferred[1] if preferred else None,
+        int(timeout * 1000), int(_wait_profile["poll"] * 1000),
+    )
+    wait_report.record(label, time.perf_counter() - start, ok=bool(candidates))
 
     if not candidates:
-        print(f"Aucun element trouve pour le texte '{text}' (xpaths testes). Je sauvegarde un screenshot.")
-        driver.save_screenshot(screenshot_path)
-        raise TimeoutException(f"Aucun element trouve pour '{text}'")
-
-    print(f"Found {len(candidates)} candidate(s) — je vais tenter plusieurs methodes de clic...")
-
-    for idx, el in enumerate(candidates, start=1):
-        try:
-            outer = driver.execute_script("return arguments[0].outerHTML;", el)
-            print(f"\n--- Candidate #{idx} ---\n{outer[:1000]}\n--- end outerHTML ---")
-        except Exception:
-            print(f"Candidate #{idx}: impossible d'obtenir outerHTML")
-
-        # Assurer que l'element est visible
-        try:
-            if not el.is_displayed():
-                driver.execute_script("arguments[0].scrollIntoView({block:'center'});", el)
-                time.sleep(0.3)
-        except Exception:
-            pass
-
-        # 1) click() direct
-        try:
-            el.click()
-            print("click() direct reussi")
-            return True
-        except Exception as e:
-            print("click() direct echoue :", repr(e))
-
-        # 2) ActionChains move_to_element + click
-        try:
-            ActionChains(driver).move_to_element(el).click().perform()
-            print("ActionChains click reussi")
-            return True
-        except Exception as e:
-            print("ActionChains echoue :", repr(e))
+        _menu_diagnostics(driver, text, [], [], screenshot_path)
+        raise TimeoutException(f"Aucun element trouve pour '{text}'. Voir {screenshot_path}")
 
-        # 3) JS click
-        try:
-            driver.execute_script("arguments[0].click();", el)
-            print("JS click reussi")
-            return True
-        except Exception as e:
-            print("JS click echoue :", repr(e))
-
-        # 4) clic par offset (au centre) + diagnostic overlay
-        try:
-            rect = driver.execute_script("return arguments[0].getBoundingClientRect();", el)
-            cx = rect.get('left', 0) + rect.get('width', 0) / 2
-            cy = rect.get('top', 0) + rect.get('height', 0) / 2
+    failures = []
+    for idx, (el, tag, score) in enumerate(candidates, start=1):
+        for name, strategy in CLICK_STRATEGIES:
             try:
-                top_html = driver.execute_script(
-                    "let e = document.elementFromPoint(arguments[0], arguments[1]); return e ? e.outerHTML : null;",
-                    cx, cy
-                )
-                print("Element au point central (peut être un overlay) :", (top_html or "")[:400])
-            except Exception:
-                pass
-
-            ActionChains(driver).move_to_element_with_offset(el, rect.get('width', 1)/2 - 1, rect.get('height', 1)/2 - 1).click().perform()
-            print("move_to_element_with_offset click reussi")
+                strategy(driver, el)
+            except Exception as e:
+                failures.append(f"candidat #{idx} <{tag}> / {name} : {e!r}"[:300])
+                spans.add_retry()
+                continue
+            logger.info(f"{label} : candidat #{idx} <{tag}> (score {score}) cliqué par {name} "
+                        f"en {time.perf_counter() - start:.3f}s")
+            _remember_selector(key, ("tag", tag))
             return True
-        except Exception as e:
-            print("move_to_element_with_offset echoue :", repr(e))
-
-        # 5) tenter les ancêtres (monte jusqu'à 6 niveaux)
-        try:
-            ancestors = driver.execute_script("""
-                let el = arguments[0];
-                let res = [];
-                let a = el.parentElement;
-                while(a && res.length < 6){
-                  res.push(a);
-                  a = a.parentElement;
-                }
-                return res;
-            """, el)
-            for i, anc in enumerate(ancestors, start=1):
-                try:
-                    print(f"Essai clic sur ancêtre niveau {i}")
-                    driver.execute_script("arguments[0].scrollIntoView({block:'center'});", anc)
-                except Exception:
-                    pass
-                try:
-                    anc.click()
-                    print(f"click() sur ancêtre niveau {i} reussi")
-                    return True
-                except Exception:
-                    try:
-                        driver.execute_script("arguments[0].click();", anc)
-                        print(f"JS click sur ancêtre niveau {i} reussi")
-                        return True
-                    except Exception as e:
-                        print(f"clic sur ancêtre niveau {i} echoue :", repr(e))
-        except Exception as e:
-            print("Erreur lors du parcours des ancêtres :", repr(e))
-
-    # Si on arrive ici, aucun essai n'a marche
-    print(f"Impossible de cliquer sur '{text}' après plusieurs tentatives — je sauvegarde un screenshot : {screenshot_path}")
-    driver.save_screenshot(screenshot_path)
-    raise Exception(f"Impossible de cliquer sur '{text}'. Voir {screenshot_path} et les outerHTML imprimes pour debug.")
-
-    driver.execute_script("arguments[0].click();", alertes_btn)
-    print("Bouton 'Alertes internes' clique (JS fallback)")
\ No newline at end of file
+
+    _menu_diagnostics(driver, text, candidates, failures, screenshot_path)
+    raise Exception(f"Impossible de cliquer sur '{text}'. Voir {screenshot_path} et scraper.log pour debug.")
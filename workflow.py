@@ -0,0 +1,84 @@
+"""
+===============================================================================
+ Module : workflow.py
+ Auteur : Bruno Coulet - RTM - Dopex
+-------------------------------------------------------------------------------
+ Objectif :
+     Ne plus perdre tout le run hebdomadaire (et déclencher une intervention)
+     pour une erreur passagère : seule la PHASE en échec (connexion, filtre,
+     export) est rejouée.
+
+ Fonctionnement :
+    `Workflow.run("apply_filters", fonction, recover=...)` exécute la phase et,
+    en cas d'exception, la rejoue jusqu'à `attempts` fois avec un délai
+    exponentiel (`base_delay` × 2^n, plafonné à `max_delay`) et une gigue
+    aléatoire (les sessions parallèles ne repartent pas ensemble).
+    Avant chaque nouvel essai, `recover(erreur)` remet l'état en ordre
+    (session toujours ouverte ? sinon reconnexion, filtre réappliqué...).
+    Les exceptions de `no_retry` (ex. ExportTooLarge, traitée par découpage)
+    sont relancées immédiatement.
+    Chaque essai est chronométré : `summary()` en donne le détail, joint au
+    mail d'erreur envoyé seulement quand le budget d'essais est épuisé.
+===============================================================================
+"""
+
+import time
+import random
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _describe(error):
+    """Première ligne du message (ceux de Selenium contiennent une pile)."""
+    lines = str(error).strip().splitlines()
+    return f"{type(error).__name__}: {lines[0] if lines else ''}"
+
+
+class Workflow:
+    """Phases rejouées avec délai exponentiel et gigue ; historique des essais."""
+
+    def __init__(self, attempts=3, base_delay=2.0, max_delay=30.0, no_retry=()):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.no_retry = tuple(no_retry)
+        self.history = []  # (phase, essai, durée, erreur ou None)
+
+    def delay(self, attempt):
+        """Délai avant l'essai `attempt + 1` : moitié fixe, moitié aléatoire."""
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    def run(self, phase, func, recover=None):
+        for attempt in range(1, self.attempts + 1):
+            start = time.perf_counter()
+            try:
+                result = func()
+            except self.no_retry:
+                self.history.append((phase, attempt, time.perf_counter() - start, "non rejouable"))
+                raise
+            except Exception as e:
+                self.history.append((phase, attempt, time.perf_counter() - start, _describe(e)))
+                if attempt == self.attempts:
+                    logger.error(f"Phase '{phase}' en échec après {attempt} essai(s) : {_describe(e)}")
+                    raise
+                delay = self.delay(attempt)
+                logger.warning(f"Phase '{phase}' en échec (essai {attempt}/{self.attempts}) : {_describe(e)} "
+                               f"— nouvel essai dans {delay:.1f}s")
+                time.sleep(delay)
+                if recover:
+                    try:
+                        recover(e)
+                    except Exception as recover_error:
+                        # Le prochain essai échouera à son tour et consommera le budget
+                        logger.warning(f"Phase '{phase}' : remise en état impossible ({recover_error})")
+                continue
+            self.history.append((phase, attempt, time.perf_counter() - start, None))
+            return result
+
+    def summary(self):
+        lines = [f"{'Phase':<20} {'Essai':>5} {'Durée (s)':>10}  Résultat"]
+        for phase, attempt, seconds, error in self.history:
+            lines.append(f"{phase:<20} {attempt:>5} {seconds:>10.3f}  {(error or 'ok')[:200]}")
+        return "\n".join(lines)